@@ -0,0 +1,99 @@
+"""
+Replay a JSONL file of chat requests through /v1/chat/batch and write one
+JSONL result per input line (offline evaluation, bulk replay).
+
+    python -m app.bench.batch requests.jsonl --out results.jsonl
+    python -m app.bench.batch requests.jsonl --url http://api:8000 --batch-size 500
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import httpx
+from rich.console import Console
+
+from app.bench.load import body_from_record
+
+# Status goes to stderr so `--out -` stays clean JSONL.
+console = Console(stderr=True)
+
+# Kept from the input record so results can be joined back to it.
+_ID_FIELDS = ("request_id", "id")
+
+
+def read_requests(path: str) -> List[Tuple[Optional[str], dict]]:
+    """(record id or None, ChatRequest body) per usable line."""
+    requests = []
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            body = body_from_record(record)
+            if body is None:
+                continue
+            record_id = next((record[f] for f in _ID_FIELDS if f in record), None)
+            requests.append((record_id, {"messages": body["messages"], "mode": body.get("mode", "auto")}))
+    return requests
+
+
+def post_batch(
+    client: httpx.Client, url: str, bodies: List[dict], concurrency: Optional[int]
+) -> Iterator[dict]:
+    """Yield the NDJSON result lines of one /v1/chat/batch call as they arrive."""
+    payload: Dict[str, object] = {"requests": bodies}
+    if concurrency:
+        payload["concurrency"] = concurrency
+    with client.stream("POST", f"{url.rstrip('/')}/v1/chat/batch", json=payload) as resp:
+        resp.raise_for_status()
+        for line in resp.iter_lines():
+            if line:
+                yield json.loads(line)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay chat requests through /v1/chat/batch.")
+    parser.add_argument("input", help="JSONL: ChatRequest bodies or records with body/content/question")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--out", default="-", help="Results JSONL (default: stdout)")
+    parser.add_argument("--batch-size", type=int, default=256, help="Requests per HTTP call")
+    parser.add_argument("--concurrency", type=int, help="Parallel model calls (server caps it)")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Seconds per batch call")
+    args = parser.parse_args(argv)
+
+    requests = read_requests(args.input)
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    errors = 0
+    started = time.perf_counter()
+    try:
+        with httpx.Client(timeout=args.timeout) as client:
+            for offset in range(0, len(requests), args.batch_size):
+                chunk = requests[offset : offset + args.batch_size]
+                for result in post_batch(client, args.url, [b for _, b in chunk], args.concurrency):
+                    index = offset + result["index"]
+                    row = {"index": index, "id": requests[index][0]}
+                    if "error" in result:
+                        errors += 1
+                        row["error"] = result["error"]
+                    else:
+                        row.update(result["response"])
+                    out.write(json.dumps(row) + "\n")
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - started
+    rate = len(requests) / elapsed if elapsed > 0 else 0.0
+    console.print(
+        f"{len(requests)} requests, {errors} errors in {elapsed:.1f}s ({rate:.1f} req/s)"
+    )
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""
+Micro-benchmark: compiled crisis matcher vs. the old per-term substring scan.
+
+    python -m app.bench.crisis --terms 14 200 2000 --text-words 50 500 5000
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import string
+import timeit
+from typing import List
+
+from app.config import get_settings
+from app.safety.crisis import CrisisMatcher, load_lexicon
+
+
+def substring_scan(keywords: str, text: str) -> List[str]:
+    """The previous detect_crisis: split the lexicon, then one `in` scan per term."""
+    lexicon = [w.strip().lower() for w in keywords.split(",") if w.strip()]
+    lower = text.lower()
+    return [term for term in lexicon if term in lower]
+
+
+def synthetic_lexicon(base: List[str], size: int, rng: random.Random) -> List[str]:
+    terms = list(base)
+    while len(terms) < size:
+        words = rng.randint(1, 3)
+        terms.append(
+            " ".join(
+                "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9)))
+                for _ in range(words)
+            )
+        )
+    return terms[:size]
+
+
+def synthetic_text(words: int, rng: random.Random) -> str:
+    vocab = (
+        "scaffold plank harness inspect ladder crane load chart site supervisor "
+        "toolbox talk guardrail anchor lanyard concrete rebar formwork shift tired"
+    ).split()
+    return " ".join(rng.choice(vocab) for _ in range(words))
+
+
+def run(term_counts: List[int], text_words: List[int], repeat: int = 5):
+    rng = random.Random(7)
+    base = load_lexicon(get_settings().crisis_keywords)
+    print(f"{'terms':>7} {'words':>7} {'substring us':>14} {'compiled us':>13} {'speedup':>8}")
+    for n_terms in term_counts:
+        lexicon = synthetic_lexicon(base, n_terms, rng)
+        keywords = ",".join(lexicon)
+        matcher = CrisisMatcher(lexicon)
+        for n_words in text_words:
+            text = synthetic_text(n_words, rng)
+            number = max(1, 20000 // (n_terms + n_words))
+            old = min(timeit.repeat(lambda: substring_scan(keywords, text), number=number, repeat=repeat))
+            new = min(timeit.repeat(lambda: matcher.find(text), number=number, repeat=repeat))
+            old_us = 1e6 * old / number
+            new_us = 1e6 * new / number
+            print(
+                f"{n_terms:>7} {n_words:>7} {old_us:>14.1f} {new_us:>13.1f} {old_us / new_us:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--terms", type=int, nargs="+", default=[14, 200, 2000])
+    parser.add_argument("--text-words", type=int, nargs="+", default=[50, 500, 5000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.terms, args.text_words, args.repeat)
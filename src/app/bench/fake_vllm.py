@@ -0,0 +1,95 @@
+"""
+Local stand-in for a vLLM OpenAI-compatible server, for load tests.
+
+    python -m app.bench.fake_vllm --port 8001 --latency-ms 150 --tokens-per-s 60
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+_WORDS = (
+    "Inspect each plank for cracks, splits and warping before use. Confirm the "
+    "guardrails are secure, check the base plates and mud sills, and tag out any "
+    "damaged component. Refer to the cited manual section and involve your "
+    "supervisor for anything safety-critical."
+).split()
+
+
+def create_app(latency_ms: float = 150.0, tokens_per_s: float = 60.0, max_tokens: int = 64) -> FastAPI:
+    """
+    `latency_ms` models queueing + prefill before the first token; tokens then
+    arrive at `tokens_per_s`. Completions are capped at `max_tokens` (or the
+    request's own max_tokens if smaller).
+    """
+    app = FastAPI(title="fake-vllm")
+    app.state.requests = 0
+
+    def _tokens(body: dict):
+        n = min(max_tokens, int(body.get("max_tokens") or max_tokens))
+        return [(" " if i else "") + _WORDS[i % len(_WORDS)] for i in range(n)]
+
+    @app.get("/health")
+    def health():
+        return {"status": "ok", "requests": app.state.requests}
+
+    @app.post("/v1/chat/completions")
+    async def completions(body: dict):
+        app.state.requests += 1
+        tokens = _tokens(body)
+        created = int(time.time())
+        await asyncio.sleep(latency_ms / 1000.0)
+        if not body.get("stream"):
+            await asyncio.sleep(len(tokens) / tokens_per_s)
+            return {
+                "id": "fake",
+                "object": "chat.completion",
+                "created": created,
+                "model": body.get("model"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "".join(tokens)},
+                        "finish_reason": "length",
+                    }
+                ],
+                "usage": {"completion_tokens": len(tokens)},
+            }
+
+        async def events():
+            for tok in tokens:
+                chunk = {
+                    "id": "fake",
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "choices": [{"index": 0, "delta": {"content": tok}}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(1.0 / tokens_per_s)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake vLLM server for load tests.")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=150.0)
+    parser.add_argument("--tokens-per-s", type=float, default=60.0)
+    parser.add_argument("--max-tokens", type=int, default=64)
+    args = parser.parse_args()
+    uvicorn.run(
+        create_app(args.latency_ms, args.tokens_per_s, args.max_tokens),
+        host="127.0.0.1",
+        port=args.port,
+        log_level="warning",
+    )
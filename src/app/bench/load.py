@@ -0,0 +1,314 @@
+"""
+End-to-end load test for /v1/chat against local stand-ins.
+
+Starts a fake vLLM server and (unless --target-url is given) the API itself
+in a subprocess, pointed at a synthetic FAISS corpus, then replays traffic at
+a fixed concurrency and reports throughput and latency percentiles per path.
+
+    python -m app.bench.load --requests 500 --concurrency 32
+    python -m app.bench.load --traffic requests.jsonl --concurrency 64 --max-p95-ms 800
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+
+from app.bench import corpus, fake_vllm
+
+PATHS = ("crisis", "wellbeing", "technical", "no_context")
+_PATH_BY_NOTES = {
+    "crisis_escalation_triggered": "crisis",
+    "wellbeing_playbook": "wellbeing",
+    "no_context": "no_context",
+    None: "technical",
+}
+
+
+@dataclass
+class Sample:
+    path: str
+    latency_s: float
+    first_byte_s: Optional[float] = None
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _serve_in_thread(app, port: int):
+    import uvicorn
+
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    threading.Thread(target=server.run, name="cw-bench-server", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def _wait_healthy(url: str, timeout_s: float, proc: subprocess.Popen):
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"API process exited with code {proc.returncode}")
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise TimeoutError(f"API at {url} not healthy after {timeout_s}s")
+
+
+def body_from_record(record: dict) -> Optional[dict]:
+    """
+    A ChatRequest body ({"messages": [...]}) as-is, or a backlog-style record
+    whose "body"/"content"/"question" field becomes a single user message.
+    None if the record has neither.
+    """
+    if "messages" in record:
+        return record
+    text = record.get("body") or record.get("content") or record.get("question")
+    if not text:
+        return None
+    return {"messages": [{"role": "user", "content": text}], "mode": record.get("mode", "auto")}
+
+
+def load_traffic(path: str) -> List[dict]:
+    """JSONL traffic, one record per line (see `body_from_record`)."""
+    bodies = []
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            body = body_from_record(json.loads(line))
+            if body is not None:
+                bodies.append(body)
+    return bodies
+
+
+def synthetic_traffic(n: int, mix: Dict[str, float], seed: int = 0) -> List[dict]:
+    rng = random.Random(seed)
+    pools = {
+        "technical": list(corpus.TECHNICAL_QUERIES.values()),
+        "no_context": corpus.NO_CONTEXT_QUERIES,
+        "wellbeing": corpus.WELLBEING_QUERIES,
+        "crisis": corpus.CRISIS_QUERIES,
+    }
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    bodies = []
+    for _ in range(n):
+        name = rng.choices(names, weights)[0]
+        bodies.append(
+            {
+                "messages": [{"role": "user", "content": rng.choice(pools[name])}],
+                "mode": "wellbeing" if name == "wellbeing" else "auto",
+            }
+        )
+    return bodies
+
+
+async def _one(client: httpx.AsyncClient, body: dict, stream: bool) -> Sample:
+    started = time.perf_counter()
+    if not stream:
+        resp = await client.post("/v1/chat", json=body)
+        elapsed = time.perf_counter() - started
+        if resp.status_code != 200:
+            return Sample("error", elapsed)
+        return Sample(_PATH_BY_NOTES.get(resp.json().get("safety_notes"), "other"), elapsed)
+
+    first_byte = None
+    notes = "error"
+    event = None
+    async with client.stream("POST", "/v1/chat/stream", json=body) as resp:
+        if resp.status_code != 200:
+            return Sample("error", time.perf_counter() - started)
+        async for line in resp.aiter_lines():
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                if event == "token" and first_byte is None:
+                    first_byte = time.perf_counter() - started
+                elif event == "done":
+                    notes = json.loads(line[len("data:"):]).get("safety_notes")
+    path = _PATH_BY_NOTES.get(notes, "error")
+    return Sample(path, time.perf_counter() - started, first_byte)
+
+
+async def replay(url: str, bodies: List[dict], concurrency: int, stream: bool) -> List[Sample]:
+    sem = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+
+        async def run(body):
+            async with sem:
+                try:
+                    return await _one(client, body, stream)
+                except httpx.HTTPError:
+                    return Sample("error", float("nan"))
+
+        return await asyncio.gather(*(run(b) for b in bodies))
+
+
+def summarize(samples: List[Sample], wall_s: float) -> dict:
+    groups: Dict[str, List[Sample]] = defaultdict(list)
+    for s in samples:
+        groups[s.path].append(s)
+        groups["all"].append(s)
+    report = {"requests": len(samples), "wall_s": wall_s, "throughput_rps": len(samples) / wall_s}
+    paths = {}
+    for name, group in groups.items():
+        lat = np.array([s.latency_s for s in group if s.latency_s == s.latency_s]) * 1000
+        entry = {"count": len(group)}
+        if len(lat):
+            entry.update(
+                p50_ms=float(np.percentile(lat, 50)),
+                p95_ms=float(np.percentile(lat, 95)),
+                p99_ms=float(np.percentile(lat, 99)),
+                max_ms=float(lat.max()),
+            )
+        ttfb = [s.first_byte_s * 1000 for s in group if s.first_byte_s is not None]
+        if ttfb:
+            entry["ttfb_p50_ms"] = float(np.percentile(ttfb, 50))
+            entry["ttfb_p95_ms"] = float(np.percentile(ttfb, 95))
+        paths[name] = entry
+    report["paths"] = paths
+    return report
+
+
+def print_report(report: dict):
+    print(
+        f"{report['requests']} requests in {report['wall_s']:.1f}s "
+        f"-> {report['throughput_rps']:.1f} req/s"
+    )
+    print(f"{'path':<12} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ttfb p50':>9}")
+    order = [p for p in (*PATHS, "error", "other", "all") if p in report["paths"]]
+
+    def fmt(e: dict, key: str) -> str:
+        return f"{e[key]:>9.1f}" if key in e else f"{'-':>9}"
+
+    for name in order:
+        e = report["paths"][name]
+        print(
+            f"{name:<12} {e['count']:>6} {fmt(e, 'p50_ms')} {fmt(e, 'p95_ms')} {fmt(e, 'p99_ms')} "
+            f"{fmt(e, 'ttfb_p50_ms')}"
+        )
+
+
+def _parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in PATHS:
+            raise argparse.ArgumentTypeError(f"unknown path {name!r}; expected {PATHS}")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load test /v1/chat with local stand-ins.")
+    parser.add_argument("--target-url", help="Test an already-running API instead of starting one")
+    parser.add_argument("--traffic", help="JSONL file of requests to replay")
+    parser.add_argument("--requests", type=int, default=300, help="Synthetic requests (no --traffic)")
+    parser.add_argument(
+        "--mix",
+        type=_parse_mix,
+        default="technical=0.7,no_context=0.1,wellbeing=0.15,crisis=0.05",
+        help="Synthetic path mix, e.g. technical=0.7,wellbeing=0.3",
+    )
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--stream", action="store_true", help="Use /v1/chat/stream and record TTFB")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the API")
+    parser.add_argument("--corpus-chunks", type=int, default=5000)
+    parser.add_argument("--random-vectors", action="store_true", help="Skip embedding the corpus")
+    parser.add_argument("--store-path", help="Use this FAISS store instead of building one")
+    parser.add_argument("--llm-latency-ms", type=float, default=150.0)
+    parser.add_argument("--llm-tokens-per-s", type=float, default=60.0)
+    parser.add_argument("--llm-max-tokens", type=int, default=64)
+    parser.add_argument("--out", help="Write the JSON report here")
+    parser.add_argument("--max-p95-ms", type=float, help="Exit non-zero if overall p95 exceeds this")
+    args = parser.parse_args(argv)
+
+    bodies = load_traffic(args.traffic) if args.traffic else synthetic_traffic(args.requests, args.mix)
+    proc = None
+    with tempfile.TemporaryDirectory(prefix="cw-bench-") as tmp:
+        url = args.target_url
+        if url is None:
+            llm_port = _free_port()
+            _serve_in_thread(
+                fake_vllm.create_app(args.llm_latency_ms, args.llm_tokens_per_s, args.llm_max_tokens),
+                llm_port,
+            )
+            store_path = args.store_path
+            if store_path is None:
+                store_path = os.path.join(tmp, "faiss.index")
+                print(f"Building synthetic corpus ({args.corpus_chunks} chunks)...")
+                corpus.build_corpus(store_path, args.corpus_chunks, args.random_vectors)
+            api_port = _free_port()
+            url = f"http://127.0.0.1:{api_port}"
+            env = dict(
+                os.environ,
+                CW_MODEL_SERVER_URL=f"http://127.0.0.1:{llm_port}/v1/chat/completions",
+                CW_VECTOR_STORE_PATH=store_path,
+            )
+            proc = subprocess.Popen(
+                [
+                    sys.executable, "-m", "uvicorn", "app.main:app",
+                    "--host", "127.0.0.1", "--port", str(api_port),
+                    "--workers", str(args.workers), "--log-level", "warning",
+                ],
+                env=env,
+            )
+        try:
+            if proc is not None:
+                _wait_healthy(url, 300, proc)
+            # Warm-up: model load, first FAISS search, connection pools.
+            asyncio.run(replay(url, bodies[: min(len(bodies), args.concurrency)], args.concurrency, args.stream))
+            started = time.perf_counter()
+            samples = asyncio.run(replay(url, bodies, args.concurrency, args.stream))
+            report = summarize(samples, time.perf_counter() - started)
+        finally:
+            if proc is not None:
+                proc.terminate()
+                proc.wait(timeout=30)
+
+    report["config"] = {
+        "concurrency": args.concurrency,
+        "stream": args.stream,
+        "workers": args.workers,
+        "llm_latency_ms": args.llm_latency_ms,
+        "llm_tokens_per_s": args.llm_tokens_per_s,
+    }
+    print_report(report)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+    p95 = report["paths"].get("all", {}).get("p95_ms")
+    if args.max_p95_ms is not None and (p95 is None or p95 > args.max_p95_ms):
+        print(f"FAIL: overall p95 {p95} ms exceeds budget {args.max_p95_ms} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""
+Recall vs. memory for quantized FAISS stores with exact rescoring.
+
+    python -m app.bench.quant                       # vectors from the configured store
+    python -m app.bench.quant --synthetic 200000 --rescore 1 2 4 8
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+from rich.console import Console
+from rich.table import Table
+
+from app.config import get_settings
+from app.rag import generations, sharded
+from app.rag.vector_store import QUANTIZATIONS, DocumentChunk, FaissStore
+
+console = Console()
+
+
+def store_vectors(path: str) -> np.ndarray:
+    """Float32 vectors of an existing store (exact if it has a vectors file), all shards."""
+    index_path = generations.resolve(path)[0]
+    shards = sharded.read_layout(path)
+    if shards is None:
+        stores = [FaissStore(dim=_store_dim(index_path), path=path)]
+    else:
+        dim = _store_dim(sharded.shard_path(index_path, 0, shards))
+        stores = sharded.ShardedStore(dim, path).shards
+    vectors = np.concatenate([s._ids_and_vectors()[1] for s in stores])
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+def _store_dim(path: str) -> int:
+    import faiss
+
+    try:
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP).d
+    except RuntimeError:
+        return faiss.read_index_binary(path, faiss.IO_FLAG_MMAP).d
+
+
+def synthetic_vectors(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    """
+    Unit vectors around a few hundred topic centres: clustered like real
+    embeddings, so near neighbours are close competitors rather than noise.
+    """
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((max(1, n // 500), dim)).astype(np.float32)
+    vecs = centres[rng.integers(0, len(centres), n)]
+    vecs += 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    return vecs
+
+
+def _queries(vectors: np.ndarray, n: int, seed: int) -> np.ndarray:
+    # Perturbed corpus vectors: paraphrase-like queries with known neighbours.
+    rng = np.random.default_rng(seed + 1)
+    q = vectors[rng.integers(0, len(vectors), n)].copy()
+    q += 0.3 * rng.standard_normal(q.shape).astype(np.float32) / np.sqrt(q.shape[1])
+    q /= np.linalg.norm(q, axis=1, keepdims=True)
+    return q
+
+
+def _exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    import faiss
+
+    index = faiss.IndexFlatIP(vectors.shape[1])
+    index.add(vectors)
+    return index.search(queries, k)[1]
+
+
+def _build(directory: str, vectors: np.ndarray, quantization: str, batch: int = 50000) -> FaissStore:
+    # Flat first pass for every variant, so only the codes differ.
+    dim = vectors.shape[1]
+    store = FaissStore(
+        dim=dim,
+        path=os.path.join(directory, f"{quantization}.index"),
+        index_type="flat",
+        quantization=quantization,
+    )
+    for start in range(0, len(vectors), batch):
+        block = vectors[start : start + batch]
+        store.add(block, [DocumentChunk(text="", document="bench")] * len(block))
+    store.save()
+    return FaissStore(dim=dim, path=store.root, index_type="flat")
+
+
+def run(
+    vectors: np.ndarray,
+    quantizations: List[str],
+    rescore: List[int],
+    n_queries: int = 500,
+    k: int = 5,
+    seed: int = 0,
+) -> List[dict]:
+    queries = _queries(vectors, n_queries, seed)
+    truth = _exact_top_k(vectors, queries, k)
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for quantization in quantizations:
+            store = _build(directory, vectors, quantization)
+            ram = os.path.getsize(store.path)
+            disk = os.path.getsize(store.vectors_path) if store.vectors is not None else 0
+            for factor in rescore if quantization != "none" else [1]:
+                store.rescore_factor = factor
+                hits = 0
+                latencies = []
+                for q, expected in zip(queries, truth):
+                    started = time.perf_counter()
+                    _, idx = (
+                        store._rescored_search(q[None, :], k)
+                        if store.vectors is not None
+                        else store.index.search(q[None, :], k)
+                    )
+                    latencies.append(time.perf_counter() - started)
+                    hits += len(set(idx[0].tolist()) & set(expected.tolist()))
+                rows.append(
+                    {
+                        "quantization": quantization,
+                        "rescore_factor": factor if quantization != "none" else None,
+                        f"recall@{k}": round(hits / (len(queries) * k), 4),
+                        "index_ram_mb": round(ram / 2**20, 2),
+                        "vectors_disk_mb": round(disk / 2**20, 2),
+                        "p50_ms": round(1000 * float(np.percentile(latencies, 50)), 3),
+                        "p95_ms": round(1000 * float(np.percentile(latencies, 95)), 3),
+                    }
+                )
+    return rows
+
+
+def print_report(rows: List[dict], n_vectors: int, dim: int):
+    table = Table(title=f"{n_vectors} vectors x {dim} dims")
+    for column in rows[0]:
+        table.add_column(column, justify="left" if column == "quantization" else "right")
+    for row in rows:
+        table.add_row(*["-" if v is None else str(v) for v in row.values()])
+    console.print(table)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--store", help="Index to read vectors from (default: CW_VECTOR_STORE_PATH)")
+    parser.add_argument("--synthetic", type=int, help="Use N clustered random vectors instead")
+    parser.add_argument("--dim", type=int, default=384, help="Dimension of synthetic vectors")
+    parser.add_argument("--quantization", nargs="+", choices=QUANTIZATIONS, default=list(QUANTIZATIONS))
+    parser.add_argument("--rescore", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write the rows as JSON here")
+    args = parser.parse_args(argv)
+
+    if args.synthetic:
+        vectors = synthetic_vectors(args.synthetic, args.dim, args.seed)
+    else:
+        path = args.store or get_settings().vector_store_path
+        if not Path(generations.resolve(path)[0]).exists() and sharded.read_layout(path) is None:
+            parser.error(f"No index at {path}; pass --store or --synthetic N.")
+        vectors = store_vectors(path)
+    rows = run(vectors, args.quantization, args.rescore, args.queries, args.k, args.seed)
+    print_report(rows, len(vectors), vectors.shape[1])
+    if args.out:
+        Path(args.out).write_text(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
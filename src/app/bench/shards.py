@@ -0,0 +1,120 @@
+"""
+Search latency of a sharded store vs. one flat FaissStore.
+
+    python -m app.bench.shards --synthetic 1000000 --shards 2 4 8
+    python -m app.bench.shards --synthetic 200000 --index-type hnsw
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+from rich.console import Console
+from rich.table import Table
+
+from app.bench.quant import _queries, synthetic_vectors
+from app.rag.sharded import ShardedStore
+from app.rag.vector_store import INDEX_TYPES, DocumentChunk, FaissStore
+
+console = Console()
+
+
+def _build(store, vectors: np.ndarray, documents: int, batch: int = 50000):
+    # Many small "documents" so the document-hash routing spreads them evenly.
+    for start in range(0, len(vectors), batch):
+        block = vectors[start : start + batch]
+        store.add(
+            block,
+            [DocumentChunk(text="", document=f"doc-{(start + i) % documents}") for i in range(len(block))],
+        )
+    store.save()
+
+
+def _measure(store, queries: np.ndarray, k: int, batch: int) -> dict:
+    latencies = []
+    results = []
+    for q in queries:
+        started = time.perf_counter()
+        hits = store.search(q[None, :], k)
+        latencies.append(time.perf_counter() - started)
+        results.append({(c.document, c.page, round(s, 4)) for c, s in hits})
+    started = time.perf_counter()
+    for start in range(0, len(queries), batch):
+        store.search_batch(queries[start : start + batch], k)
+    elapsed = time.perf_counter() - started
+    return {
+        "p50_ms": round(1000 * float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(1000 * float(np.percentile(latencies, 95)), 3),
+        "batch_qps": round(len(queries) / elapsed, 1),
+        "results": results,
+    }
+
+
+def run(
+    vectors: np.ndarray,
+    shard_counts: List[int],
+    index_type: str = "flat",
+    n_queries: int = 500,
+    k: int = 5,
+    batch: int = 32,
+    seed: int = 0,
+) -> List[dict]:
+    queries = _queries(vectors, n_queries, seed)
+    dim = vectors.shape[1]
+    documents = max(1, len(vectors) // 200)
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        single = FaissStore(dim, os.path.join(directory, "single.index"), index_type=index_type)
+        _build(single, vectors, documents)
+        single = FaissStore(dim, single.root, read_only=True)
+        baseline = _measure(single, queries, k, batch)
+        truth = baseline.pop("results")
+        rows.append({"store": "single", "shards": 1, **baseline, f"overlap@{k}": 1.0})
+        for count in shard_counts:
+            root = os.path.join(directory, f"sharded-{count}.index")
+            _build(ShardedStore(dim, root, shards=count, index_type=index_type), vectors, documents)
+            measured = _measure(ShardedStore(dim, root, read_only=True), queries, k, batch)
+            results = measured.pop("results")
+            # Same hits as the single store (scores rounded: summation order differs).
+            overlap = sum(len(a & b) for a, b in zip(results, truth)) / max(1, sum(map(len, truth)))
+            rows.append({"store": "sharded", "shards": count, **measured, f"overlap@{k}": round(overlap, 4)})
+    return rows
+
+
+def print_report(rows: List[dict], n_vectors: int, dim: int, index_type: str):
+    table = Table(title=f"{n_vectors} vectors x {dim} dims, {index_type}")
+    for column in rows[0]:
+        table.add_column(column, justify="left" if column == "store" else "right")
+    for row in rows:
+        table.add_row(*[str(v) for v in row.values()])
+    console.print(table)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--synthetic", type=int, default=200000, help="Number of clustered random vectors")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--shards", type=int, nargs="+", default=[2, 4, 8])
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=32, help="Queries per search_batch call for batch_qps")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write the rows as JSON here")
+    args = parser.parse_args(argv)
+
+    vectors = synthetic_vectors(args.synthetic, args.dim, args.seed)
+    rows = run(vectors, args.shards, args.index_type, args.queries, args.k, args.batch, args.seed)
+    print_report(rows, len(vectors), vectors.shape[1], args.index_type)
+    if args.out:
+        Path(args.out).write_text(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Startup budget: import time of `app.main` (without loading models) and which
+heavy libraries it pulls in, plus optional component load times.
+
+    python -m app.bench.startup --budget-ms 1500
+    python -m app.bench.startup --load        # also time each component load
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+# Must only be imported when a component is actually loaded, never by `import app.main`.
+HEAVY_MODULES = (
+    "torch",
+    "sentence_transformers",
+    "transformers",
+    "onnxruntime",
+    "tokenizers",
+    "faiss",
+    "pdfplumber",
+)
+
+_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+\d+ \|\s*(\S+)")
+
+
+def measure_import(module: str = "app.main") -> Tuple[float, List[Tuple[str, int]], List[str]]:
+    """
+    Import `module` in a fresh interpreter with startup_mode=lazy. Returns
+    wall seconds, top-level packages by import time of all their modules (us)
+    and the heavy modules that ended up loaded.
+    """
+    probe = (
+        "import sys, time; t = time.perf_counter(); import {m}; "
+        "print('WALL', time.perf_counter() - t); "
+        "print('HEAVY', ','.join(n for n in {heavy!r} if n in sys.modules))"
+    ).format(m=module, heavy=HEAVY_MODULES)
+    env = dict(os.environ, CW_STARTUP_MODE="lazy")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    wall = 0.0
+    heavy: List[str] = []
+    for line in proc.stdout.splitlines():
+        if line.startswith("WALL "):
+            wall = float(line.split()[1])
+        elif line.startswith("HEAVY "):
+            heavy = [n for n in line[6:].split(",") if n]
+    packages: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if match:
+            top = match.group(2).split(".")[0]
+            packages[top] = packages.get(top, 0) + int(match.group(1))
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)
+    return wall, ranked, heavy
+
+
+def measure_load() -> Dict[str, Optional[float]]:
+    """Build a lazy ChatService in-process and load each component in turn."""
+    os.environ["CW_STARTUP_MODE"] = "lazy"
+    from app.chat.service import ChatService
+
+    service = ChatService(eager=False)
+    timings: Dict[str, Optional[float]] = {}
+    for component in service.components():
+        started = time.perf_counter()
+        try:
+            component.get()
+            timings[component.name] = time.perf_counter() - started
+        except Exception:
+            timings[component.name] = None
+    return timings
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--budget-ms", type=float, default=1500.0, help="Fail above this import time")
+    parser.add_argument("--top", type=int, default=10, help="Slowest packages to list")
+    parser.add_argument("--load", action="store_true", help="Also time component loads")
+    args = parser.parse_args(argv)
+
+    wall, ranked, heavy = measure_import(args.module)
+    table = Table(title=f"import {args.module}: {wall * 1000:.0f} ms")
+    table.add_column("package")
+    table.add_column("ms", justify="right")
+    for name, us in ranked[: args.top]:
+        table.add_row(name, f"{us / 1000:.1f}")
+    console.print(table)
+
+    if args.load:
+        for name, seconds in measure_load().items():
+            shown = "failed" if seconds is None else f"{seconds * 1000:.0f} ms"
+            console.print(f"load {name}: {shown}")
+
+    failed = False
+    if heavy:
+        console.print(f"[red]Heavy modules imported at startup:[/red] {', '.join(heavy)}")
+        failed = True
+    if wall * 1000 > args.budget_ms:
+        console.print(f"[red]Import took {wall * 1000:.0f} ms, budget {args.budget_ms:.0f} ms.[/red]")
+        failed = True
+    if not failed:
+        console.print("[green]Startup within budget.[/green]")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
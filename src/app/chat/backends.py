@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set
+
+import httpx
+
+from app.utils import metrics
+
+# Worth another replica: the request never ran or the replica is overloaded.
+RETRYABLE_STATUS = {429, 502, 503, 504}
+
+
+class DeadlineExceededError(TimeoutError):
+    """No replica answered before the request deadline; says nothing about reachability."""
+
+
+def _retryable(exc: BaseException) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in RETRYABLE_STATUS
+    return isinstance(exc, httpx.TransportError)
+
+
+class Backend:
+    """One vLLM replica: its own keep-alive pool plus load/health counters."""
+
+    def __init__(self, url: str, limits: httpx.Limits, timeout: httpx.Timeout):
+        self.url = url
+        self.async_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+        self._lock = threading.Lock()
+        self.outstanding = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.ewma_s: Optional[float] = None
+        self.requests = 0
+        self.errors = 0
+
+    def ejected(self, now: float) -> bool:
+        return self.ejected_until > now
+
+    def begin(self):
+        with self._lock:
+            self.outstanding += 1
+            self.requests += 1
+
+    def end(self):
+        with self._lock:
+            self.outstanding -= 1
+
+    def succeeded(self, elapsed_s: float):
+        with self._lock:
+            self.failures = 0
+            self.ejected_until = 0.0
+            self.ewma_s = elapsed_s if self.ewma_s is None else 0.8 * self.ewma_s + 0.2 * elapsed_s
+        metrics.MODEL_BACKEND_REQUESTS.inc(backend=self.url, outcome="ok")
+
+    def failed(self, eject_after: int, eject_s: float):
+        with self._lock:
+            self.errors += 1
+            self.failures += 1
+            # Re-admitted replicas keep their failure count, so one more
+            # failure after the cool-down ejects them again.
+            if self.failures >= eject_after:
+                self.ejected_until = time.monotonic() + eject_s
+        metrics.MODEL_BACKEND_REQUESTS.inc(backend=self.url, outcome="error")
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "url": self.url,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "consecutive_failures": self.failures,
+            "ejected_for_s": round(max(0.0, self.ejected_until - now), 1),
+            "ewma_latency_ms": round(self.ewma_s * 1000, 1) if self.ewma_s is not None else None,
+        }
+
+    async def aclose(self):
+        await self.async_client.aclose()
+
+
+class BackendPool:
+    """
+    Routes completions across vLLM replicas.
+
+    - Least outstanding requests wins (ties: lower latency EWMA).
+    - Transport errors and 429/5xx count as failures; `eject_after` in a row
+      take a replica out of rotation for `eject_s`. If every replica is
+      ejected the pool fails open to the one due back soonest.
+    - Every call has a deadline; failed attempts are retried on another
+      replica (`max_retries`) while time remains.
+    - With `hedge_after_s`, a non-streaming call still unanswered after that
+      long is duplicated on a second replica and the first answer wins.
+      Streams fail over only before their first line.
+    """
+
+    def __init__(
+        self,
+        urls: Iterable[str],
+        max_connections: int = 100,
+        max_keepalive: int = 20,
+        connect_timeout_s: float = 5.0,
+        deadline_s: float = 60.0,
+        max_retries: int = 1,
+        eject_after: int = 3,
+        eject_s: float = 30.0,
+        hedge_after_s: float = 0.0,
+    ):
+        limits = httpx.Limits(
+            max_connections=max_connections, max_keepalive_connections=max_keepalive
+        )
+        timeout = httpx.Timeout(deadline_s, connect=connect_timeout_s)
+        self.backends = [Backend(url, limits, timeout) for url in urls]
+        if not self.backends:
+            raise ValueError("At least one model server URL is required.")
+        self.connect_timeout_s = connect_timeout_s
+        self.deadline_s = deadline_s
+        self.max_retries = max(0, max_retries)
+        self.eject_after = max(1, eject_after)
+        self.eject_s = eject_s
+        self.hedge_after_s = hedge_after_s
+
+    @classmethod
+    def from_settings(cls, settings) -> "BackendPool":
+        urls = [u.strip() for u in settings.model_server_urls.split(",") if u.strip()]
+        return cls(
+            urls or [settings.model_server_url],
+            max_connections=settings.model_pool_max_connections,
+            max_keepalive=settings.model_pool_max_keepalive,
+            connect_timeout_s=settings.model_connect_timeout_s,
+            deadline_s=settings.model_request_deadline_s,
+            max_retries=settings.model_max_retries,
+            eject_after=settings.model_eject_after_failures,
+            eject_s=settings.model_eject_seconds,
+            hedge_after_s=settings.model_hedge_after_ms / 1000.0,
+        )
+
+    def pick(self, exclude: Set[Backend] = frozenset(), allow_repeat: bool = True) -> Optional[Backend]:
+        now = time.monotonic()
+
+        def key(b: Backend):
+            return b.outstanding, b.ewma_s or 0.0
+
+        healthy = [b for b in self.backends if not b.ejected(now)]
+        fresh = [b for b in healthy if b not in exclude]
+        if fresh:
+            return min(fresh, key=key)
+        if not allow_repeat:
+            return None
+        if healthy:
+            return min(healthy, key=key)
+        return min(self.backends, key=lambda b: b.ejected_until)
+
+    def _timeout(self, remaining_s: float) -> httpx.Timeout:
+        remaining_s = max(0.001, remaining_s)
+        return httpx.Timeout(remaining_s, connect=min(self.connect_timeout_s, remaining_s))
+
+    async def _attempt(self, backend: Backend, payload: dict, remaining_s: float) -> dict:
+        backend.begin()
+        started = time.perf_counter()
+        try:
+            resp = await backend.async_client.post(
+                backend.url, json=payload, timeout=self._timeout(remaining_s)
+            )
+            resp.raise_for_status()
+            data = resp.json()
+        except Exception as exc:
+            if _retryable(exc):
+                backend.failed(self.eject_after, self.eject_s)
+            raise
+        finally:
+            backend.end()
+        backend.succeeded(time.perf_counter() - started)
+        return data
+
+    async def request(self, payload: dict, deadline_s: Optional[float] = None) -> dict:
+        """POST a non-streaming completion; returns the decoded JSON body."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (deadline_s or self.deadline_s)
+        tried: Set[Backend] = set()
+        pending: Dict[asyncio.Future, Backend] = {}
+        retries = self.max_retries
+        hedge_at = (
+            loop.time() + self.hedge_after_s
+            if self.hedge_after_s > 0 and len(self.backends) > 1
+            else None
+        )
+        last_exc: Optional[BaseException] = None
+
+        def launch(allow_repeat: bool = True) -> Optional[Backend]:
+            backend = self.pick(tried, allow_repeat=allow_repeat)
+            if backend is not None:
+                tried.add(backend)
+                task = asyncio.ensure_future(
+                    self._attempt(backend, payload, deadline - loop.time())
+                )
+                # Abandoned attempts (lost hedges, deadline) may still fail later.
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+                pending[task] = backend
+            return backend
+
+        hedge: Optional[Backend] = None
+        launch()
+        try:
+            while pending:
+                now = loop.time()
+                if now >= deadline:
+                    raise DeadlineExceededError("model request deadline exceeded") from last_exc
+                wake = deadline if hedge_at is None else min(deadline, hedge_at)
+                done, _ = await asyncio.wait(
+                    pending, timeout=wake - now, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    if hedge_at is not None and loop.time() >= hedge_at:
+                        hedge_at = None
+                        hedge = launch(allow_repeat=False)
+                        if hedge is not None:
+                            metrics.MODEL_HEDGES.inc(outcome="launched")
+                    continue
+                for task in done:
+                    backend = pending.pop(task)
+                    exc = task.exception()
+                    if exc is None:
+                        if hedge is not None and backend is hedge:
+                            metrics.MODEL_HEDGES.inc(outcome="won")
+                        return task.result()
+                    last_exc = exc
+                    if not _retryable(exc):
+                        raise exc
+                if not pending and retries > 0 and loop.time() < deadline:
+                    retries -= 1
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+        if isinstance(last_exc, httpx.ReadTimeout):
+            # The attempt's read timeout is the time left: the replica answered too slowly.
+            raise DeadlineExceededError("model request deadline exceeded") from last_exc
+        raise last_exc
+
+    async def stream_lines(self, payload: dict) -> AsyncIterator[str]:
+        """
+        POST a streaming completion and yield its raw lines. The deadline
+        bounds the wait for each line, not the whole generation.
+        """
+        tried: Set[Backend] = set()
+        last_exc: Optional[BaseException] = None
+        for _ in range(self.max_retries + 1):
+            backend = self.pick(tried)
+            tried.add(backend)
+            yielded = False
+            backend.begin()
+            started = time.perf_counter()
+            try:
+                async with backend.async_client.stream(
+                    "POST", backend.url, json=payload, timeout=self._timeout(self.deadline_s)
+                ) as resp:
+                    resp.raise_for_status()
+                    async for line in resp.aiter_lines():
+                        yielded = True
+                        yield line
+            except GeneratorExit:
+                # The consumer stopped reading, normally at `data: [DONE]`: the replica served it.
+                backend.succeeded(time.perf_counter() - started)
+                raise
+            except Exception as exc:
+                if _retryable(exc):
+                    backend.failed(self.eject_after, self.eject_s)
+                if yielded or not _retryable(exc):
+                    raise
+                last_exc = exc
+                continue
+            finally:
+                backend.end()
+            backend.succeeded(time.perf_counter() - started)
+            return
+        raise last_exc
+
+    def stats(self) -> List[dict]:
+        return [b.stats() for b in self.backends]
+
+    async def aclose(self):
+        for backend in self.backends:
+            await backend.aclose()
@@ -1,31 +1,90 @@
-import httpx
+import json
+import time
+from typing import AsyncIterator, Dict, List, Union
+
+from app.chat.backends import BackendPool
 from app.config import get_settings
+from app.utils import metrics
+
+SYSTEM_PROMPT = "You are a concise, safety-focused assistant."
+
+# A bare user prompt, or complete chat messages (see app.chat.prompt).
+Prompt = Union[str, List[Dict[str, str]]]
 
 
 class ModelClient:
     """
     Minimal HTTP client for vLLM OpenAI-compatible endpoint.
-    Replace with your deployment details as needed.
+    Requests go through a BackendPool, so one or several replicas
+    (`model_server_urls`) can serve them.
     """
 
     def __init__(self):
         self.settings = get_settings()
-        self.client = httpx.Client(timeout=30)
+        self.pool = BackendPool.from_settings(self.settings)
 
-    def generate(self, prompt: str) -> str:
+    def _payload(self, prompt: Prompt, stream: bool = False) -> dict:
         # This follows the OpenAI /v1/chat/completions style used by vLLM.
+        if isinstance(prompt, str):
+            messages = [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt},
+            ]
+        else:
+            messages = prompt
         payload = {
             "model": self.settings.model_name,
-            "messages": [
-                {"role": "system", "content": "You are a concise, safety-focused assistant."},
-                {"role": "user", "content": prompt},
-            ],
+            "messages": messages,
             "temperature": 0.3,
             "max_tokens": 512,
         }
-        resp = self.client.post(self.settings.model_server_url, json=payload)
-        resp.raise_for_status()
-        data = resp.json()
-        # vLLM returns choices[0].message.content in OpenAI format
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    async def agenerate(self, prompt: Prompt) -> str:
+        with metrics.stage("model"), metrics.MODEL_INFLIGHT.track():
+            data = await self.pool.request(self._payload(prompt))
         return data["choices"][0]["message"]["content"]
 
+    async def warmup(self, prompt: Prompt = "ping"):
+        """One-token completion; raises until the model server can answer."""
+        payload = self._payload(prompt)
+        payload["max_tokens"] = 1
+        await self.pool.request(payload, deadline_s=10)
+
+    async def stream(self, prompt: Prompt) -> AsyncIterator[str]:
+        """
+        Yield completion text deltas as vLLM produces them (`stream: true`).
+        vLLM sends OpenAI-style SSE lines: `data: {...}` and a final `data: [DONE]`.
+        Records `model_first_token` and `model` (whole stream) stage timings.
+        """
+        started = time.perf_counter()
+        first = True
+        with metrics.stage("model"), metrics.MODEL_INFLIGHT.track():
+            lines = self.pool.stream_lines(self._payload(prompt, stream=True))
+            try:
+                async for line in lines:
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    choices = chunk.get("choices") or []
+                    if not choices:
+                        continue
+                    delta = choices[0].get("delta", {}).get("content")
+                    if delta:
+                        if first:
+                            first = False
+                            metrics.observe_stage(
+                                "model_first_token", time.perf_counter() - started
+                            )
+                        yield delta
+            finally:
+                # Release the connection now rather than when the generator is collected.
+                await lines.aclose()
+
+    async def aclose(self):
+        await self.pool.aclose()
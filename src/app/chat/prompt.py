@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.chat.model_client import SYSTEM_PROMPT
+from app.config import get_settings
+from app.rag.retriever import looks_like_injection
+from app.rag.vector_store import DocumentChunk
+from app.safety import policies
+from app.schemas import SourceRef
+
+logger = logging.getLogger(__name__)
+
+# Rough English average for BPE tokenizers; only used when no tokenizer loads.
+_CHARS_PER_TOKEN = 4
+# A truncated chunk shorter than this is more noise than context.
+_MIN_PARTIAL_TOKENS = 48
+
+# Everything here is identical for every technical request, so it goes in the
+# system message: the rendered chat template then starts with the same tokens
+# each time and vLLM's prefix cache can skip prefilling it.
+STATIC_INSTRUCTIONS = "\n".join(
+    [
+        SYSTEM_PROMPT,
+        policies.AI_DISCLOSURE,
+        policies.TECH_BOUNDARY,
+        policies.PROMPT_INJECTION_WARNING,
+        "Use ONLY the context in the user message. If insufficient, say you lack information and suggest supervisor review.",
+        "Answer with concise steps, cite sources by name + section/page, and do not invent information.",
+    ]
+)
+
+
+@dataclass
+class PackedContext:
+    chunks: List[DocumentChunk]
+    texts: List[str]
+    tokens: int
+
+    @property
+    def citations(self) -> List[SourceRef]:
+        # A deduplicated chunk is cited at every place its text was found.
+        return [
+            SourceRef(document=s.document, section=s.section, page=s.page)
+            for c in self.chunks
+            for s in (c, *c.duplicates)
+        ]
+
+    def block(self) -> str:
+        return "\n---\n".join(self.texts)
+
+
+class TokenCounter:
+    """
+    Counts and truncates text in model tokens. Uses the Hugging Face tokenizer
+    named by `name`; if it cannot be loaded, falls back to ~4 chars/token.
+    """
+
+    def __init__(self, name: Optional[str]):
+        self.tokenizer = None
+        if name:
+            try:
+                from transformers import AutoTokenizer
+
+                self.tokenizer = AutoTokenizer.from_pretrained(name)
+            except Exception as exc:  # offline, unknown name, transformers missing
+                logger.warning(
+                    "Prompt tokenizer %r unavailable (%s); estimating %d chars/token.",
+                    name,
+                    exc.__class__.__name__,
+                    _CHARS_PER_TOKEN,
+                )
+        # Retrieved chunks repeat across requests; counting is the hot part.
+        self.count: Callable[[str], int] = lru_cache(maxsize=8192)(self._count)
+
+    def _count(self, text: str) -> int:
+        if self.tokenizer is None:
+            return -(-len(text) // _CHARS_PER_TOKEN)
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut `text` to at most `max_tokens`, backing off to a word boundary."""
+        if self.tokenizer is None:
+            cut = max_tokens * _CHARS_PER_TOKEN
+        else:
+            enc = self.tokenizer(
+                text, add_special_tokens=False, return_offsets_mapping=True
+            )
+            offsets = enc["offset_mapping"]
+            if len(offsets) <= max_tokens:
+                return text
+            cut = offsets[max_tokens][0]
+        if cut >= len(text):
+            return text
+        head = text[:cut]
+        space = head.rfind(" ")
+        return head[:space] if space > cut // 2 else head
+
+
+class PromptBuilder:
+    """
+    Assembles the technical-path prompt.
+
+    Retrieved chunks are filtered for injection markers, ordered by retrieval
+    score and packed until `context_tokens` is used up (each chunk capped at
+    `chunk_max_tokens`). Static policy text lives in a fixed system message so
+    the per-request part comes last.
+    """
+
+    def __init__(
+        self,
+        context_tokens: Optional[int] = None,
+        chunk_max_tokens: Optional[int] = None,
+        counter: Optional[TokenCounter] = None,
+    ):
+        settings = get_settings()
+        self.context_tokens = context_tokens or settings.prompt_context_tokens
+        self.chunk_max_tokens = chunk_max_tokens or settings.prompt_chunk_max_tokens
+        self.counter = counter or TokenCounter(settings.prompt_tokenizer)
+
+    def pack(self, results: List[Tuple[DocumentChunk, float]]) -> PackedContext:
+        packed = PackedContext(chunks=[], texts=[], tokens=0)
+        for chunk, _score in sorted(results, key=lambda r: r[1], reverse=True):
+            if looks_like_injection(chunk.text):
+                continue
+            remaining = self.context_tokens - packed.tokens
+            if remaining < _MIN_PARTIAL_TOKENS:
+                break
+            text = chunk.text
+            n = self.counter.count(text)
+            limit = min(self.chunk_max_tokens, remaining)
+            if n > limit:
+                text = self.counter.truncate(text, limit)
+                n = self.counter.count(text)
+            packed.chunks.append(chunk)
+            packed.texts.append(text)
+            packed.tokens += n
+        return packed
+
+    def warmup_messages(self) -> List[Dict[str, str]]:
+        """Shares the static prefix, so a warm-up also fills the prefix cache."""
+        return [
+            {"role": "system", "content": STATIC_INSTRUCTIONS},
+            {"role": "user", "content": "ping"},
+        ]
+
+    def messages(self, query: str, context: PackedContext) -> List[Dict[str, str]]:
+        citation_lines = [
+            f"- {c.document} ({c.section or 'unknown section'} p.{c.page or '?'})"
+            for c in context.citations
+        ]
+        user = "\n".join(
+            [
+                "Context:",
+                context.block(),
+                "Citations:",
+                "\n".join(citation_lines),
+                "User question:",
+                query,
+            ]
+        )
+        return [
+            {"role": "system", "content": STATIC_INSTRUCTIONS},
+            {"role": "user", "content": user},
+        ]
@@ -1,82 +1,425 @@
 from __future__ import annotations
 
-from typing import List, Tuple
+import asyncio
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
 
-from app.chat.model_client import ModelClient
-from app.rag.retriever import Retriever, sanitize_context
+import httpx
+
+from app.chat.model_client import ModelClient, Prompt
+from app.chat.prompt import PromptBuilder
+from app.chat.sessions import SessionCache, SessionTurn
+from app.config import get_settings
+from app.gpu.service import GPUService, GPUUnavailableError
+from app.rag.retriever import Retriever
+from app.rag.vector_store import ChunkFilter, DocumentChunk
 from app.safety import policies
 from app.safety.crisis import CRISIS_TEMPLATE, detect_crisis
 from app.safety.playbooks import wellbeing_response
-from app.schemas import ChatRequest, ChatResponse, Message, SourceRef
+from app.schemas import ChatBatchResult, ChatRequest, ChatResponse, Message, SourceRef
+from app.utils import metrics
+from app.utils.audit import AuditLog, AuditRecord
+from app.utils.concurrency import run_cpu
+from app.utils.startup import Component
 
 
 class ChatService:
-    def __init__(self):
+    """
+    Chat orchestration. With `eager=False` the heavy components (embedding
+    model, vector store, prompt tokenizer) load on first use or via `load()`;
+    crisis and wellbeing replies never wait for them.
+
+    Chats that carry a `session_id` are screened and retrieved incrementally
+    (see `app.chat.sessions`); the model still gets every user message.
+    """
+
+    def __init__(self, eager: bool = True):
         self.model = ModelClient()
-        self.retriever = Retriever()
+        self.retriever = Retriever(eager=eager, live=True)
+        self.prompts_component = Component("prompt_tokenizer", PromptBuilder)
+        if eager:
+            self.prompts_component.get()
+        # Set by the app once GPU control is configured; model traffic keeps it awake.
+        self.gpu: Optional[GPUService] = None
+        settings = get_settings()
+        self.audit: Optional[AuditLog] = None
+        if settings.audit_log_enabled:
+            self.audit = AuditLog(
+                settings.log_db_path,
+                batch_size=settings.audit_batch_size,
+                flush_interval_s=settings.audit_flush_interval_ms / 1000,
+                queue_size=settings.audit_queue_size,
+            )
+        self.sessions: Optional[SessionCache] = None
+        if settings.session_cache_size > 0:
+            self.sessions = SessionCache(
+                settings.session_cache_size,
+                settings.session_ttl_seconds,
+                settings.session_history_weight,
+            )
+
+    @property
+    def prompts(self) -> PromptBuilder:
+        return self.prompts_component.get()
+
+    def components(self) -> List[Component]:
+        return [
+            self.retriever.embedder_component,
+            self.retriever.store_component,
+            self.prompts_component,
+        ]
+
+    def load(self):
+        """Load every component that is not loaded yet; failures stay visible in `components()`."""
+        for component in self.components():
+            try:
+                component.get()
+            except Exception:
+                pass
+
+    @contextmanager
+    def _record_chat(self, endpoint: str, req: ChatRequest) -> Iterator[Callable[..., None]]:
+        """
+        Count each chat once under its response path (the safety_notes value,
+        or `technical`) and queue its audit record. Chats that end without a
+        counted response are `error`, or `cancelled` if the client went away.
+        """
+        started = time.perf_counter()
+        outcome: Dict[str, Any] = {"path": None, "citations": [], "error": None}
+
+        def count(
+            safety_notes: Optional[str],
+            citations: List[SourceRef] = (),
+            error: Optional[str] = None,
+        ):
+            if error is not None:
+                outcome["error"] = error
+                return
+            outcome["path"] = safety_notes or "technical"
+            outcome["citations"] = citations
+
+        try:
+            yield count
+        except Exception as exc:
+            outcome["error"] = outcome["error"] or exc.__class__.__name__
+            raise
+        except BaseException:
+            outcome["path"] = outcome["path"] or "cancelled"
+            raise
+        finally:
+            path = outcome["path"] or "error"
+            metrics.CHAT_RESPONSES.inc(endpoint=endpoint, path=path)
+            self._audit(
+                endpoint,
+                req,
+                path,
+                started,
+                outcome["citations"],
+                error=outcome["error"],
+                stages=metrics.request_stages(),
+            )
+
+    def _audit(
+        self,
+        endpoint: str,
+        req: ChatRequest,
+        path: str,
+        started: float,
+        citations: List[SourceRef],
+        error: Optional[str] = None,
+        stages: Optional[Dict[str, float]] = None,
+    ):
+        if self.audit is None:
+            return
+        user_text = self._user_text(req.messages)
+        self.audit.log(
+            AuditRecord(
+                endpoint=endpoint,
+                mode=req.mode,
+                path=path,
+                latency_s=time.perf_counter() - started,
+                user_chars=len(user_text),
+                user_text=user_text if get_settings().audit_log_text else None,
+                citations=[
+                    {"document": c.document, "section": c.section, "page": c.page}
+                    for c in citations
+                ],
+                stages=stages or {},
+                error=error,
+            )
+        )
+
+    async def ahandle_chat(self, req: ChatRequest) -> ChatResponse:
+        """
+        Async-native pipeline: CPU stages run on the bounded executor and the
+        model call is awaited, so no request thread is held during generation.
+        """
+        with metrics.CHAT_INFLIGHT.track(endpoint="chat"), self._record_chat("chat", req) as count:
+            early, prompt, citations = await self._aprepare(req)
+            if early is not None:
+                count(early.safety_notes)
+                return early
+            async with self._model_session():
+                model_reply = await self.model.agenerate(prompt)
+            count(None, citations)
+            return ChatResponse(reply=model_reply, citations=citations)
+
+    async def stream_chat(
+        self, req: ChatRequest
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Streaming variant of ahandle_chat. Yields (event, payload) pairs:
+        `citations` first, then `token` deltas, then `done` (or `error`).
+        Short-circuit paths (crisis, wellbeing, no context) emit their full
+        reply as a single token so clients handle every path the same way.
+        """
+        with metrics.CHAT_INFLIGHT.track(endpoint="stream"), self._record_chat("stream", req) as count:
+            early, prompt, citations = await self._aprepare(req)
+            if early is not None:
+                count(early.safety_notes)
+                yield "citations", {"citations": early.citations}
+                yield "token", {"text": early.reply}
+                yield "done", {"safety_notes": early.safety_notes}
+                return
+
+            yield "citations", {"citations": citations}
+            try:
+                async with self._model_session():
+                    async for delta in self.model.stream(prompt):
+                        yield "token", {"text": delta}
+            except GPUUnavailableError as exc:
+                count(None, error=str(exc))
+                yield "error", {"detail": str(exc)}
+                return
+            except Exception as exc:  # surface upstream failures to the client
+                count(None, error=f"model server error: {exc.__class__.__name__}")
+                yield "error", {"detail": f"model server error: {exc.__class__.__name__}"}
+                return
+            count(None, citations)
+            yield "done", {"safety_notes": None}
+
+    async def batch_chat(
+        self, reqs: List[ChatRequest], concurrency: int
+    ) -> AsyncIterator[ChatBatchResult]:
+        """
+        Bulk variant for offline evaluation and replay. Requests go through
+        the same safety screen; technical ones are retrieved together in
+        slices of `chat_batch_retrieval_size` (one encode call, one index
+        call) and generated with at most `concurrency` model calls in flight.
+        Results are yielded as they finish, so out of order.
+        """
+        settings = get_settings()
+        started = time.perf_counter()
+        results: "asyncio.Queue[Optional[ChatBatchResult]]" = asyncio.Queue()
+        model_slots = asyncio.Semaphore(max(1, concurrency))
+        generations: List[asyncio.Task] = []
+
+        def finish(index: int, response: ChatResponse):
+            path = response.safety_notes or "technical"
+            metrics.CHAT_RESPONSES.inc(endpoint="batch", path=path)
+            # Batch latencies run from the start of the batch.
+            self._audit("batch", reqs[index], path, started, response.citations)
+            results.put_nowait(ChatBatchResult(index=index, response=response))
+
+        def fail(index: int, detail: str):
+            metrics.CHAT_RESPONSES.inc(endpoint="batch", path="error")
+            self._audit("batch", reqs[index], "error", started, [], error=detail)
+            results.put_nowait(ChatBatchResult(index=index, error=detail))
 
-    def handle_chat(self, req: ChatRequest) -> ChatResponse:
-        user_text = " ".join([m.content for m in req.messages if m.role == "user"])
-        crisis_signal = detect_crisis(user_text)
-        if crisis_signal.triggered:
+        async def generate(index: int, prompt: Prompt, citations: List[SourceRef]):
+            async with model_slots:
+                try:
+                    async with self._model_session():
+                        reply = await self.model.agenerate(prompt)
+                except GPUUnavailableError as exc:
+                    fail(index, str(exc))
+                    return
+                except Exception as exc:
+                    fail(index, f"model server error: {exc.__class__.__name__}")
+                    return
+            finish(index, ChatResponse(reply=reply, citations=citations))
+
+        async def produce():
+            try:
+                size = max(1, settings.chat_batch_retrieval_size)
+                for start in range(0, len(reqs), size):
+                    technical: List[Tuple[int, str]] = []
+                    for index in range(start, min(start + size, len(reqs))):
+                        req = reqs[index]
+                        user_text = self._user_text(req.messages)
+                        early = self._screen(user_text, req.mode)
+                        if early is not None:
+                            finish(index, early)
+                        else:
+                            technical.append((index, user_text))
+                    if not technical:
+                        continue
+                    try:
+                        hits = await run_cpu(
+                            self.retriever.retrieve_batch,
+                            [text for _, text in technical],
+                            4,
+                            [self._chunk_filter(reqs[index]) for index, _ in technical],
+                        )
+                        if not self.prompts_component.ready:
+                            await asyncio.to_thread(self.prompts_component.get)
+                    except Exception as exc:
+                        for index, _ in technical:
+                            fail(index, f"retrieval error: {exc.__class__.__name__}")
+                        continue
+                    for (index, user_text), found in zip(technical, hits):
+                        early, prompt, citations = self._from_results(user_text, found)
+                        if early is not None:
+                            finish(index, early)
+                        else:
+                            generations.append(
+                                asyncio.ensure_future(generate(index, prompt, citations))
+                            )
+                await asyncio.gather(*generations)
+            finally:
+                results.put_nowait(None)
+
+        with metrics.CHAT_INFLIGHT.track(endpoint="batch"):
+            producer = asyncio.ensure_future(produce())
+            try:
+                while True:
+                    item = await results.get()
+                    if item is None:
+                        break
+                    yield item
+                await producer
+            finally:
+                # Client went away mid-batch: stop scheduling and drop queued calls.
+                producer.cancel()
+                for task in generations:
+                    task.cancel()
+
+    @asynccontextmanager
+    async def _model_session(self):
+        """
+        Wrap a model call with GPU pod bookkeeping: wait for (or boot) the pod
+        in auto-start mode, and count the call as activity for the idle timer.
+        """
+        gpu = self.gpu
+        if gpu is None:
+            yield
+            return
+        if get_settings().runpod_auto_start:
+            await gpu.ensure_ready(
+                lambda: self.model.warmup(self.prompts.warmup_messages())
+            )
+        else:
+            gpu.touch()
+        try:
+            yield
+        except httpx.TransportError:
+            gpu.mark_unreachable()
+            raise
+        finally:
+            gpu.touch()
+
+    async def _aprepare(
+        self, req: ChatRequest
+    ) -> Tuple[Optional[ChatResponse], Prompt, List[SourceRef]]:
+        """
+        Run the safety and retrieval stages shared by all chat variants.
+        Returns a final response for short-circuit paths, otherwise the
+        prompt and citations for generation. Retrieval is started before the
+        crisis scan so the two stages overlap; its result is discarded if the
+        conversation short-circuits.
+        """
+        user_text = self._user_text(req.messages)
+        turn = self._begin_turn(req)
+        retrieval = None
+        chunk_filter = self._chunk_filter(req)
+        if req.mode != "wellbeing":
+            retrieval = self.retriever.start_retrieval(
+                user_text if turn is None else turn.query,
+                k=4,
+                chunk_filter=chunk_filter,
+                blend=self._blend(turn),
+            )
+
+        early = self._screen(user_text, req.mode, turn)
+        if early is not None:
+            if retrieval is not None:
+                retrieval.cancel()
+            return early, "", []
+
+        results = await retrieval
+        if turn is not None:
+            results = turn.carry(results, self.retriever.store.generation, chunk_filter)
+        if not self.prompts_component.ready:
+            await asyncio.to_thread(self.prompts_component.get)
+        return self._from_results(user_text, results)
+
+    @staticmethod
+    def _chunk_filter(req: ChatRequest) -> Optional[ChunkFilter]:
+        f = req.filters
+        if f is None or (not f.documents and f.page_from is None and f.page_to is None):
+            return None
+        return ChunkFilter(
+            documents=tuple(sorted(set(f.documents))) if f.documents else None,
+            page_from=f.page_from,
+            page_to=f.page_to,
+        )
+
+    @staticmethod
+    def _user_text(messages: List[Message]) -> str:
+        return " ".join([m.content for m in messages if m.role == "user"])
+
+    def _begin_turn(self, req: ChatRequest) -> Optional[SessionTurn]:
+        if self.sessions is None or not req.session_id:
+            return None
+        return self.sessions.begin(
+            req.session_id, [m.content for m in req.messages if m.role == "user"]
+        )
+
+    @staticmethod
+    def _blend(turn: Optional[SessionTurn]):
+        # Weight 0 searches the latest turn alone, which keeps the result cache usable.
+        return turn.blend if turn is not None and turn.weight > 0 else None
+
+    def _screen(
+        self, user_text: str, mode: str, turn: Optional[SessionTurn] = None
+    ) -> Optional[ChatResponse]:
+        with metrics.stage("crisis"):
+            if turn is None:
+                triggered = detect_crisis(user_text).triggered
+            else:
+                triggered = turn.screen()
+        if triggered:
             reply = CRISIS_TEMPLATE.format(disclosure=policies.AI_DISCLOSURE)
             return ChatResponse(
                 reply=reply, citations=[], safety_notes="crisis_escalation_triggered"
             )
 
-        mode = req.mode
         if mode == "wellbeing":
             return ChatResponse(
                 reply=wellbeing_response(),
                 citations=[],
                 safety_notes="wellbeing_playbook",
             )
+        return None
 
-        # Default: try technical with RAG; fallback to wellbeing playbook if no context.
-        citations, context_block = self._retrieve_context(user_text)
-        if not context_block:
-            return ChatResponse(
-                reply=f"{policies.AI_DISCLOSURE} {policies.TECH_BOUNDARY} {policies.REFUSAL_NO_CONTEXT}",
-                citations=[],
-                safety_notes="no_context",
+    def _from_results(
+        self, user_text: str, results: List[Tuple[DocumentChunk, float]]
+    ) -> Tuple[Optional[ChatResponse], Prompt, List[SourceRef]]:
+        with metrics.stage("sanitize"):
+            context = self.prompts.pack(results)
+        if not context.chunks:
+            return (
+                ChatResponse(
+                    reply=f"{policies.AI_DISCLOSURE} {policies.TECH_BOUNDARY} {policies.REFUSAL_NO_CONTEXT}",
+                    citations=[],
+                    safety_notes="no_context",
+                ),
+                "",
+                [],
             )
-
-        prompt = self._build_prompt(user_text, context_block, citations)
-        model_reply = self.model.generate(prompt)
-        return ChatResponse(reply=model_reply, citations=citations)
-
-    def _retrieve_context(self, query: str) -> Tuple[List[SourceRef], str]:
-        results = self.retriever.retrieve(query, k=4)
-        if not results:
-            return [], ""
-        chunks = [r[0] for r in results]
-        citations = [
-            SourceRef(document=c.document, section=c.section, page=c.page)
-            for c in chunks
-        ]
-        context_block = sanitize_context(chunks)
-        return citations, context_block
-
-    def _build_prompt(
-        self, query: str, context_block: str, citations: List[SourceRef]
-    ) -> str:
-        citation_lines = [
-            f"- {c.document} ({c.section or 'unknown section'} p.{c.page or '?'})"
-            for c in citations
-        ]
-        return "\n".join(
-            [
-                policies.AI_DISCLOSURE,
-                policies.TECH_BOUNDARY,
-                policies.PROMPT_INJECTION_WARNING,
-                "Use ONLY the context below. If insufficient, say you lack information and suggest supervisor review.",
-                "Context:",
-                context_block,
-                "Citations:",
-                "\n".join(citation_lines),
-                "User question:",
-                query,
-                "Answer with concise steps, cite sources by name + section/page, and do not invent information.",
-            ]
-        )
-
+        # Cite only what the model actually saw.
+        citations = context.citations
+        with metrics.stage("prompt"):
+            prompt = self.prompts.messages(user_text, context)
+        return None, prompt, citations
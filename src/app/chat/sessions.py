@@ -0,0 +1,178 @@
+"""
+Per-conversation state for multi-turn chats that send a `session_id`.
+
+Without a session every turn re-screens the whole history and embeds all user
+messages joined together, so a turn costs more the longer the conversation.
+With one, the process remembers how many user messages it has screened
+(verified by a digest of them), whether any of them triggered the crisis
+path, the last query vector and the last turn's hits; a turn then screens
+only its new messages (joined to the last screened one, so phrases split
+across turns still match) and embeds only its latest one.
+
+Sessions live in a bounded LRU/TTL cache per process. A session that was
+evicted, lives on another worker, or whose history the client changed is
+simply started again from a full scan, so safety never depends on the cache.
+"""
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.rag.cache import TTLCache
+from app.rag.vector_store import ChunkFilter, DocumentChunk
+from app.safety.crisis import detect_crisis
+
+
+@dataclass
+class Session:
+    scanned: int = 0
+    # Digest of the first `scanned` user messages.
+    digest: bytes = b""
+    crisis: bool = False
+    history: Optional[np.ndarray] = None
+    results: List[Tuple[DocumentChunk, float]] = field(default_factory=list)
+    # Store generation and filter `results` came from.
+    generation: Optional[int] = None
+    chunk_filter: Optional[ChunkFilter] = None
+
+
+def _digests(messages: List[str], upto: int) -> Tuple[bytes, bytes]:
+    """(digest of messages[:upto], digest of all messages), in one pass."""
+    h = hashlib.blake2b(digest_size=16)
+    prefix = h.digest()
+    for i, message in enumerate(messages):
+        if i == upto:
+            prefix = h.digest()
+        data = message.encode("utf-8")
+        h.update(len(data).to_bytes(8, "little"))
+        h.update(data)
+    full = h.digest()
+    return (full if upto >= len(messages) else prefix), full
+
+
+class SessionTurn:
+    """One request's view of its session; updates it as the stages run."""
+
+    def __init__(self, session: Session, messages: List[str], start: int, digest: bytes, weight: float):
+        self.session = session
+        self.messages = messages
+        self.start = start
+        self.digest = digest
+        self.weight = weight
+        # This turn's blended vector; becomes the session's history in carry().
+        self.vector: Optional[np.ndarray] = None
+
+    @property
+    def query(self) -> str:
+        """What is embedded: the latest user message only."""
+        return self.messages[-1] if self.messages else ""
+
+    @property
+    def new_text(self) -> str:
+        """
+        The new messages, preceded by the last one already screened: a phrase
+        split across turns ("...I want to kill" / "myself") is still matched,
+        as it was when the whole history was joined and scanned.
+        """
+        return " ".join(self.messages[max(self.start - 1, 0) :])
+
+    def screen(self) -> bool:
+        """
+        Crisis check over the messages not screened before; once a session
+        has triggered it, every later turn does too (as the full scan did).
+        """
+        session = self.session
+        if not session.crisis and self.start < len(self.messages):
+            session.crisis = detect_crisis(self.new_text).triggered
+        session.scanned = len(self.messages)
+        session.digest = self.digest
+        return session.crisis
+
+    def blend(self, q_emb: np.ndarray) -> np.ndarray:
+        """
+        Mix the latest turn's vector with the session's history vector. The
+        session keeps the result only if the turn gets as far as `carry()`:
+        retrieval overlaps the crisis scan, and a short-circuited turn must
+        not steer the next one.
+        """
+        history = self.session.history
+        q = q_emb.reshape(1, -1).astype(np.float32)
+        if history is not None and history.shape == q.shape:
+            q = (1 - self.weight) * q + self.weight * history
+            q /= max(float(np.linalg.norm(q)), 1e-12)
+        self.vector = q
+        return q
+
+    def carry(
+        self,
+        results: List[Tuple[DocumentChunk, float]],
+        generation: int,
+        chunk_filter: Optional[ChunkFilter] = None,
+    ) -> List[Tuple[DocumentChunk, float]]:
+        """
+        This turn's hits plus the previous turn's (same store generation and
+        filter only, so a filtered follow-up never cites other documents) at
+        `weight` times their score, so follow-ups keep context. Commits the
+        turn to the session.
+        """
+        session = self.session
+        carried = []
+        if (
+            self.weight > 0
+            and session.generation == generation
+            and session.chunk_filter == chunk_filter
+        ):
+            seen = {(c.document, c.section, c.page) for c, _ in results}
+            carried = [
+                (c, score * self.weight)
+                for c, score in session.results
+                if (c.document, c.section, c.page) not in seen
+            ]
+        if self.vector is not None:
+            session.history = self.vector
+        session.results = list(results)
+        session.generation = generation
+        session.chunk_filter = chunk_filter
+        return list(results) + carried
+
+
+class SessionCache:
+    """
+    Bounded session store. `history_weight` is the share of earlier turns in
+    the query vector and of their hits' scores (0 = the latest turn alone).
+    Concurrent turns of one session are last-writer-wins; the worst case is
+    a later turn rescanning messages.
+    """
+
+    def __init__(self, maxsize: int, ttl_seconds: float, history_weight: float):
+        self.cache = TTLCache(maxsize, ttl_seconds)
+        self.history_weight = min(max(history_weight, 0.0), 1.0)
+        self.turns = 0
+        self.rescans = 0
+
+    def begin(self, session_id: str, messages: List[str]) -> SessionTurn:
+        """A turn over the conversation's user `messages`, oldest first."""
+        self.turns += 1
+        session = self.cache.get(session_id)
+        start = 0
+        if session is not None:
+            prefix, digest = _digests(messages, session.scanned)
+            if session.scanned <= len(messages) and prefix == session.digest:
+                start = session.scanned
+            else:
+                # Edited or different history: nothing carried over is trustworthy.
+                self.rescans += 1
+                session = None
+        else:
+            _, digest = _digests(messages, 0)
+        if session is None:
+            session = Session()
+        # Re-put on every turn: the TTL runs from the latest turn, not the first.
+        self.cache.put(session_id, session)
+        return SessionTurn(session, messages, start, digest, self.history_weight)
+
+    def stats(self) -> dict:
+        return {**self.cache.stats(), "turns": self.turns, "rescans": self.rescans}
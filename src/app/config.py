@@ -12,17 +12,184 @@ class Settings(BaseSettings):
         description="vLLM HTTP endpoint for generation",
     )
     model_name: str = Field(default="Qwen2.5-3B-Instruct")
+    model_server_urls: str = Field(
+        default="",
+        description="Comma-separated vLLM replicas; overrides model_server_url when set",
+    )
+    model_pool_max_connections: int = Field(default=100, description="Connections per replica")
+    model_pool_max_keepalive: int = Field(default=20, description="Idle keep-alive connections per replica")
+    model_connect_timeout_s: float = Field(default=5.0)
+    model_request_deadline_s: float = Field(
+        default=60.0,
+        description="Deadline per completion, across retries (streams: per line)",
+    )
+    model_max_retries: int = Field(
+        default=1, description="Retries on another replica after connection errors or 429/5xx"
+    )
+    model_eject_after_failures: int = Field(
+        default=3, description="Consecutive failures before a replica is taken out of rotation"
+    )
+    model_eject_seconds: float = Field(default=30.0, description="How long an ejected replica sits out")
+    model_hedge_after_ms: float = Field(
+        default=0.0,
+        description="Send a duplicate request to a second replica if no answer after this long (0 = off)",
+    )
 
     # Embeddings
     embedding_model: str = Field(default="BAAI/bge-small-en-v1.5")
+    embedding_backend: str = Field(
+        default="torch",
+        description="torch (sentence-transformers) | onnx (ONNX Runtime) | sidecar (shared process)",
+    )
+    embedding_onnx_dir: str = Field(
+        default="storage/onnx/bge-small-en-v1.5",
+        description="Directory written by `python -m app.rag.onnx_export`",
+    )
+    embedding_onnx_int8: bool = Field(
+        default=True, description="Run the dynamically quantized int8 ONNX model"
+    )
+    embedding_sidecar_socket: str = Field(
+        default="storage/embed.sock", description="Unix socket of `python -m app.rag.sidecar`"
+    )
+    embedding_threads: int = Field(
+        default=0, description="Intra-op threads for the embedding backend (0 = library default)"
+    )
+
+    embed_batching_enabled: bool = Field(
+        default=True, description="Coalesce concurrent query embeddings into batches"
+    )
+    embed_batch_max_size: int = Field(default=32, description="Max queries per encode call")
+    embed_batch_max_wait_ms: float = Field(
+        default=5.0, description="Max time the first query in a batch waits for company"
+    )
+
+    query_cache_enabled: bool = Field(
+        default=True, description="Cache query embeddings and top-k results"
+    )
+    query_cache_size: int = Field(default=2048, description="Entries per query cache")
+    query_cache_ttl_seconds: float = Field(default=600.0)
+
+    # Prompt assembly
+    prompt_context_tokens: int = Field(
+        default=1536, description="Token budget for retrieved context in a prompt"
+    )
+    prompt_chunk_max_tokens: int = Field(
+        default=512, description="Max tokens taken from any single retrieved chunk"
+    )
+    prompt_tokenizer: str | None = Field(
+        default=None,
+        description="HF repo id of the tokenizer used to count prompt tokens, e.g. "
+        "Qwen/Qwen2.5-3B-Instruct (unset or unloadable: ~4 chars/token)",
+    )
 
     # Vector store
     vector_store: str = Field(default="faiss", description="faiss or chroma")
     vector_store_path: str = Field(default="storage/faiss.index")
     chroma_path: str = Field(default="storage/chroma_db")
+    faiss_index_type: str = Field(
+        default="flat", description="flat | ivf_flat | ivf_pq | hnsw"
+    )
+    faiss_mmap: bool = Field(
+        default=True, description="Memory-map the FAISS index on load instead of copying it"
+    )
+    faiss_nlist: int = Field(default=1024, description="IVF coarse clusters")
+    faiss_pq_m: int = Field(default=16, description="IVF-PQ sub-quantizers (must divide dim)")
+    faiss_pq_nbits: int = Field(default=8, description="IVF-PQ bits per sub-quantizer code")
+    faiss_hnsw_m: int = Field(default=32, description="HNSW graph degree")
+    faiss_ef_construction: int = Field(default=200, description="HNSW build-time beam width")
+    faiss_nprobe: int = Field(default=16, description="IVF clusters scanned per query")
+    faiss_ef_search: int = Field(default=64, description="HNSW query-time beam width")
+    faiss_quantization: str = Field(
+        default="none",
+        description="none | sq8 | binary; quantized codes in RAM, float32 vectors on disk for rescoring",
+    )
+    faiss_rescore_factor: int = Field(
+        default=4, description="Quantized stores rescore k * this many candidates exactly"
+    )
+    faiss_filter_exact_max: int = Field(
+        default=20000,
+        description="Filtered searches over at most this many vectors score them exactly; "
+        "larger selections search the index with an ID selector",
+    )
+    vector_store_shards: int = Field(
+        default=1,
+        description="Shards for a new store, searched in parallel (an existing store keeps its "
+        "layout; reshard with `python -m app.rag.migrate --shards N`)",
+    )
+    vector_store_search_threads: int = Field(
+        default=0, description="Threads searching shards in parallel (0 = CPU count)"
+    )
+    faiss_keep_generations: int = Field(
+        default=2, description="Saved store generations kept on disk (older ones are deleted)"
+    )
+    vector_store_reload_interval_s: float = Field(
+        default=5.0,
+        description="How often the API checks for a newly published store generation (0 disables)",
+    )
+
+    # Ingestion
+    ingest_dedup_enabled: bool = Field(
+        default=True, description="Store near-identical chunks once, as one vector with several sources"
+    )
+    ingest_dedup_threshold: float = Field(
+        default=0.8,
+        description="Estimated Jaccard similarity of word 5-gram shingles at which chunks are merged",
+    )
+    dedup_max_sources: int = Field(
+        default=4, description="Extra citations returned for a hit whose text appears in several places"
+    )
+
+    # Batch chat (/v1/chat/batch)
+    chat_batch_max_requests: int = Field(default=5000, description="Max requests per batch call")
+    chat_batch_concurrency: int = Field(default=8, description="Max parallel model calls per batch")
+    chat_batch_retrieval_size: int = Field(
+        default=256, description="Queries embedded and searched together"
+    )
+
+    # Multi-turn sessions (requests with a session_id)
+    session_cache_size: int = Field(
+        default=2048, description="Conversations remembered per process, LRU (0 disables sessions)"
+    )
+    session_ttl_seconds: float = Field(default=1800.0, description="Idle time before a session is forgotten")
+    session_history_weight: float = Field(
+        default=0.3,
+        description="Share of earlier turns in the query vector and in carried-over hit scores "
+        "(0 = latest turn only). Above 0, session turns bypass the retrieval result cache: "
+        "their blended query vector is unique to the conversation",
+    )
 
-    # Logging DB (not fully wired yet)
+    # Startup
+    startup_mode: str = Field(
+        default="eager",
+        description="eager: load models/index before serving | background: load after startup, "
+        "/ready reports progress | lazy: load on first use",
+    )
+
+    # Concurrency
+    cpu_executor_workers: int = Field(
+        default=4,
+        description="Threads for CPU-bound stages (embedding, vector search) in async routes",
+    )
+
+    # Observability
+    server_timing_enabled: bool = Field(
+        default=False,
+        description="Add a Server-Timing header with per-stage durations to responses",
+    )
+
+    # Audit log (SQLite, written by a background thread)
     log_db_path: str = Field(default="storage/logs.sqlite")
+    audit_log_enabled: bool = Field(default=True, description="Record every chat in log_db_path")
+    audit_log_text: bool = Field(
+        default=False, description="Also store the user's message text (otherwise only its length)"
+    )
+    audit_batch_size: int = Field(default=256, description="Records per insert transaction")
+    audit_flush_interval_ms: float = Field(
+        default=1000.0, description="Flush a partial batch this long after its first record"
+    )
+    audit_queue_size: int = Field(
+        default=10000, description="Queued records before new ones are dropped (and counted)"
+    )
 
     # Safety
     crisis_keywords: str = Field(
@@ -30,6 +197,10 @@ class Settings(BaseSettings):
         "jump off,hang myself,overdose,violent,assault,abuse,domestic violence",
         description="Comma-separated lexicon for quick crisis detection",
     )
+    crisis_lexicon_path: str | None = Field(
+        default=None,
+        description="Optional file of extra crisis terms, one per line (e.g. other languages)",
+    )
 
     # RunPod GPU control
     runpod_api_base: str = Field(
@@ -44,7 +215,23 @@ class Settings(BaseSettings):
     )
     runpod_idle_timeout_minutes: int = Field(
         default=30,
-        description="Auto-stop timeout after GPU activation if not manually stopped",
+        description="Stop the pod after this long without model traffic",
+    )
+    runpod_auto_start: bool = Field(
+        default=False,
+        description="Start the pod on demand and hold technical chats until it is ready",
+    )
+    runpod_cold_start_max_wait_s: float = Field(
+        default=180.0, description="Longest a chat waits for a cold pod before a 503"
+    )
+    runpod_cold_start_max_queue: int = Field(
+        default=64, description="Chats allowed to wait for a cold pod at once"
+    )
+    runpod_boot_timeout_s: float = Field(
+        default=600.0, description="Give up on a boot (pod + model server) after this long"
+    )
+    runpod_poll_interval_s: float = Field(
+        default=5.0, description="Pod status / warm-up retry interval while booting"
     )
 
     class Config:
@@ -1,56 +1,223 @@
 from __future__ import annotations
 
+import asyncio
 import threading
+import time
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Awaitable, Callable, Optional
 
 from app.config import get_settings
 from app.gpu.runpod_client import RunpodClient
+from app.utils import metrics
+
+
+class GPUUnavailableError(RuntimeError):
+    """The pod is not ready and a chat could not wait for it."""
+
+    def __init__(self, detail: str, retry_after_s: int = 30):
+        super().__init__(detail)
+        self.retry_after_s = retry_after_s
+
+
+def _pod_running(status: dict) -> bool:
+    """
+    RunPod reports the requested state in `desiredStatus` and leaves `runtime`
+    null until the container is actually up.
+    """
+    desired = str(status.get("desiredStatus") or status.get("status") or "").upper()
+    if desired not in ("RUNNING", "READY"):
+        return False
+    return "runtime" not in status or status["runtime"] is not None
 
 
 class GPUService:
     """
-    Controls RunPod GPU pod lifecycle with an optional idle auto-stop timer.
+    Controls RunPod GPU pod lifecycle with an activity-based idle auto-stop.
     Keeps state in-memory (sufficient for single-instance CPU server).
+
+    Model traffic calls `touch()`; the pod is stopped once no traffic has been
+    seen for the idle timeout. With `runpod_auto_start`, technical chats call
+    `ensure_ready()`, which boots a stopped pod, waits for it to come up and
+    sends a warm-up request, holding chats in a bounded queue meanwhile.
     """
 
     def __init__(self):
         self.settings = get_settings()
         self.client = RunpodClient()
+        self._lock = threading.Lock()
         self._stop_timer: Optional[threading.Timer] = None
-        self._active_until: Optional[datetime] = None
+        self._last_activity: Optional[float] = None
+        # unknown | stopped | starting | warming | ready
+        self.state = "unknown"
+        self.queue_depth = 0
+        self._boot: Optional[asyncio.Task] = None
+
+    @property
+    def idle_timeout_s(self) -> float:
+        return max(1, self.settings.runpod_idle_timeout_minutes) * 60.0
 
     def start(self) -> dict:
-        data = self.client.start_pod()
-        self._schedule_stop()
+        with metrics.stage("runpod_start"):
+            data = self.client.start_pod()
+        with self._lock:
+            if self.state != "ready":
+                self.state = "starting"
+        self.touch()
         return data
 
     def stop(self) -> dict:
         self._cancel_timer()
-        data = self.client.stop_pod()
-        self._active_until = None
+        with metrics.stage("runpod_stop"):
+            data = self.client.stop_pod()
+        with self._lock:
+            self.state = "stopped"
+            self._last_activity = None
         return data
 
     def status(self) -> dict:
-        return self.client.get_status()
+        with metrics.stage("runpod_status"):
+            data = self.client.get_status()
+        data = dict(data)
+        data["controller"] = self.controller_status()
+        return data
 
-    def _schedule_stop(self):
-        self._cancel_timer()
-        minutes = max(1, self.settings.runpod_idle_timeout_minutes)
-        self._active_until = datetime.utcnow() + timedelta(minutes=minutes)
-        self._stop_timer = threading.Timer(minutes * 60, self._auto_stop)
+    def controller_status(self) -> dict:
+        with self._lock:
+            stops_at = None
+            if self._last_activity is not None and self._stop_timer is not None:
+                remaining = self._last_activity + self.idle_timeout_s - time.monotonic()
+                stops_at = (datetime.utcnow() + timedelta(seconds=max(0.0, remaining))).isoformat() + "Z"
+            return {
+                "state": self.state,
+                "queue_depth": self.queue_depth,
+                "auto_start": self.settings.runpod_auto_start,
+                "idle_timeout_minutes": self.settings.runpod_idle_timeout_minutes,
+                "idle_stop_at": stops_at,
+            }
+
+    def touch(self):
+        """
+        Record model traffic. Re-arms the idle timer for a pod this service
+        started; a pod it has not seen start is left alone.
+        """
+        with self._lock:
+            self._last_activity = time.monotonic()
+            if self._stop_timer is None and self.state in ("starting", "warming", "ready"):
+                self._arm(self.idle_timeout_s)
+
+    def mark_unreachable(self):
+        """The model server stopped answering; re-check the pod on the next chat."""
+        with self._lock:
+            if self.state == "ready":
+                self.state = "unknown"
+
+    async def ensure_ready(self, warmup: Callable[[], Awaitable[None]]):
+        """
+        Return once the pod is serving, booting it if needed. All waiting chats
+        share one boot; each waits at most `runpod_cold_start_max_wait_s`.
+        """
+        if self.state == "ready":
+            self.touch()
+            return
+        with self._lock:
+            if self.queue_depth >= self.settings.runpod_cold_start_max_queue:
+                raise GPUUnavailableError("GPU is starting and the wait queue is full.")
+            self.queue_depth += 1
+            metrics.GPU_QUEUE_DEPTH.set(self.queue_depth)
+        try:
+            if self._boot is None or self._boot.done():
+                self._boot = asyncio.ensure_future(self._bring_up(warmup))
+            try:
+                await asyncio.wait_for(
+                    asyncio.shield(self._boot), self.settings.runpod_cold_start_max_wait_s
+                )
+            except asyncio.TimeoutError:
+                raise GPUUnavailableError("GPU is still starting; please retry shortly.")
+            except GPUUnavailableError:
+                raise
+            except Exception as exc:
+                raise GPUUnavailableError(f"GPU failed to start ({exc.__class__.__name__}).")
+        finally:
+            with self._lock:
+                self.queue_depth -= 1
+                metrics.GPU_QUEUE_DEPTH.set(self.queue_depth)
+        self.touch()
+
+    async def _bring_up(self, warmup: Callable[[], Awaitable[None]]):
+        started = time.perf_counter()
+        try:
+            await self._wait_running()
+            # RUNNING only means the container is up; the model server may still be loading.
+            with self._lock:
+                self.state = "warming"
+            await self._wait_serving(warmup)
+        except BaseException:
+            with self._lock:
+                self.state = "unknown"
+            raise
+        with self._lock:
+            self.state = "ready"
+        metrics.observe_stage("gpu_cold_start", time.perf_counter() - started)
+        self.touch()
+
+    async def _wait_running(self):
+        deadline = time.monotonic() + self.settings.runpod_boot_timeout_s
+        status = await asyncio.to_thread(self.client.get_status)
+        if _pod_running(status):
+            return
+        with self._lock:
+            # A manual /gpu/start already asked RunPod to boot it.
+            booting = self.state == "starting"
+            self.state = "starting"
+        if not booting:
+            with metrics.stage("runpod_start"):
+                await asyncio.to_thread(self.client.start_pod)
+        while not _pod_running(status):
+            if time.monotonic() > deadline:
+                raise GPUUnavailableError("GPU pod did not reach RUNNING in time.")
+            await asyncio.sleep(self.settings.runpod_poll_interval_s)
+            status = await asyncio.to_thread(self.client.get_status)
+
+    async def _wait_serving(self, warmup: Callable[[], Awaitable[None]]):
+        deadline = time.monotonic() + self.settings.runpod_boot_timeout_s
+        while True:
+            try:
+                await warmup()
+                return
+            except Exception:
+                if time.monotonic() > deadline:
+                    raise GPUUnavailableError("Model server did not become ready in time.")
+                await asyncio.sleep(self.settings.runpod_poll_interval_s)
+
+    def _arm(self, delay_s: float):
+        # Caller holds self._lock.
+        self._stop_timer = threading.Timer(delay_s, self._auto_stop)
         self._stop_timer.daemon = True
         self._stop_timer.start()
+        metrics.GPU_ACTIVE.set(1)
 
     def _cancel_timer(self):
-        if self._stop_timer:
-            self._stop_timer.cancel()
-            self._stop_timer = None
+        with self._lock:
+            if self._stop_timer:
+                self._stop_timer.cancel()
+                self._stop_timer = None
+        metrics.GPU_ACTIVE.set(0)
 
     def _auto_stop(self):
+        with self._lock:
+            self._stop_timer = None
+            if self._last_activity is not None:
+                idle_for = time.monotonic() - self._last_activity
+                if idle_for < self.idle_timeout_s or self.queue_depth:
+                    # Traffic since the timer was armed: slide the deadline.
+                    self._arm(max(1.0, self.idle_timeout_s - idle_for))
+                    return
         try:
-            self.client.stop_pod()
+            with metrics.stage("runpod_stop"):
+                self.client.stop_pod()
+            metrics.GPU_AUTO_STOPS.inc()
         finally:
-            self._active_until = None
-            self._stop_timer = None
-
+            with self._lock:
+                self.state = "stopped"
+                self._last_activity = None
+            metrics.GPU_ACTIVE.set(0)
@@ -1,11 +1,29 @@
-from fastapi import FastAPI, HTTPException
+import json
+import threading
 
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+from app.chat.backends import DeadlineExceededError
 from app.chat.service import ChatService
-from app.gpu.service import GPUService
-from app.schemas import ChatRequest, ChatResponse
+from app.config import get_settings
+from app.gpu.service import GPUService, GPUUnavailableError
+from app.safety.crisis import load_crisis_matcher
+from app.schemas import ChatBatchRequest, ChatRequest, ChatResponse
+from app.utils import metrics
+from app.utils.concurrency import shutdown_cpu_executor
+from app.utils.memory import process_memory
+from app.utils.startup import STARTUP_MODES, ComponentUnavailableError
 
 app = FastAPI(title="Construction Safety Support Assistant")
-chat_service = ChatService()
+app.add_middleware(
+    metrics.MetricsMiddleware, server_timing=get_settings().server_timing_enabled
+)
+startup_mode = get_settings().startup_mode.lower()
+if startup_mode not in STARTUP_MODES:
+    raise ValueError(f"Unknown startup mode {startup_mode!r}; expected one of {STARTUP_MODES}.")
+chat_service = ChatService(eager=startup_mode == "eager")
 gpu_service: GPUService | None = None
 
 # Lazy init GPU service so app can start without RunPod creds for non-GPU flows.
@@ -16,30 +34,167 @@ def get_gpu_service() -> GPUService:
             gpu_service = GPUService()
         except ValueError as exc:
             raise HTTPException(status_code=400, detail=str(exc))
+        chat_service.gpu = gpu_service
     return gpu_service
 
 
+@app.on_event("startup")
+def startup():
+    # Fail fast on a missing CW_CRISIS_LEXICON_PATH rather than screening without it.
+    load_crisis_matcher(strict=True)
+    if get_settings().runpod_auto_start:
+        # Fail fast on missing RunPod credentials rather than on the first chat.
+        global gpu_service
+        gpu_service = GPUService()
+        chat_service.gpu = gpu_service
+    if startup_mode == "background":
+        # Serve /health (and crisis/wellbeing replies) while models load.
+        threading.Thread(target=chat_service.load, name="cw-load", daemon=True).start()
+
+
+@app.exception_handler(GPUUnavailableError)
+@app.exception_handler(ComponentUnavailableError)
+async def unavailable(request: Request, exc: GPUUnavailableError | ComponentUnavailableError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after_s)},
+    )
+
+
+@app.exception_handler(DeadlineExceededError)
+async def deadline_exceeded(request: Request, exc: DeadlineExceededError):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await chat_service.model.aclose()
+    if chat_service.retriever.batcher is not None:
+        chat_service.retriever.batcher.close()
+    if chat_service.retriever.watcher is not None:
+        chat_service.retriever.watcher.close()
+    if chat_service.audit is not None:
+        chat_service.audit.close()
+    shutdown_cpu_executor()
+
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
 
+@app.get("/ready")
+def ready():
+    """
+    Readiness probe: per-component load state. 503 until every component is
+    loaded (startup_mode=lazy: until one fails, since loading waits for traffic).
+    """
+    components = {c.name: c.status() for c in chat_service.components()}
+    states = [c["state"] for c in components.values()]
+    if startup_mode == "lazy":
+        is_ready = "failed" not in states
+    else:
+        is_ready = all(state == "ready" for state in states)
+    return JSONResponse(
+        status_code=200 if is_ready else 503,
+        content={"ready": is_ready, "startup_mode": startup_mode, "components": components},
+    )
+
+
+@app.get("/stats")
+def stats():
+    """
+    Tuning counters for in-process performance components.
+    """
+    retriever = chat_service.retriever
+    batcher = retriever.batcher
+    return {
+        "memory": process_memory(),
+        "model_backends": chat_service.model.pool.stats(),
+        "embedding_batcher": batcher.stats() if batcher else None,
+        "vector_store": retriever.watcher.stats() if retriever.watcher else None,
+        "audit_log": chat_service.audit.stats() if chat_service.audit else None,
+        "sessions": chat_service.sessions.stats() if chat_service.sessions else None,
+        **retriever.cache_stats(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """
+    Prometheus scrape endpoint: per-stage latency histograms, responses per
+    path, in-flight gauges. Values are per process (one series set per worker).
+    """
+    return PlainTextResponse(
+        metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
 @app.post("/v1/chat", response_model=ChatResponse)
-def chat(req: ChatRequest):
+async def chat(req: ChatRequest):
     """
     Core chat endpoint.
     - Detects crisis signals and escalates.
     - Wellbeing mode: structured coping playbooks.
     - Technical mode: RAG with citations; refuses to guess.
     """
-    return chat_service.handle_chat(req)
+    return await chat_service.ahandle_chat(req)
+
+
+def _sse(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(payload))}\n\n"
+
+
+@app.post("/v1/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """
+    Streaming chat endpoint (Server-Sent Events).
+    - Same safety/retrieval path as /v1/chat.
+    - Emits `citations` up front, then `token` events as the model generates,
+      then a final `done` (or `error`) event.
+    """
+
+    async def events():
+        async for event, payload in chat_service.stream_chat(req):
+            yield _sse(event, payload)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/v1/chat/batch")
+async def chat_batch(req: ChatBatchRequest):
+    """
+    Bulk chat for offline evaluation and replay (NDJSON).
+    - Same safety path as /v1/chat for every request.
+    - Technical requests are embedded and searched together; generations run
+      with bounded concurrency.
+    - One `{"index", "response" | "error"}` line per request, in completion order.
+    """
+    settings = get_settings()
+    if len(req.requests) > settings.chat_batch_max_requests:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.chat_batch_max_requests} requests per batch.",
+        )
+    concurrency = min(req.concurrency or settings.chat_batch_concurrency, settings.chat_batch_concurrency)
+
+    async def lines():
+        async for result in chat_service.batch_chat(req.requests, concurrency):
+            yield json.dumps(jsonable_encoder(result, exclude_none=True)) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 
 @app.post("/gpu/start")
 def gpu_start():
     """
     Start the RunPod GPU pod (Option A: control existing pod).
-    Also schedules an auto-stop after configured idle timeout.
+    It is auto-stopped once no model traffic has been seen for the idle timeout.
     """
     svc = get_gpu_service()
     return svc.start()
@@ -57,7 +212,8 @@ def gpu_stop():
 @app.get("/gpu/status")
 def gpu_status():
     """
-    Get current RunPod pod status.
+    Get current RunPod pod status, plus this server's view of it under
+    `controller` (state, cold-start queue depth, next idle stop).
     """
     svc = get_gpu_service()
     return svc.status()
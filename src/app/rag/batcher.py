@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+@dataclass
+class _Pending:
+    text: str
+    future: Future
+    enqueued: float = field(default_factory=time.perf_counter)
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent single-query embeddings into one encode() call.
+
+    A background thread takes the first waiting query, then keeps collecting
+    until `max_batch_size` queries are gathered or `max_wait_ms` has passed
+    since that first query arrived. The batch is encoded once and each row is
+    handed back through the caller's Future.
+    """
+
+    def __init__(
+        self,
+        encode_fn: Callable[[Sequence[str]], np.ndarray],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+    ):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: "queue.Queue[Optional[_Pending]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._batches = 0
+        self._max_batch_seen = 0
+        self._wait_s = 0.0
+        self._encode_s = 0.0
+        self._started_at = time.perf_counter()
+
+    def submit(self, text: str) -> Future:
+        """Queue one text; the Future resolves to its 1-D embedding."""
+        self._ensure_thread()
+        fut: Future = Future()
+        self._queue.put(_Pending(text=text, future=fut))
+        return fut
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        """Blocking helper for sync callers; returns a (len(texts), dim) array."""
+        futures = [self.submit(t) for t in texts]
+        return np.stack([f.result() for f in futures])
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def stats(self) -> Dict[str, float]:
+        with self._stats_lock:
+            batches = self._batches or 1
+            requests = self._requests or 1
+            elapsed = max(time.perf_counter() - self._started_at, 1e-9)
+            return {
+                "requests": self._requests,
+                "batches": self._batches,
+                "avg_batch_size": self._requests / batches,
+                "max_batch_size_seen": self._max_batch_seen,
+                "avg_queue_wait_ms": 1000.0 * self._wait_s / requests,
+                "avg_encode_ms": 1000.0 * self._encode_s / batches,
+                "encode_throughput_per_s": self._requests / self._encode_s
+                if self._encode_s
+                else 0.0,
+                "requests_per_s": self._requests / elapsed,
+            }
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="cw-embed-batcher", daemon=True
+                )
+                self._thread.start()
+
+    def _collect(self, first: _Pending) -> List[_Pending]:
+        batch = [first]
+        deadline = first.enqueued + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = (
+                    self._queue.get(timeout=remaining)
+                    if remaining > 0
+                    else self._queue.get_nowait()
+                )
+            except queue.Empty:
+                break
+            if item is None:
+                # Shutdown sentinel: finish this batch, then stop.
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            # Drop callers that gave up (e.g. a cancelled chat); the rest can
+            # no longer be cancelled once marked running.
+            batch = [
+                p for p in self._collect(first) if p.future.set_running_or_notify_cancel()
+            ]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            try:
+                embeddings = self.encode_fn([p.text for p in batch])
+            except Exception as exc:
+                for p in batch:
+                    p.future.set_exception(exc)
+                continue
+            finished = time.perf_counter()
+            for row, p in zip(embeddings, batch):
+                p.future.set_result(row)
+            with self._stats_lock:
+                self._requests += len(batch)
+                self._batches += 1
+                self._max_batch_seen = max(self._max_batch_seen, len(batch))
+                self._wait_s += sum(started - p.enqueued for p in batch)
+                self._encode_s += finished - started
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """Cache key form of a query: case/whitespace-insensitive, no trailing punctuation."""
+    return _WS_RE.sub(" ", text.strip().lower()).rstrip("?!.,; ")
+
+
+class TTLCache:
+    """
+    Bounded LRU cache with per-entry expiry. Thread-safe; keeps hit/miss
+    counters for the /stats endpoint.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl_seconds: float = 600.0):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl_seconds
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (self.ttl > 0 and entry[0] < now):
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any):
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,212 @@
+"""
+Near-duplicate detection for ingestion.
+
+Manuals repeat warnings, headers and legal boilerplate on page after page.
+Each chunk gets a MinHash signature over its word 5-gram shingles; LSH
+banding finds earlier chunks likely to be similar, and a candidate counts as
+a duplicate when the signatures estimate a Jaccard similarity of at least
+`threshold`. Duplicates are stored as aliases of the first copy (see
+`FaissStore.add_duplicates`) instead of being embedded again.
+
+Signatures use a stable hash (crc32 of each shingle), so they are saved with
+the store generation (`<index>.minhash/`, next to the ingest manifest) and an
+incremental ingest only signs the chunks it adds:
+
+    meta.json          format version and MinHash parameters
+    keys.npy           int64 store row per signature
+    signatures.npy     uint32 (rows, num_perm)
+    band_hash.npy      uint64 (bands, rows), each band sorted
+    band_order.npy     int64 (bands, rows), signature row of each band_hash entry
+
+All arrays are memory-mapped on load; a query binary-searches each band.
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+import shutil
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+_WORD = re.compile(r"\w+")
+# Mersenne prime 2**31 - 1: (a * x + b) stays below 2**62, so uint64 never overflows.
+_PRIME = (1 << 31) - 1
+
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH index of canonical chunks, keyed by their store row.
+    `num_perm` must equal `bands * rows`; with 16 bands of 8 rows a pair at
+    Jaccard 0.8 shares a band with probability ~0.95, a pair at 0.5 about
+    6% of the time (and is then rejected by the signature estimate).
+
+    Loaded signatures stay on disk; ones inserted since live in memory until
+    `save()` merges them. Removed rows are `discard()`ed.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        num_perm: int = 128,
+        bands: int = 16,
+        shingle_words: int = 5,
+        seed: int = 1,
+    ):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands}).")
+        self.threshold = threshold
+        self.params = {
+            "num_perm": num_perm,
+            "bands": bands,
+            "shingle_words": shingle_words,
+            "seed": seed,
+        }
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_words = shingle_words
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _PRIME, size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, size=(num_perm, 1), dtype=np.uint64)
+        # Odd multipliers folding a band's `rows` values into one uint64 key.
+        self._fold = rng.integers(1, 1 << 62, size=self.rows, dtype=np.uint64) | np.uint64(1)
+        # Saved part (memory-mapped after load()).
+        self._keys = np.zeros(0, dtype=np.int64)
+        self._sigs = np.zeros((0, num_perm), dtype=np.uint32)
+        self._band_hash = np.zeros((bands, 0), dtype=np.uint64)
+        self._band_order = np.zeros((bands, 0), dtype=np.int64)
+        self._live = np.zeros(0, dtype=bool)
+        # Inserted since: band key -> keys, and key -> signature.
+        self._buckets: List[Dict[int, List[int]]] = [{} for _ in range(bands)]
+        self._signatures: Dict[int, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return int(self._live.sum()) + len(self._signatures)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """MinHash signature (uint32 per permutation); None for text without words."""
+        words = _WORD.findall(text.lower())
+        if not words:
+            return None
+        n = self.shingle_words
+        if len(words) <= n:
+            shingles = [" ".join(words)]
+        else:
+            shingles = [" ".join(words[i : i + n]) for i in range(len(words) - n + 1)]
+        hashes = [zlib.crc32(s.encode("utf-8")) for s in shingles]
+        x = np.unique(np.array(hashes, dtype=np.uint64) % _PRIME)
+        return ((self._a * x + self._b) % _PRIME).min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        """(n, bands) uint64 key per band of each signature (equal bands, equal keys)."""
+        s = signatures.reshape(len(signatures), self.bands, self.rows).astype(np.uint64)
+        with np.errstate(over="ignore"):
+            return (s * self._fold).sum(axis=2, dtype=np.uint64)
+
+    def query(self, signature: Optional[np.ndarray]) -> Optional[int]:
+        """Key of the most similar indexed chunk at or above the threshold, if any."""
+        if signature is None:
+            return None
+        band_keys = self._band_keys(signature[None, :])[0]
+        best, best_sim = None, self.threshold
+        if len(self._keys):
+            rows = set()
+            for b, key in enumerate(band_keys):
+                lo = int(np.searchsorted(self._band_hash[b], key, side="left"))
+                hi = int(np.searchsorted(self._band_hash[b], key, side="right"))
+                rows.update(self._band_order[b, lo:hi].tolist())
+            rows = [r for r in rows if self._live[r]]
+            if rows:
+                rows.sort(key=lambda r: int(self._keys[r]))
+                sims = (np.asarray(self._sigs[rows]) == signature).mean(axis=1)
+                for r, sim in zip(rows, sims.tolist()):
+                    if sim >= best_sim and (best is None or sim > best_sim):
+                        best, best_sim = int(self._keys[r]), sim
+        candidates = set()
+        for bucket, key in zip(self._buckets, band_keys.tolist()):
+            candidates.update(k for k in bucket.get(key, ()) if k in self._signatures)
+        for key in sorted(candidates):
+            sim = float(np.mean(self._signatures[key] == signature))
+            if sim >= best_sim and (best is None or sim > best_sim):
+                best, best_sim = key, sim
+        return best
+
+    def insert(self, key: int, signature: Optional[np.ndarray]):
+        if signature is None:
+            return
+        self._signatures[key] = signature
+        for bucket, band in zip(self._buckets, self._band_keys(signature[None, :])[0].tolist()):
+            bucket.setdefault(band, []).append(key)
+
+    def rekey(self, old: int, new: int):
+        """Rename a chunk inserted since loading (a provisional key once its store ID is known)."""
+        signature = self._signatures.pop(old, None)
+        if signature is None:
+            return
+        self._signatures[new] = signature
+        for bucket, band in zip(self._buckets, self._band_keys(signature[None, :])[0].tolist()):
+            keys = bucket[band]
+            keys[keys.index(old)] = new
+
+    def keys(self) -> np.ndarray:
+        """Keys of every indexed chunk (saved and inserted since)."""
+        added = np.array(list(self._signatures), dtype=np.int64)
+        return np.concatenate([self._keys[self._live], added])
+
+    def discard(self, keys):
+        """Forget removed store rows."""
+        keys = np.asarray(keys, dtype=np.int64)
+        if len(self._keys):
+            self._live &= ~np.isin(self._keys, keys)
+        for key in keys.tolist():
+            self._signatures.pop(key, None)
+
+    def save(self, directory: str):
+        """Write every live signature to `directory` (replacing it)."""
+        live = np.flatnonzero(self._live)
+        added = np.array(list(self._signatures), dtype=np.int64)
+        if (added < 0).any():
+            raise ValueError("Provisional keys must be rekeyed before saving.")
+        keys = np.concatenate([self._keys[live], added])
+        sigs = np.empty((len(keys), self._sigs.shape[1]), dtype=np.uint32)
+        sigs[: len(live)] = self._sigs[live]
+        for i, signature in enumerate(self._signatures.values(), start=len(live)):
+            sigs[i] = signature
+        band_keys = self._band_keys(sigs).T
+        order = np.argsort(band_keys, axis=1, kind="stable")
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as fh:
+            json.dump({"version": FORMAT_VERSION, **self.params, "count": len(keys)}, fh)
+        np.save(os.path.join(directory, "keys.npy"), keys)
+        np.save(os.path.join(directory, "signatures.npy"), sigs)
+        np.save(os.path.join(directory, "band_hash.npy"), np.take_along_axis(band_keys, order, axis=1))
+        np.save(os.path.join(directory, "band_order.npy"), order.astype(np.int64))
+
+    @classmethod
+    def load(cls, directory: str, threshold: float = 0.8, **params) -> Optional["NearDuplicateIndex"]:
+        """The saved index, or None if there is none with these parameters."""
+        index = cls(threshold=threshold, **params)
+        try:
+            with open(os.path.join(directory, "meta.json"), encoding="utf-8") as fh:
+                meta = json.load(fh)
+        except FileNotFoundError:
+            return None
+        if meta.get("version") != FORMAT_VERSION or any(meta.get(k) != v for k, v in index.params.items()):
+            return None
+        if not meta["count"]:
+            return index
+
+        def load(name: str) -> np.ndarray:
+            return np.load(os.path.join(directory, name), mmap_mode="r")
+
+        index._keys = load("keys.npy")
+        index._sigs = load("signatures.npy")
+        index._band_hash = load("band_hash.npy")
+        index._band_order = load("band_order.npy")
+        index._live = np.ones(len(index._keys), dtype=bool)
+        return index
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import json
+import os
+from typing import Sequence
+
+import numpy as np
+
+from app.config import get_settings
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "sidecar")
+
+# Files written by `python -m app.rag.onnx_export`.
+ONNX_MODEL = "model.onnx"
+ONNX_INT8_MODEL = "model.int8.onnx"
+ONNX_CONFIG = "embedder.json"
+
+
+class TorchEmbedder:
+    """sentence-transformers on PyTorch; imported only when this backend is used."""
+
+    def __init__(self, model_name: str, threads: int = 0):
+        from sentence_transformers import SentenceTransformer
+
+        if threads > 0:
+            import torch
+
+            torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        return np.array(self.model.encode(list(texts), normalize_embeddings=True))
+
+
+class OnnxEmbedder:
+    """
+    The same encoder exported to ONNX and run with ONNX Runtime: no torch
+    import, optional int8 weights. Tokenization uses the exported
+    `tokenizer.json`; pooling and normalization follow `embedder.json`.
+    """
+
+    def __init__(self, directory: str, int8: bool = True, threads: int = 0, batch_size: int = 32):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_path = os.path.join(directory, ONNX_INT8_MODEL if int8 else ONNX_MODEL)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"{model_path} not found; export it with `python -m app.rag.onnx_export`."
+            )
+        with open(os.path.join(directory, ONNX_CONFIG), encoding="utf-8") as f:
+            config = json.load(f)
+        self.dim = int(config["dim"])
+        self.pooling = config["pooling"]
+        self.batch_size = batch_size
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        # One graph runs at a time per call; parallelism is within operators.
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            model_path, options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(directory, "tokenizer.json"))
+        self.tokenizer.enable_truncation(int(config["max_length"]))
+        self.tokenizer.enable_padding(pad_id=int(config["pad_id"]), pad_token=config["pad_token"])
+
+    def _encode_batch(self, texts: Sequence[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(list(texts))
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": mask,
+        }
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        hidden = self.session.run(None, feeds)[0]
+        if self.pooling == "cls":
+            pooled = hidden[:, 0]
+        else:
+            weights = mask[:, :, None].astype(hidden.dtype)
+            pooled = (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.maximum(norms, 1e-12)).astype(np.float32)
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        texts = list(texts)
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        # Length-sorted mini-batches pad to similar lengths (as sentence-transformers does).
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        for start in range(0, len(texts), self.batch_size):
+            rows = order[start : start + self.batch_size]
+            out[rows] = self._encode_batch([texts[i] for i in rows])
+        return out
+
+
+class EmbeddingModel:
+    """Normalized sentence embeddings from the backend named by `embedding_backend`."""
+
+    def __init__(self, backend: str | None = None):
+        settings = get_settings()
+        backend = (backend or settings.embedding_backend).lower()
+        if backend == "sidecar":
+            from app.rag.sidecar import SidecarEmbedder
+
+            self.backend = SidecarEmbedder(settings.embedding_sidecar_socket)
+        elif backend == "onnx":
+            self.backend = OnnxEmbedder(
+                settings.embedding_onnx_dir,
+                int8=settings.embedding_onnx_int8,
+                threads=settings.embedding_threads,
+            )
+        elif backend == "torch":
+            self.backend = TorchEmbedder(settings.embedding_model, threads=settings.embedding_threads)
+        else:
+            raise ValueError(
+                f"Unknown embedding backend {backend!r}; expected one of {EMBEDDING_BACKENDS}."
+            )
+
+    @property
+    def dim(self) -> int:
+        return self.backend.dim
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        return self.backend.encode(texts)
@@ -0,0 +1,257 @@
+"""
+Versioned store generations and hot reload.
+
+Every save writes a complete store (index, metadata, vectors, ingest
+manifest) into a new numbered directory and only then repoints
+`<root>.current` at it with an atomic rename:
+
+    storage/faiss.index.current                 "000007"
+    storage/faiss.index.generations/000007/faiss.index
+    storage/faiss.index.generations/000007/faiss.index.meta/ ...
+
+A reader that follows the pointer sees the old generation or the new one,
+never an index from one and metadata from the other. Stores written before
+generations existed (files directly at `<root>`) are read until the first
+save publishes generation 1. Each generation records the one that was
+current when it was published (its parent), and pruning keeps that lineage,
+so after a rollback the generation rolled back to stays the backup.
+
+    python -m app.rag.generations               # list generations
+    python -m app.rag.generations --use 000006  # roll back
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+from app.utils import metrics
+from app.utils.startup import Component
+
+logger = logging.getLogger(__name__)
+
+# Store files at the root path itself: the layout before generations.
+_LEGACY_SUFFIXES = ("", ".meta", ".meta.npy", ".vectors.f32", ".manifest.json")
+# Inside a generation directory: the name of the generation it replaced.
+_PARENT_FILE = "PARENT"
+
+
+def generations_dir(root: str) -> str:
+    return root + ".generations"
+
+
+def pointer_path(root: str) -> str:
+    return root + ".current"
+
+
+def generation_path(root: str, name: str) -> str:
+    """The index file of generation `name`; its sibling files share the prefix."""
+    return os.path.join(generations_dir(root), name, os.path.basename(root))
+
+
+def list_generations(root: str) -> List[str]:
+    """Generation directory names, oldest first (published or not)."""
+    try:
+        names = os.listdir(generations_dir(root))
+    except FileNotFoundError:
+        return []
+    return sorted(n for n in names if n.isdigit())
+
+
+def current_generation(root: str) -> Optional[str]:
+    try:
+        with open(pointer_path(root), encoding="utf-8") as fh:
+            return fh.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def resolve(root: str) -> Tuple[str, Optional[str]]:
+    """(index path to load, generation name); the legacy layout has no name."""
+    name = current_generation(root)
+    if name is None:
+        return root, None
+    return generation_path(root, name), name
+
+
+def parent_generation(root: str, name: str) -> Optional[str]:
+    """The generation that was current when `name` was published; None if unrecorded."""
+    try:
+        with open(os.path.join(generations_dir(root), name, _PARENT_FILE), encoding="utf-8") as fh:
+            return fh.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def create(root: str) -> Tuple[str, str]:
+    """Make the next, not yet published, generation directory; returns (name, index path)."""
+    existing = list_generations(root)
+    number = int(existing[-1]) + 1 if existing else 1
+    while True:
+        name = f"{number:06d}"
+        try:
+            os.makedirs(os.path.join(generations_dir(root), name))
+            return name, generation_path(root, name)
+        except FileExistsError:
+            number += 1
+
+
+def _fsync_dir(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _fsync_tree(path: str):
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            with open(os.path.join(dirpath, filename), "rb") as fh:
+                os.fsync(fh.fileno())
+        _fsync_dir(dirpath)
+
+
+def publish(root: str, name: str):
+    """Flush generation `name` to disk, then atomically make it the current one."""
+    directory = os.path.join(generations_dir(root), name)
+    parent = current_generation(root)
+    parent_file = os.path.join(directory, _PARENT_FILE)
+    # Only on first publish: a rollback (`--use`) must not rewrite the lineage.
+    if parent is not None and parent != name and not os.path.exists(parent_file):
+        with open(parent_file, "w", encoding="utf-8") as fh:
+            fh.write(parent + "\n")
+    _fsync_tree(directory)
+    pointer = pointer_path(root)
+    tmp = pointer + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        fh.write(name + "\n")
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, pointer)
+    _fsync_dir(os.path.dirname(pointer) or ".")
+
+
+def prune(root: str, keep: int):
+    """
+    Delete generations other than the current one and its `keep - 1` nearest
+    ancestors (parent, grandparent, ...), including unpublished leftovers of
+    interrupted saves. Generations without a recorded parent fall back to
+    the next lower number; the legacy layout counts as generation 0.
+    Processes still serving a deleted generation keep their open maps
+    (POSIX unlink semantics).
+    """
+    current = current_generation(root)
+    if current is None:
+        return
+    existing = list_generations(root)
+    kept = [current]
+    while len(kept) < max(1, keep):
+        parent = parent_generation(root, kept[-1])
+        if parent is None:
+            lower = [n for n in existing if int(n) < int(kept[-1]) and n not in kept]
+            parent = lower[-1] if lower else None
+        if parent is None or parent not in existing or parent in kept:
+            break
+        kept.append(parent)
+    for name in existing:
+        if name not in kept:
+            shutil.rmtree(os.path.join(generations_dir(root), name), ignore_errors=True)
+    if len(kept) >= max(1, keep):
+        for suffix in _LEGACY_SUFFIXES:
+            path = root + suffix
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.exists(path):
+                os.remove(path)
+
+
+class StoreWatcher:
+    """
+    Hot reload for the API's read-only store. Every `interval_s` the pointer
+    is checked; when it names a generation other than the live one, that
+    generation is loaded on this thread and swapped into `component`
+    (read-copy-update). Searches already holding the old store finish on it,
+    and it is freed once the last of them drops its reference.
+    """
+
+    def __init__(self, component: Component, root: str, load: Callable[[], object], interval_s: float):
+        self.component = component
+        self.root = root
+        self.load = load
+        self.interval_s = interval_s
+        self.reloads = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="cw-index-watch", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.check()
+            except Exception as exc:
+                # Typically a generation pruned mid-load; the next tick retries.
+                self.failures += 1
+                self.last_error = f"{exc.__class__.__name__}: {exc}"
+                metrics.VECTOR_STORE_RELOADS.inc(outcome="error")
+                logger.exception("Reloading the vector store failed")
+
+    def check(self) -> bool:
+        """Swap in the current generation if it changed; True if it did."""
+        if not self.component.ready:
+            # Not loaded yet: the first load follows the pointer by itself.
+            return False
+        live = self.component.get().disk_generation
+        current = current_generation(self.root)
+        if current is None or current == live:
+            return False
+        started = time.perf_counter()
+        store = self.load()
+        self.component.swap(store)
+        self.reloads += 1
+        self.last_error = None
+        metrics.VECTOR_STORE_RELOADS.inc(outcome="ok")
+        logger.info(
+            "Vector store generation %s -> %s (%d vectors, loaded in %.2fs)",
+            live,
+            store.disk_generation,
+            store.ntotal,
+            time.perf_counter() - started,
+        )
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "generation": self.component.get().disk_generation if self.component.ready else None,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+
+if __name__ == "__main__":
+    from app.config import get_settings
+
+    parser = argparse.ArgumentParser(description="List or switch vector store generations.")
+    parser.add_argument("--root", default=get_settings().vector_store_path)
+    parser.add_argument("--use", metavar="NAME", help="Point the store at this generation (rollback)")
+    args = parser.parse_args()
+    if args.use:
+        if not os.path.isdir(os.path.join(generations_dir(args.root), args.use)):
+            parser.error(f"no generation {args.use!r} under {generations_dir(args.root)}")
+        publish(args.root, args.use)
+    current = current_generation(args.root)
+    for name in list_generations(args.root):
+        print(("* " if name == current else "  ") + name)
+    if current is None:
+        print(f"No published generation; {args.root} is read directly.")
@@ -1,18 +1,30 @@
 import argparse
+import multiprocessing
 import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterator, List, Optional, Tuple
 
+import numpy as np
 import pdfplumber
 from rich.console import Console
-from rich.progress import track
+from rich.progress import BarColumn, MofNCompleteColumn, Progress, TextColumn, TimeElapsedColumn
 
+from app.config import get_settings
+from app.rag.dedup import NearDuplicateIndex
+from app.rag.manifest import IngestManifest, file_sha256
 from app.rag.vector_store import DocumentChunk
 from app.rag.retriever import Retriever
 from app.utils.text import clean_text, chunk_text
 
 console = Console()
 
+_DONE = object()
+
 
 def extract_pdf_chunks(pdf_path: Path) -> List[DocumentChunk]:
     chunks: List[DocumentChunk] = []
@@ -32,18 +44,294 @@ def extract_pdf_chunks(pdf_path: Path) -> List[DocumentChunk]:
     return chunks
 
 
-def ingest(data_dir: Path):
+@dataclass
+class IngestStats:
+    files: int = 0
+    failed: int = 0
+    chunks: int = 0
+    batches: int = 0
+    embed_s: float = 0.0
+    embedded: int = 0
+    duplicates: int = 0
+    dedup_s: float = 0.0
+    bytes_per_vector: int = 0
+    started: float = field(default_factory=time.perf_counter)
+
+    def report(self) -> str:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return (
+            f"{self.files} PDFs, {self.chunks} chunks in {elapsed:.1f}s "
+            f"({self.files / elapsed:.2f} PDFs/s, {self.chunks / elapsed:.1f} chunks/s); "
+            f"{self.batches} embedding batches, {self.embed_s:.1f}s embedding"
+            + (f"; [red]{self.failed} PDFs failed[/red]" if self.failed else "")
+            + (f"\n{self.dedup_report()}" if self.duplicates else "")
+        )
+
+    def dedup_report(self) -> str:
+        # Saved embedding time is estimated at the measured per-chunk rate.
+        per_chunk = self.embed_s / max(self.embedded, 1)
+        return (
+            f"{self.duplicates} of {self.chunks} chunks ({self.duplicates / max(self.chunks, 1):.0%}) "
+            f"were near-duplicates stored as extra sources: saved {self.duplicates} vectors "
+            f"(~{self.duplicates * self.bytes_per_vector / 2**20:.1f} MiB of index) and "
+            f"~{self.duplicates * per_chunk:.1f}s of embedding; dedup took {self.dedup_s:.1f}s"
+        )
+
+
+def _extract_stream(
+    jobs: List[Tuple[Path, str]], workers: int, queue_size: int
+) -> Iterator[Tuple[Path, str, object]]:
+    """
+    Yield (path, digest, chunks-or-exception) as extraction finishes.
+
+    With workers > 1, a feeder thread keeps at most `2 * workers` PDFs in a
+    process pool and pushes results onto a bounded queue, so extraction runs
+    ahead of embedding by a fixed amount instead of holding the whole library
+    in memory.
+    """
+    if workers <= 1:
+        for path, digest in jobs:
+            try:
+                yield path, digest, extract_pdf_chunks(path)
+            except Exception as exc:
+                yield path, digest, exc
+        return
+
+    results: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    # Set when the consumer stops early (error, Ctrl-C, generator closed).
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def feed():
+        pool = None
+        try:
+            # spawn: the parent may already hold torch/OpenMP state that does not fork safely.
+            ctx = multiprocessing.get_context("spawn")
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+            pending = {}
+            todo = iter(jobs)
+            while not stop.is_set():
+                while len(pending) < 2 * workers:
+                    job = next(todo, None)
+                    if job is None:
+                        break
+                    pending[pool.submit(extract_pdf_chunks, job[0])] = job
+                if not pending:
+                    break
+                done, _ = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    path, digest = pending.pop(fut)
+                    exc = fut.exception()
+                    if not put((path, digest, exc if exc is not None else fut.result())):
+                        break
+        except Exception as exc:
+            put(exc)
+        finally:
+            if pool is not None:
+                # Queued PDFs are dropped; ones already extracting finish first.
+                pool.shutdown(wait=True, cancel_futures=True)
+            put(_DONE)
+
+    feeder = threading.Thread(target=feed, name="cw-ingest-feeder", daemon=True)
+    feeder.start()
+    try:
+        while True:
+            item = results.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                # The pool itself failed (not a single PDF); stop the run.
+                raise item
+            yield item
+    finally:
+        stop.set()
+        # Drain so a feeder blocked on a full queue sees the stop and exits.
+        while feeder.is_alive():
+            try:
+                results.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        feeder.join()
+
+
+def ingest(data_dir: Path, workers: int = 1, batch_size: int = 256, dedup: Optional[bool] = None):
+    """
+    Incremental, idempotent ingestion. A manifest of per-file content hashes
+    decides what to do with each PDF: unchanged files are skipped, changed
+    files have their old vectors removed before re-adding, and files that
+    disappeared from `data_dir` are removed. The store is saved once per run.
+
+    PDFs are extracted by `workers` processes and their chunks streamed into
+    embedding batches of about `batch_size`; this thread is the only writer
+    to the store and manifest.
+
+    With `dedup` (default: `ingest_dedup_enabled`), a chunk nearly identical
+    to one already stored, in this run or an earlier one, is not embedded; it
+    is added as an extra source of the existing vector.
+
+    Removed vectors leave their metadata (and vectors-file) rows behind, so a
+    library whose PDFs change often grows on disk until it is compacted with
+    `python -m app.rag.migrate --compact`; the run report says when.
+    """
+    settings = get_settings()
+    if dedup is None:
+        dedup = settings.ingest_dedup_enabled
     retriever = Retriever()
-    pdfs = list(data_dir.glob("*.pdf"))
-    if not pdfs:
+    store = retriever.store
+    manifest = IngestManifest(store.manifest_path)
+    pdfs = sorted(data_dir.glob("*.pdf"))
+    if not pdfs and not manifest.files:
         console.print("[yellow]No PDFs found in data/. Place manuals before ingesting.[/yellow]")
         return
-    total_chunks = 0
-    for pdf_path in track(pdfs, description="Ingesting PDFs"):
-        chunks = extract_pdf_chunks(pdf_path)
-        retriever.add_documents(chunks)
-        total_chunks += len(chunks)
-    console.print(f"[green]Ingestion complete.[/green] Added {total_chunks} chunks.")
+
+    current = {p.name for p in pdfs}
+    removed_files = [name for name in manifest.files if name not in current]
+    removed_ids: List[np.ndarray] = []
+    for name in removed_files:
+        removed_ids.append(manifest.remove(name).ids)
+        store.remove(removed_ids[-1])
+
+    jobs: List[Tuple[Path, str]] = []
+    replaced = 0
+    for pdf_path in pdfs:
+        digest = file_sha256(pdf_path)
+        entry = manifest.get(pdf_path.name)
+        if entry is not None and entry.sha256 == digest:
+            continue
+        if entry is not None:
+            # Drop the entry too: if re-extraction fails the file is retried next run.
+            removed_ids.append(manifest.remove(pdf_path.name).ids)
+            store.remove(removed_ids[-1])
+            replaced += 1
+        jobs.append((pdf_path, digest))
+    skipped = len(pdfs) - len(jobs)
+
+    stats = IngestStats()
+    batch: List[DocumentChunk] = []
+    # Files whose chunks are (partly) still waiting in `batch`.
+    outstanding: Dict[str, int] = {}
+    file_ids: Dict[str, List[int]] = {}
+    digests: Dict[str, str] = {}
+    near: Optional[NearDuplicateIndex] = None
+
+    def saved_signatures() -> Optional[NearDuplicateIndex]:
+        index = NearDuplicateIndex.load(store.signatures_path, settings.ingest_dedup_threshold)
+        if index is not None and removed_ids:
+            index.discard(np.concatenate(removed_ids))
+        return index
+
+    def near_duplicates() -> NearDuplicateIndex:
+        # The previous ingest's signatures, minus the removals above. Rows holding a vector
+        # without one (aliases promoted by those removals, runs without dedup, or every row
+        # if the generation has none, e.g. one written by migrate) are signed from their text.
+        index = saved_signatures() or NearDuplicateIndex(threshold=settings.ingest_dedup_threshold)
+        for row in np.setdiff1d(store.vector_rows(), index.keys()).tolist():
+            index.insert(row, index.signature(store.chunk(row).text))
+        return index
+
+    def flush():
+        nonlocal near
+        if not batch:
+            return
+        unique = list(range(len(batch)))
+        # batch position -> row whose vector it shares
+        canonical: Dict[int, int] = {}
+        if dedup:
+            started = time.perf_counter()
+            if near is None:
+                near = near_duplicates()
+            unique = []
+            for pos, chunk in enumerate(batch):
+                signature = near.signature(chunk.text)
+                match = near.query(signature)
+                if match is None:
+                    # Keyed by batch position (negative) until the store assigns its ID.
+                    near.insert(-1 - pos, signature)
+                    unique.append(pos)
+                else:
+                    canonical[pos] = match
+            stats.dedup_s += time.perf_counter() - started
+        ids = np.empty(len(batch), dtype=np.int64)
+        if unique:
+            started = time.perf_counter()
+            ids[unique] = retriever.add_documents([batch[p] for p in unique], save=False)
+            stats.embed_s += time.perf_counter() - started
+            stats.batches += 1
+            if near is not None:
+                for pos in unique:
+                    near.rekey(-1 - pos, int(ids[pos]))
+        if canonical:
+            canonical = {pos: int(ids[-1 - c]) if c < 0 else c for pos, c in canonical.items()}
+            ids[list(canonical)] = store.add_duplicates(
+                [batch[p] for p in canonical], list(canonical.values())
+            )
+        stats.chunks += len(batch)
+        stats.embedded += len(unique)
+        stats.duplicates += len(canonical)
+        for chunk, vec_id in zip(batch, ids):
+            file_ids[chunk.document].append(int(vec_id))
+            outstanding[chunk.document] -= 1
+            if not outstanding[chunk.document]:
+                del outstanding[chunk.document]
+                manifest.set(chunk.document, digests[chunk.document], file_ids.pop(chunk.document))
+        batch.clear()
+
+    progress = Progress(
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        MofNCompleteColumn(),
+        TimeElapsedColumn(),
+        TextColumn("{task.fields[chunks]} chunks"),
+        console=console,
+    )
+    with progress:
+        task = progress.add_task("Ingesting PDFs", total=len(jobs), chunks=0)
+        for path, digest, result in _extract_stream(jobs, workers, queue_size=2 * max(workers, 1)):
+            if isinstance(result, Exception):
+                stats.failed += 1
+                console.print(f"[red]Failed to extract {path.name}: {result}[/red]")
+                progress.advance(task)
+                continue
+            stats.files += 1
+            digests[path.name] = digest
+            file_ids[path.name] = []
+            if result:
+                outstanding[path.name] = len(result)
+                batch.extend(result)
+            else:
+                manifest.set(path.name, digest, file_ids.pop(path.name))
+            if len(batch) >= batch_size:
+                flush()
+            progress.update(task, advance=1, chunks=stats.chunks + len(batch))
+        flush()
+
+    if removed_files or jobs:
+        # Saving once lets IVF indexes train on the whole library, not the first PDF.
+        # The manifest goes into the same generation, so its IDs always match the index.
+        if dedup and near is None:
+            near = saved_signatures()
+        store.save(manifest, near)
+    console.print(
+        f"[green]Ingestion complete.[/green] Added {stats.chunks} chunks; "
+        f"{skipped} unchanged, {replaced} replaced, {len(removed_files)} removed PDFs."
+    )
+    if jobs:
+        stats.bytes_per_vector = store.bytes_per_vector
+        console.print(stats.report())
+    removed_rows = store.removed_rows
+    if removed_rows:
+        console.print(
+            f"{removed_rows} stored rows belong to removed chunks; "
+            "reclaim them with `python -m app.rag.migrate --compact`."
+        )
 
 
 if __name__ == "__main__":
@@ -54,7 +342,28 @@ if __name__ == "__main__":
         default=Path("data"),
         help="Directory containing PDFs",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Processes for PDF text extraction (1 = extract in-process)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=256,
+        help="Chunks per embedding call",
+    )
+    parser.add_argument(
+        "--no-dedup",
+        action="store_true",
+        help="Embed every chunk, even near-identical ones (overrides CW_INGEST_DEDUP_ENABLED)",
+    )
     args = parser.parse_args()
     os.makedirs(args.data_dir, exist_ok=True)
-    ingest(args.data_dir)
-
+    ingest(
+        args.data_dir,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        dedup=False if args.no_dedup else None,
+    )
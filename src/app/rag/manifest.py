@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+MANIFEST_VERSION = 1
+
+
+def file_sha256(path: Path, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _to_ranges(ids: Iterable[int]) -> List[List[int]]:
+    """Compress sorted vector IDs into half-open [start, end) runs."""
+    ranges: List[List[int]] = []
+    for i in sorted(int(x) for x in ids):
+        if ranges and ranges[-1][1] == i:
+            ranges[-1][1] = i + 1
+        else:
+            ranges.append([i, i + 1])
+    return ranges
+
+
+@dataclass
+class ManifestEntry:
+    sha256: str
+    ranges: List[List[int]] = field(default_factory=list)
+
+    @property
+    def ids(self) -> np.ndarray:
+        if not self.ranges:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate([np.arange(s, e, dtype=np.int64) for s, e in self.ranges])
+
+
+class IngestManifest:
+    """
+    Per-file record of what has been ingested: the content hash of each PDF
+    and the vector IDs its chunks were stored under. Lets ingestion skip
+    unchanged files and remove the old vectors of changed or deleted ones.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files: Dict[str, ManifestEntry] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as fh:
+                data = json.load(fh)
+            for name, entry in data.get("files", {}).items():
+                self.files[name] = ManifestEntry(entry["sha256"], entry.get("ranges", []))
+
+    def get(self, name: str) -> Optional[ManifestEntry]:
+        return self.files.get(name)
+
+    def set(self, name: str, sha256: str, ids: Iterable[int]):
+        self.files[name] = ManifestEntry(sha256, _to_ranges(ids))
+
+    def remove(self, name: str) -> Optional[ManifestEntry]:
+        return self.files.pop(name, None)
+
+    def remap(self, mapping: Dict[int, int]):
+        """Renumber every file's vector IDs (after a compaction or reshard); unmapped IDs are dropped."""
+        for name, entry in self.files.items():
+            ids = (mapping[i] for i in entry.ids.tolist() if i in mapping)
+            self.files[name] = ManifestEntry(entry.sha256, _to_ranges(ids))
+
+    def save(self, path: str | None = None):
+        """Write to `path` (from then on the manifest's path) or the current one."""
+        self.path = path or self.path
+        data = {
+            "version": MANIFEST_VERSION,
+            "files": {
+                name: {"sha256": e.sha256, "ranges": e.ranges}
+                for name, e in sorted(self.files.items())
+            },
+        }
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(data, fh)
+        os.replace(tmp, self.path)
@@ -0,0 +1,307 @@
+from __future__ import annotations
+
+import json
+import os
+import shutil
+from dataclasses import replace
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+# dup_of.npy values: the row has its own vector, or it was an alias that has
+# been removed. Anything >= 0 is the row whose vector an alias shares.
+OWN_VECTOR = -1
+REMOVED_ALIAS = -2
+
+
+class _StrColumn:
+    """
+    Nullable UTF-8 string column: int64 offsets (n + 1), one byte blob and a
+    uint8 validity mask. All three are memory-mapped when opened from disk.
+    """
+
+    def __init__(self, offsets: np.ndarray, blob: np.ndarray, valid: np.ndarray):
+        self.offsets = offsets
+        self.blob = blob
+        self.valid = valid
+
+    @classmethod
+    def empty(cls) -> "_StrColumn":
+        return cls(
+            np.zeros(1, dtype=np.int64),
+            np.zeros(0, dtype=np.uint8),
+            np.zeros(0, dtype=np.uint8),
+        )
+
+    @classmethod
+    def open(cls, directory: str, name: str) -> "_StrColumn":
+        blob_path = os.path.join(directory, f"{name}.bin")
+        # np.memmap refuses zero-length files.
+        if os.path.getsize(blob_path):
+            blob = np.memmap(blob_path, dtype=np.uint8, mode="r")
+        else:
+            blob = np.zeros(0, dtype=np.uint8)
+        return cls(
+            np.load(os.path.join(directory, f"{name}.off.npy"), mmap_mode="r"),
+            blob,
+            np.load(os.path.join(directory, f"{name}.valid.npy"), mmap_mode="r"),
+        )
+
+    def get(self, i: int) -> Optional[str]:
+        if not self.valid[i]:
+            return None
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return bytes(self.blob[start:end]).decode("utf-8")
+
+    def write(self, directory: str, name: str, extra: Sequence[Optional[str]]):
+        """Write existing rows plus `extra` without decoding the existing rows."""
+        encoded = [(v or "").encode("utf-8") for v in extra]
+        lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+        base_end = int(self.offsets[-1])
+        offsets = np.concatenate([self.offsets, base_end + np.cumsum(lengths)])
+        valid = np.concatenate(
+            [self.valid, np.array([v is not None for v in extra], dtype=np.uint8)]
+        )
+        with open(os.path.join(directory, f"{name}.bin"), "wb") as fh:
+            fh.write(memoryview(np.ascontiguousarray(self.blob[:base_end])))
+            for b in encoded:
+                fh.write(b)
+        np.save(os.path.join(directory, f"{name}.off.npy"), offsets.astype(np.int64))
+        np.save(os.path.join(directory, f"{name}.valid.npy"), valid.astype(np.uint8))
+
+
+class ChunkMetadata:
+    """
+    Columnar, memory-mapped chunk metadata aligned with FAISS vector IDs.
+
+    On-disk layout (one directory):
+      meta.json                      format version, row count, document names
+      text.{bin,off.npy,valid.npy}   chunk text
+      section.{bin,off.npy,valid.npy}
+      doc_ids.npy                    int32 index into meta.json "documents"
+      pages.npy                      int32, -1 for unknown
+      dup_of.npy                     int64, canonical row of a near-duplicate
+                                     (optional; -1 = own vector, -2 = removed)
+
+    Nothing is decoded at open time; `chunk(i)` builds a DocumentChunk for a
+    single row, so only top-k hits are ever materialized. Rows appended since
+    the last write live in an in-memory tail until `write()`.
+
+    `select()` answers document/page filters from an inverted index (rows
+    grouped by document code), built from `doc_ids.npy` on first use.
+
+    Near-duplicate chunks collapsed at ingest are alias rows: they keep their
+    own document/section/page but share the vector of a canonical row. The
+    small `dup_of` column is held in RAM so removals can repoint it.
+    """
+
+    def __init__(self, directory: str | None = None):
+        self._text = _StrColumn.empty()
+        self._section = _StrColumn.empty()
+        self._doc_ids = np.zeros(0, dtype=np.int32)
+        self._pages = np.zeros(0, dtype=np.int32)
+        self.documents: List[str] = []
+        self._doc_codes: dict = {}
+        self._base_len = 0
+        self._tail: List = []
+        self._dup_of = np.zeros(0, dtype=np.int64)
+        # (row IDs ordered by document code, start offset per code)
+        self._postings: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        # (live alias rows, their canonical rows), ordered by canonical
+        self._aliases: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        if directory and os.path.exists(os.path.join(directory, "meta.json")):
+            self._open(directory)
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, "meta.json"))
+
+    def _open(self, directory: str):
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as fh:
+            info = json.load(fh)
+        if info.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported chunk metadata version {info.get('version')!r}")
+        self._text = _StrColumn.open(directory, "text")
+        self._section = _StrColumn.open(directory, "section")
+        self._doc_ids = np.load(os.path.join(directory, "doc_ids.npy"), mmap_mode="r")
+        self._pages = np.load(os.path.join(directory, "pages.npy"), mmap_mode="r")
+        self.documents = list(info["documents"])
+        self._doc_codes = {name: i for i, name in enumerate(self.documents)}
+        self._base_len = int(info["count"])
+        self._tail = []
+        dup_path = os.path.join(directory, "dup_of.npy")
+        if os.path.exists(dup_path):
+            self._dup_of = np.array(np.load(dup_path), dtype=np.int64)
+        else:
+            self._dup_of = np.full(self._base_len, OWN_VECTOR, dtype=np.int64)
+        self._postings = None
+        self._aliases = None
+
+    def __len__(self) -> int:
+        return self._base_len + len(self._tail)
+
+    def __getitem__(self, i: int):
+        return self.chunk(i)
+
+    def chunk(self, i: int, text: bool = True):
+        """The chunk at row `i`; with `text=False` only its source (text left empty)."""
+        from app.rag.vector_store import DocumentChunk
+
+        if i < 0:
+            i += len(self)
+        if i >= self._base_len:
+            chunk = self._tail[i - self._base_len]
+            return chunk if text else replace(chunk, text="", duplicates=[])
+        page = int(self._pages[i])
+        return DocumentChunk(
+            text=(self._text.get(i) or "") if text else "",
+            document=self.documents[int(self._doc_ids[i])],
+            section=self._section.get(i),
+            page=page if page >= 0 else None,
+        )
+
+    def _document_rows(self, code: int) -> np.ndarray:
+        if self._postings is None:
+            doc_ids = np.asarray(self._doc_ids[: self._base_len])
+            counts = np.bincount(doc_ids, minlength=len(self.documents))
+            self._postings = (
+                np.argsort(doc_ids, kind="stable").astype(np.int64),
+                np.concatenate([[0], np.cumsum(counts)]),
+            )
+        order, starts = self._postings
+        if code + 1 >= len(starts):
+            return np.zeros(0, dtype=np.int64)  # document only in the unwritten tail
+        return order[starts[code] : starts[code + 1]]
+
+    def select(
+        self,
+        documents: Optional[Sequence[str]] = None,
+        page_from: Optional[int] = None,
+        page_to: Optional[int] = None,
+    ) -> np.ndarray:
+        """Sorted row IDs in `documents` (all if None) within the page range (inclusive)."""
+        if documents is None:
+            rows = np.arange(self._base_len, dtype=np.int64)
+        else:
+            codes = sorted(self._doc_codes[d] for d in set(documents) if d in self._doc_codes)
+            parts = [self._document_rows(c) for c in codes]
+            rows = np.sort(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+        if page_from is not None or page_to is not None:
+            pages = np.asarray(self._pages[rows])
+            keep = pages >= 0
+            if page_from is not None:
+                keep &= pages >= page_from
+            if page_to is not None:
+                keep &= pages <= page_to
+            rows = rows[keep]
+        wanted = None if documents is None else set(documents)
+        tail = [
+            self._base_len + i
+            for i, c in enumerate(self._tail)
+            if (wanted is None or c.document in wanted)
+            and (page_from is None or (c.page is not None and c.page >= page_from))
+            and (page_to is None or (c.page is not None and c.page <= page_to))
+        ]
+        if tail:
+            rows = np.concatenate([rows, np.array(tail, dtype=np.int64)])
+        return rows
+
+    def extend(self, chunks: Iterable, dup_of: Optional[Sequence[int]] = None):
+        """Append rows; `dup_of` gives the canonical row of each (aliases only)."""
+        chunks = list(chunks)
+        self._tail.extend(chunks)
+        if dup_of is None:
+            extra = np.full(len(chunks), OWN_VECTOR, dtype=np.int64)
+        else:
+            extra = np.asarray(dup_of, dtype=np.int64)
+            self._aliases = None
+        self._dup_of = np.concatenate([self._dup_of, extra])
+
+    def duplicate_of(self, rows) -> np.ndarray:
+        """Canonical row per row in `rows` (OWN_VECTOR / REMOVED_ALIAS for non-aliases)."""
+        return self._dup_of[np.asarray(rows, dtype=np.int64)]
+
+    def set_duplicate_of(self, rows, value):
+        self._dup_of[np.asarray(rows, dtype=np.int64)] = value
+        self._aliases = None
+
+    def aliases(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(live alias rows, their canonical rows), grouped by canonical row."""
+        if self._aliases is None:
+            rows = np.flatnonzero(self._dup_of >= 0)
+            canonical = self._dup_of[rows]
+            order = np.argsort(canonical, kind="stable")
+            self._aliases = (rows[order], canonical[order])
+        return self._aliases
+
+    @property
+    def has_aliases(self) -> bool:
+        return bool(len(self.aliases()[0]))
+
+    def duplicates(self, row: int) -> np.ndarray:
+        """Live alias rows sharing the vector of canonical `row`, in row order."""
+        rows, canonical = self.aliases()
+        start, end = np.searchsorted(canonical, [row, row + 1])
+        return rows[start:end]
+
+    def canonical(self, rows: np.ndarray) -> Tuple[np.ndarray, Dict[int, int]]:
+        """
+        Map selected rows onto rows that hold vectors: (sorted canonical rows,
+        {canonical row: first selected alias} for canonicals not selected
+        themselves), so a filtered hit can be reported under the matching row.
+        """
+        if not self.has_aliases:
+            return rows, {}
+        dup = self._dup_of[rows]
+        own = rows[dup == OWN_VECTOR]
+        alias_rows, canonical = rows[dup >= 0], dup[dup >= 0]
+        outside = ~np.isin(canonical, own)
+        primary: Dict[int, int] = {}
+        for alias, canon in zip(alias_rows[outside].tolist(), canonical[outside].tolist()):
+            primary.setdefault(canon, alias)
+        return np.union1d(own, canonical), primary
+
+    def write(self, directory: str):
+        """
+        Persist all rows to `directory`, replacing it. Existing rows are copied
+        column-wise; only the in-memory tail is encoded. The new directory is
+        built next to the old one and swapped in, then re-opened.
+        """
+        tmp = directory + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+
+        tail = self._tail
+        tail_doc_ids = np.array([self._doc_code(c.document) for c in tail], dtype=np.int32)
+        tail_pages = np.array(
+            [c.page if c.page is not None else -1 for c in tail], dtype=np.int32
+        )
+        self._text.write(tmp, "text", [c.text for c in tail])
+        self._section.write(tmp, "section", [c.section for c in tail])
+        np.save(os.path.join(tmp, "doc_ids.npy"), np.concatenate([self._doc_ids, tail_doc_ids]))
+        np.save(os.path.join(tmp, "pages.npy"), np.concatenate([self._pages, tail_pages]))
+        np.save(os.path.join(tmp, "dup_of.npy"), self._dup_of)
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as fh:
+            json.dump(
+                {"version": FORMAT_VERSION, "count": len(self), "documents": self.documents},
+                fh,
+            )
+
+        old = directory + ".old"
+        shutil.rmtree(old, ignore_errors=True)
+        if os.path.exists(directory):
+            os.replace(directory, old)
+        os.replace(tmp, directory)
+        # Open maps keep the old files alive until released (POSIX semantics).
+        shutil.rmtree(old, ignore_errors=True)
+        self._open(directory)
+
+    def _doc_code(self, document: str) -> int:
+        code = self._doc_codes.get(document)
+        if code is None:
+            code = len(self.documents)
+            self.documents.append(document)
+            self._doc_codes[document] = code
+        return code
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import argparse
+import os
+
+from rich.console import Console
+
+from app.config import get_settings
+from app.rag import generations, sharded
+from app.rag.manifest import IngestManifest
+from app.rag.vector_store import INDEX_TYPES, QUANTIZATIONS, EmbeddingModel, get_store
+
+console = Console()
+
+
+def migrate(
+    index_type: str | None,
+    quantization: str | None = None,
+    shards: int | None = None,
+    compact: bool = False,
+):
+    """
+    Convert the existing FAISS index (e.g. a flat one) to another index type
+    and/or quantization, and/or split it into `shards` shards. With `compact`
+    (implied by `shards`), rows of removed or replaced chunks are dropped and
+    the rest renumbered, ingest manifest included. Without any, only
+    re-saves the store, which upgrades legacy pickled `.meta.npy`
+    metadata to the columnar format and legacy single-file stores to
+    generations. The result is a new generation; the previous one stays on
+    disk for rollback.
+    """
+    settings = get_settings()
+    path, previous = generations.resolve(settings.vector_store_path)
+    if not os.path.exists(path) and sharded.read_layout(settings.vector_store_path) is None:
+        console.print(f"[yellow]No index at {path}; nothing to migrate.[/yellow]")
+        return
+    store = get_store(EmbeddingModel())
+    # None: save() carries the current ingest manifest into the new generation.
+    manifest = None
+    before = store.ntotal
+    rollback = (
+        f"Roll back with `python -m app.rag.generations --use {previous}`."
+        if previous
+        else f"The previous files stay at {settings.vector_store_path} until pruned."
+    )
+    if shards is not None:
+        store, manifest = sharded.rebuild(store, shards)
+        console.print(f"Split {before} vectors into {shards} shards.")
+    elif compact:
+        dropped = store.removed_rows
+        manifest = IngestManifest(store.manifest_path)
+        manifest.remap(store.compact())
+        console.print(f"Compacted away {dropped} rows of removed chunks.")
+    if index_type is None and quantization is None and shards is None:
+        store.save(manifest)
+        console.print(f"[green]Store re-saved.[/green] {before} vectors, columnar metadata. {rollback}")
+        return
+    if index_type is not None or quantization is not None:
+        store.migrate(index_type, quantization)
+    store.save(manifest)
+    console.print(
+        f"[green]Migration complete.[/green] {before} vectors now in a {store.index_type} index "
+        f"({store.quantization} quantization). Set CW_FAISS_INDEX_TYPE={store.index_type} and "
+        f"CW_FAISS_QUANTIZATION={store.quantization} for future ingestion. {rollback}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the FAISS store as another index type.")
+    parser.add_argument(
+        "--index-type",
+        choices=INDEX_TYPES,
+        help="Target index type; omit to only upgrade the metadata format",
+    )
+    parser.add_argument(
+        "--quantization",
+        choices=QUANTIZATIONS,
+        help="In-RAM codes: sq8 or binary (rescored from a float32 vectors file), or none",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        help="Split the store into this many shards (see CW_VECTOR_STORE_SHARDS)",
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Drop the metadata/vector rows of removed or replaced PDFs and renumber the rest",
+    )
+    args = parser.parse_args()
+    migrate(args.index_type, args.quantization, args.shards, args.compact)
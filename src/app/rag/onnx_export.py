@@ -0,0 +1,165 @@
+"""
+Export the sentence-transformers embedding model to ONNX (plus a dynamically
+quantized int8 copy) and check it against the PyTorch path.
+
+    python -m app.rag.onnx_export                   # export + parity check
+    python -m app.rag.onnx_export --check-only --texts queries.txt
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from rich.console import Console
+from rich.table import Table
+
+from app.config import get_settings
+from app.rag.embeddings import (
+    ONNX_CONFIG,
+    ONNX_INT8_MODEL,
+    ONNX_MODEL,
+    OnnxEmbedder,
+    TorchEmbedder,
+)
+
+console = Console()
+
+
+def export(model_name: str, out_dir: str, int8: bool = True, opset: int = 17):
+    """Write model.onnx, model.int8.onnx, tokenizer files and embedder.json to `out_dir`."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Pooling
+
+    st = SentenceTransformer(model_name, device="cpu")
+    transformer = st[0].auto_model.eval()
+    tokenizer = st.tokenizer
+    pooling = next(m for m in st if isinstance(m, Pooling))
+    if pooling.pooling_mode_cls_token:
+        mode = "cls"
+    elif pooling.pooling_mode_mean_tokens:
+        mode = "mean"
+    else:
+        raise ValueError(f"{model_name} uses a pooling mode the ONNX backend does not implement.")
+
+    sample = tokenizer(["Inspect scaffold planks before each shift."], return_tensors="pt")
+    input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+
+    class _Encoder(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    os.makedirs(out_dir, exist_ok=True)
+    model_path = os.path.join(out_dir, ONNX_MODEL)
+    axes = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            _Encoder(transformer),
+            tuple(sample[n] for n in input_names),
+            model_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes={n: axes for n in input_names + ["last_hidden_state"]},
+            opset_version=opset,
+            do_constant_folding=True,
+        )
+    tokenizer.save_pretrained(out_dir)
+    config = {
+        "source": model_name,
+        "dim": st.get_sentence_embedding_dimension(),
+        "pooling": mode,
+        "max_length": st.max_seq_length,
+        "pad_id": tokenizer.pad_token_id,
+        "pad_token": tokenizer.pad_token,
+    }
+    Path(out_dir, ONNX_CONFIG).write_text(json.dumps(config, indent=2))
+    console.print(f"Exported {model_name} to {model_path}")
+
+    if int8:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        int8_path = os.path.join(out_dir, ONNX_INT8_MODEL)
+        quantize_dynamic(model_path, int8_path, weight_type=QuantType.QInt8)
+        console.print(f"Quantized weights to int8: {int8_path}")
+
+
+def _sample_texts() -> List[str]:
+    from app.bench.corpus import TECHNICAL_QUERIES, TOPICS
+
+    return list(TOPICS.values()) + list(TECHNICAL_QUERIES.values())
+
+
+def _per_query_ms(embedder, texts: List[str]) -> float:
+    embedder.encode(texts[:1])  # first call pays session/graph setup
+    timings = []
+    for text in texts:
+        started = time.perf_counter()
+        embedder.encode([text])
+        timings.append(time.perf_counter() - started)
+    return 1000 * statistics.median(timings)
+
+
+def check_parity(model_name: str, out_dir: str, texts: List[str], threads: int = 0) -> float:
+    """
+    Compare ONNX (fp32 and, if exported, int8) embeddings with the PyTorch
+    ones; returns the lowest cosine similarity seen.
+    """
+    reference = TorchEmbedder(model_name, threads=threads)
+    expected = reference.encode(texts)
+    table = Table(title=f"{len(texts)} texts vs. PyTorch")
+    for column in ("backend", "min cosine", "mean cosine", "ms/query"):
+        table.add_column(column, justify="left" if column == "backend" else "right")
+    table.add_row("torch", "1.0000", "1.0000", f"{_per_query_ms(reference, texts):.2f}")
+
+    worst = 1.0
+    for int8 in (False, True):
+        if not os.path.exists(os.path.join(out_dir, ONNX_INT8_MODEL if int8 else ONNX_MODEL)):
+            continue
+        embedder = OnnxEmbedder(out_dir, int8=int8, threads=threads)
+        cosine = np.sum(embedder.encode(texts) * expected, axis=1)
+        worst = min(worst, float(cosine.min()))
+        table.add_row(
+            "onnx int8" if int8 else "onnx fp32",
+            f"{cosine.min():.4f}",
+            f"{cosine.mean():.4f}",
+            f"{_per_query_ms(embedder, texts):.2f}",
+        )
+    console.print(table)
+    return worst
+
+
+if __name__ == "__main__":
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Export the embedding model to ONNX and check parity.")
+    parser.add_argument("--model", default=settings.embedding_model)
+    parser.add_argument("--out", default=settings.embedding_onnx_dir)
+    parser.add_argument("--no-int8", action="store_true", help="Skip the int8 quantized copy")
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--check-only", action="store_true", help="Only run the parity check")
+    parser.add_argument("--texts", help="One text per line for the parity check (default: built-in samples)")
+    parser.add_argument("--min-cosine", type=float, default=0.98)
+    parser.add_argument("--threads", type=int, default=settings.embedding_threads)
+    args = parser.parse_args()
+
+    if not args.check_only:
+        export(args.model, args.out, int8=not args.no_int8, opset=args.opset)
+    if args.texts:
+        texts = [line.strip() for line in Path(args.texts).read_text().splitlines() if line.strip()]
+    else:
+        texts = _sample_texts()
+    worst = check_parity(args.model, args.out, texts, threads=args.threads)
+    if worst < args.min_cosine:
+        console.print(f"[red]Parity check failed:[/red] min cosine {worst:.4f} < {args.min_cosine}")
+        sys.exit(1)
+    console.print(f"[green]Parity OK[/green] (min cosine {worst:.4f})")
@@ -1,39 +1,285 @@
 from __future__ import annotations
 
-from typing import List, Tuple
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional, Tuple
 
 import numpy as np
 
-from app.rag.vector_store import DocumentChunk, EmbeddingModel, get_store
+from app.config import get_settings
+from app.rag.batcher import EmbeddingBatcher
+from app.rag.cache import TTLCache, normalize_query
+from app.rag.generations import StoreWatcher
+from app.rag.vector_store import ChunkFilter, DocumentChunk, EmbeddingModel, get_store
+from app.utils import metrics
+from app.utils.concurrency import run_cpu, submit_cpu
+from app.utils.startup import Component
 
 
 class Retriever:
-    def __init__(self):
-        self.embedder = EmbeddingModel()
-        self.store = get_store(self.embedder)
+    """
+    Query embedding plus vector search. The embedding model and the store are
+    loaded in the constructor, or with `eager=False` on first use / `load()`.
 
-    def retrieve(self, query: str, k: int = 4) -> List[Tuple[DocumentChunk, float]]:
-        q_emb = self.embedder.encode([query])
-        return self.store.search(q_emb, k=k)
+    A `live` retriever (the API's) opens the store read-only and swaps in each
+    generation ingestion publishes. Every search reads `self.store` once, so
+    it runs against one consistent index/metadata pair even mid-swap.
+    """
 
-    def add_documents(self, chunks: List[DocumentChunk]):
+    def __init__(self, eager: bool = True, live: bool = False):
+        settings = get_settings()
+        self.embedder_component = Component("embedding_model", EmbeddingModel)
+        self.store_component = Component(
+            "vector_store", lambda: get_store(self.embedder, read_only=live)
+        )
+        self.watcher: Optional[StoreWatcher] = None
+        if live and settings.vector_store_reload_interval_s > 0:
+            self.watcher = StoreWatcher(
+                self.store_component,
+                settings.vector_store_path,
+                lambda: get_store(self.embedder, read_only=True),
+                settings.vector_store_reload_interval_s,
+            )
+        self.batcher: Optional[EmbeddingBatcher] = None
+        if settings.embed_batching_enabled:
+            self.batcher = EmbeddingBatcher(
+                lambda texts: self.embedder.encode(texts),
+                max_batch_size=settings.embed_batch_max_size,
+                max_wait_ms=settings.embed_batch_max_wait_ms,
+            )
+        self.embedding_cache: Optional[TTLCache] = None
+        self.result_cache: Optional[TTLCache] = None
+        if settings.query_cache_enabled:
+            self.embedding_cache = TTLCache(
+                settings.query_cache_size, settings.query_cache_ttl_seconds
+            )
+            self.result_cache = TTLCache(
+                settings.query_cache_size, settings.query_cache_ttl_seconds
+            )
+        self._cached_generation: Optional[int] = None
+        if eager:
+            self.load()
+
+    @property
+    def embedder(self) -> EmbeddingModel:
+        return self.embedder_component.get()
+
+    @property
+    def store(self):
+        return self.store_component.get()
+
+    @property
+    def loaded(self) -> bool:
+        return self.embedder_component.ready and self.store_component.ready
+
+    def load(self):
+        self.store_component.get()
+
+    def embed_query(self, query: str) -> np.ndarray:
+        cached = self._cached_embedding(query)
+        if cached is not None:
+            return cached
+        with metrics.stage("embed"):
+            if self.batcher is not None:
+                q_emb = self.batcher.encode([query])
+            else:
+                q_emb = self.embedder.encode([query])
+        self._remember_embedding(query, q_emb)
+        return q_emb
+
+    def retrieve(
+        self,
+        query: str,
+        k: int = 4,
+        chunk_filter: Optional[ChunkFilter] = None,
+        blend: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+    ) -> List[Tuple[DocumentChunk, float]]:
+        """
+        Top-k chunks for `query`. `blend` maps its embedding to the vector
+        actually searched (session history); such results are not cached.
+        """
+        cached = None if blend else self._cached_results(query, k, chunk_filter)
+        if cached is not None:
+            return cached
+        generation = self.store.generation
+        q_emb = self.embed_query(query)
+        if blend is not None:
+            return self._search(blend(q_emb), k, chunk_filter)
+        results = self._search(q_emb, k, chunk_filter)
+        self._remember_results(query, k, chunk_filter, generation, results)
+        return results
+
+    def retrieve_batch(
+        self,
+        queries: List[str],
+        k: int = 4,
+        chunk_filters: Optional[List[Optional[ChunkFilter]]] = None,
+    ) -> List[List[Tuple[DocumentChunk, float]]]:
+        """
+        Bulk retrieval for offline replay: uncached queries are embedded in
+        one encode call and searched with one multi-query index call per
+        distinct filter.
+        """
+        filters = chunk_filters or [None] * len(queries)
+        out: List[Optional[List[Tuple[DocumentChunk, float]]]] = [
+            self._cached_results(q, k, f) for q, f in zip(queries, filters)
+        ]
+        missing = [i for i, hit in enumerate(out) if hit is None]
+        if not missing:
+            return out
+        embeddings: List[Optional[np.ndarray]] = [self._cached_embedding(queries[i]) for i in missing]
+        to_embed = [j for j, emb in enumerate(embeddings) if emb is None]
+        if to_embed:
+            with metrics.stage("embed"):
+                encoded = self.embedder.encode([queries[missing[j]] for j in to_embed])
+            for j, row in zip(to_embed, encoded):
+                embeddings[j] = row.reshape(1, -1)
+                self._remember_embedding(queries[missing[j]], embeddings[j])
+        store = self.store
+        groups: Dict[Optional[ChunkFilter], List[int]] = {}
+        for j, i in enumerate(missing):
+            groups.setdefault(filters[i], []).append(j)
+        with metrics.stage("search"):
+            for chunk_filter, rows in groups.items():
+                hits = store.search_batch(
+                    np.vstack([embeddings[j] for j in rows]), k=k, chunk_filter=chunk_filter
+                )
+                for j, results in zip(rows, hits):
+                    out[missing[j]] = results
+                    self._remember_results(
+                        queries[missing[j]], k, chunk_filter, store.generation, results
+                    )
+        return out
+
+    def start_retrieval(
+        self,
+        query: str,
+        k: int = 4,
+        chunk_filter: Optional[ChunkFilter] = None,
+        blend: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+    ) -> "asyncio.Future[List[Tuple[DocumentChunk, float]]]":
+        """
+        Async retrieval that begins immediately. The query is handed to the
+        batcher (or CPU executor) before this returns, so embedding overlaps
+        with whatever the caller does before awaiting. Waiting on the batcher
+        happens on the event loop, not in an executor thread, so concurrent
+        chats can actually coalesce into one batch. `blend` is as in `retrieve()`.
+        """
+        if not self.loaded:
+            # Never load a model on the event loop.
+            return asyncio.ensure_future(self._retrieve_after_load(query, k, chunk_filter, blend))
+        loop = asyncio.get_running_loop()
+        cached = None if blend else self._cached_results(query, k, chunk_filter)
+        if cached is not None:
+            done = loop.create_future()
+            done.set_result(cached)
+            return done
+
+        q_emb = self._cached_embedding(query)
+        embed_started = time.perf_counter()
+        if q_emb is not None:
+            pending = loop.create_future()
+            pending.set_result(q_emb)
+            embed_started = None
+        elif self.batcher is not None:
+            pending = asyncio.wrap_future(self.batcher.submit(query))
+        else:
+            pending = submit_cpu(self.embedder.encode, [query])
+        task = asyncio.ensure_future(
+            self._search_when_embedded(query, pending, k, chunk_filter, embed_started, blend)
+        )
+        # If the caller abandons retrieval, release the queued embedding too.
+        task.add_done_callback(lambda t: pending.cancel() if t.cancelled() else None)
+        return task
+
+    async def _retrieve_after_load(
+        self,
+        query: str,
+        k: int,
+        chunk_filter: Optional[ChunkFilter],
+        blend: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+    ) -> List[Tuple[DocumentChunk, float]]:
+        await asyncio.to_thread(self.load)
+        return await self.start_retrieval(query, k, chunk_filter, blend)
+
+    async def _search_when_embedded(
+        self,
+        query: str,
+        pending: "asyncio.Future[np.ndarray]",
+        k: int,
+        chunk_filter: Optional[ChunkFilter] = None,
+        embed_started: Optional[float] = None,
+        blend: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+    ) -> List[Tuple[DocumentChunk, float]]:
+        q_emb = (await pending).reshape(1, -1)
+        if embed_started is not None:
+            # Includes time queued in the batcher: that is what the chat waited.
+            metrics.observe_stage("embed", time.perf_counter() - embed_started)
+        self._remember_embedding(query, q_emb)
+        if blend is not None:
+            return await run_cpu(self._search, blend(q_emb), k, chunk_filter)
+        generation = self.store.generation
+        results = await run_cpu(self._search, q_emb, k, chunk_filter)
+        self._remember_results(query, k, chunk_filter, generation, results)
+        return results
+
+    def _search(
+        self, q_emb: np.ndarray, k: int, chunk_filter: Optional[ChunkFilter] = None
+    ) -> List[Tuple[DocumentChunk, float]]:
+        with metrics.stage("search"):
+            return self.store.search(q_emb, k=k, chunk_filter=chunk_filter)
+
+    def cache_stats(self) -> dict:
+        return {
+            "embedding_cache": self.embedding_cache.stats() if self.embedding_cache else None,
+            "result_cache": self.result_cache.stats() if self.result_cache else None,
+        }
+
+    def _cached_embedding(self, query: str) -> Optional[np.ndarray]:
+        if self.embedding_cache is None:
+            return None
+        return self.embedding_cache.get(normalize_query(query))
+
+    def _remember_embedding(self, query: str, q_emb: np.ndarray):
+        if self.embedding_cache is not None:
+            self.embedding_cache.put(normalize_query(query), q_emb)
+
+    def _cached_results(
+        self, query: str, k: int, chunk_filter: Optional[ChunkFilter] = None
+    ) -> Optional[List[Tuple[DocumentChunk, float]]]:
+        if self.result_cache is None:
+            return None
+        generation = self.store.generation
+        if generation != self._cached_generation:
+            # Index changed (add/save/reload): every cached hit list is stale.
+            self.result_cache.clear()
+            self._cached_generation = generation
+        return self.result_cache.get((normalize_query(query), k, chunk_filter))
+
+    def _remember_results(
+        self,
+        query: str,
+        k: int,
+        chunk_filter: Optional[ChunkFilter],
+        generation: int,
+        results: List[Tuple[DocumentChunk, float]],
+    ):
+        # Skip results computed against an index that has since been replaced.
+        if self.result_cache is not None and generation == self.store.generation:
+            self.result_cache.put((normalize_query(query), k, chunk_filter), results)
+
+    def add_documents(self, chunks: List[DocumentChunk], save: bool = True) -> np.ndarray:
+        """Embed and store chunks; returns their vector IDs."""
         embeddings = self.embedder.encode([c.text for c in chunks])
-        self.store.add(embeddings, chunks)
-        self.store.save()
-
-
-def sanitize_context(chunks: List[DocumentChunk], max_chars: int = 1800) -> str:
-    """Simple prompt-injection hardening: drop long or suspicious spans."""
-    safe_lines = []
-    total = 0
-    for c in chunks:
-        text = c.text
-        if any(marker in text.lower() for marker in ["ignore previous", "disregard", "system prompt"]):
-            continue
-        snippet = text[:400]  # avoid overly long attacker content
-        safe_lines.append(snippet)
-        total += len(snippet)
-        if total >= max_chars:
-            break
-    return "\n---\n".join(safe_lines)
+        ids = self.store.add(embeddings, chunks)
+        if save:
+            self.store.save()
+        return ids
+
+
+INJECTION_MARKERS = ("ignore previous", "disregard", "system prompt")
+
 
+def looks_like_injection(text: str) -> bool:
+    lowered = text.lower()
+    return any(marker in lowered for marker in INJECTION_MARKERS)
@@ -0,0 +1,299 @@
+"""
+Sharded vector store: one logical store split into N FaissStore shards.
+
+A generation of a sharded store holds one complete FaissStore per shard plus
+a layout file and the ingest manifest:
+
+    storage/faiss.index.generations/000007/faiss.index.shards.json
+    storage/faiss.index.generations/000007/faiss.index.manifest.json
+    storage/faiss.index.generations/000007/shard-00-of-04/faiss.index (+ .meta/, ...)
+    storage/faiss.index.generations/000007/shard-01-of-04/faiss.index ...
+
+Every shard is memory-mapped like a single store. A search runs on all shards
+in parallel on a small thread pool (FAISS releases the GIL, and a single
+query on a flat index is otherwise single-threaded) and the per-shard top-k
+lists are merged by score. New chunks go to the shard their document name
+hashes to; near-duplicate aliases live with their canonical row.
+
+Vector IDs are `local row + (shard << SHARD_SHIFT)`, so the IDs of a
+document's own chunks stay contiguous and the ingest manifest keeps storing
+them as ranges (plus one entry per alias in another shard).
+"""
+from __future__ import annotations
+
+import heapq
+import itertools
+import json
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.config import get_settings
+from app.rag import generations
+from app.rag.dedup import NearDuplicateIndex
+from app.rag.manifest import IngestManifest
+from app.rag.vector_store import ChunkFilter, DocumentChunk, FaissStore
+
+SHARD_SHIFT = 40
+_LOCAL_MASK = (1 << SHARD_SHIFT) - 1
+LAYOUT_VERSION = 1
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _search_pool() -> ThreadPoolExecutor:
+    """Process-wide threads for shard searches (separate from the request CPU executor)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = get_settings().vector_store_search_threads or os.cpu_count() or 4
+            _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cw-shard")
+        return _pool
+
+
+def layout_path(index_path: str) -> str:
+    return index_path + ".shards.json"
+
+
+def shard_path(index_path: str, shard: int, count: int) -> str:
+    return os.path.join(
+        os.path.dirname(index_path), f"shard-{shard:02d}-of-{count:02d}", os.path.basename(index_path)
+    )
+
+
+def read_layout(root: str) -> Optional[int]:
+    """Shard count of the store's current generation; None if it is not sharded."""
+    try:
+        with open(layout_path(generations.resolve(root)[0]), encoding="utf-8") as fh:
+            return int(json.load(fh)["shards"])
+    except FileNotFoundError:
+        return None
+
+
+def global_ids(shard: int, local: np.ndarray) -> np.ndarray:
+    return np.asarray(local, dtype=np.int64) + (shard << SHARD_SHIFT)
+
+
+def split_ids(ids) -> Tuple[np.ndarray, np.ndarray]:
+    """(shard, local row) per global ID."""
+    ids = np.asarray(ids, dtype=np.int64)
+    return ids >> SHARD_SHIFT, ids & _LOCAL_MASK
+
+
+class ShardedStore:
+    """
+    The FaissStore interface over `shards` FaissStores (see module docstring).
+    The shard count is fixed when the store is first created; an existing
+    sharded generation keeps its own count. `shards` differing from the one
+    on disk starts an empty layout (see `rebuild()`).
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        path: str,
+        shards: int | None = None,
+        index_type: str | None = None,
+        quantization: str | None = None,
+        read_only: bool = False,
+    ):
+        self.dim = dim
+        self.root = path
+        self.path, self.disk_generation = generations.resolve(path)
+        self.read_only = read_only
+        on_disk = read_layout(path)
+        count = shards or on_disk or get_settings().vector_store_shards
+        if count < 1 or count > 1 << (63 - SHARD_SHIFT):
+            raise ValueError(f"Invalid shard count {count}.")
+        # Shard paths include the count, so a different one opens empty shards.
+        self.shards: List[FaissStore] = list(
+            _search_pool().map(
+                lambda i: FaissStore(
+                    dim, shard_path(self.path, i, count), index_type, quantization, read_only
+                ),
+                range(count),
+            )
+        )
+
+    @property
+    def generation(self) -> Tuple[int, ...]:
+        """Changes whenever any shard's searchable contents change; caches key on it."""
+        return tuple(s.generation for s in self.shards)
+
+    @property
+    def ntotal(self) -> int:
+        return sum(s.ntotal for s in self.shards)
+
+    @property
+    def index_type(self) -> str:
+        return self.shards[0].index_type
+
+    @property
+    def quantization(self) -> str:
+        return self.shards[0].quantization
+
+    @property
+    def manifest_path(self) -> str:
+        return self.path + ".manifest.json"
+
+    @property
+    def signatures_path(self) -> str:
+        return self.path + ".minhash"
+
+    @property
+    def bytes_per_vector(self) -> int:
+        return self.shards[0].bytes_per_vector
+
+    def shard_of(self, document: str) -> int:
+        return zlib.crc32(document.encode("utf-8")) % len(self.shards)
+
+    def _each(self, fn: Callable[[int, FaissStore], object]) -> list:
+        """Run `fn(shard number, shard)` on every shard in parallel."""
+        if len(self.shards) == 1:
+            return [fn(0, self.shards[0])]
+        return list(_search_pool().map(lambda i: fn(i, self.shards[i]), range(len(self.shards))))
+
+    def _check_read_only(self):
+        self.shards[0]._check_read_only()
+
+    def save(
+        self,
+        manifest: IngestManifest | None = None,
+        signatures: NearDuplicateIndex | None = None,
+    ):
+        """Write every shard (in parallel) into one new generation, then publish it."""
+        self._check_read_only()
+        if manifest is None:
+            manifest = IngestManifest(self.manifest_path)
+        name, path = generations.create(self.root)
+        count = len(self.shards)
+        for i in range(count):
+            os.makedirs(os.path.dirname(shard_path(path, i, count)), exist_ok=True)
+        self._each(lambda i, s: s.write(shard_path(path, i, count)))
+        with open(layout_path(path), "w", encoding="utf-8") as fh:
+            json.dump({"version": LAYOUT_VERSION, "shards": len(self.shards)}, fh)
+        self.path = path
+        manifest.save(self.manifest_path)
+        if signatures is not None:
+            signatures.save(self.signatures_path)
+        generations.publish(self.root, name)
+        self.disk_generation = name
+        generations.prune(self.root, get_settings().faiss_keep_generations)
+
+    def add(self, embeddings: np.ndarray, chunks: List[DocumentChunk]) -> np.ndarray:
+        """Add vectors, each to its document's shard; returns their global IDs in input order."""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        targets = np.array([self.shard_of(c.document) for c in chunks], dtype=np.int64)
+        ids = np.empty(len(chunks), dtype=np.int64)
+        for shard in np.unique(targets).tolist():
+            rows = np.flatnonzero(targets == shard)
+            local = self.shards[shard].add(embeddings[rows], [chunks[r] for r in rows])
+            ids[rows] = global_ids(shard, local)
+        return ids
+
+    def add_duplicates(self, chunks: List[DocumentChunk], canonical_ids) -> np.ndarray:
+        """Aliases are stored in their canonical row's shard."""
+        shards, local = split_ids(canonical_ids)
+        ids = np.empty(len(chunks), dtype=np.int64)
+        for shard in np.unique(shards).tolist():
+            rows = np.flatnonzero(shards == shard)
+            added = self.shards[shard].add_duplicates([chunks[r] for r in rows], local[rows])
+            ids[rows] = global_ids(shard, added)
+        return ids
+
+    def remove(self, ids) -> int:
+        shards, local = split_ids(ids)
+        return sum(
+            self.shards[shard].remove(local[shards == shard]) for shard in np.unique(shards).tolist()
+        )
+
+    def train_pending(self):
+        self._each(lambda i, s: s.train_pending())
+
+    def migrate(self, index_type: str | None = None, quantization: str | None = None):
+        self._each(lambda i, s: s.migrate(index_type, quantization))
+
+    def compact(self) -> Dict[int, int]:
+        """Compact every shard; returns {old global ID: new global ID}."""
+        mapping: Dict[int, int] = {}
+        for i, shard_mapping in enumerate(self._each(lambda i, s: s.compact())):
+            offset = i << SHARD_SHIFT
+            mapping.update((old + offset, new + offset) for old, new in shard_mapping.items())
+        return mapping
+
+    @property
+    def removed_rows(self) -> int:
+        return sum(s.removed_rows for s in self.shards)
+
+    def vector_rows(self) -> np.ndarray:
+        return np.concatenate([global_ids(i, s.vector_rows()) for i, s in enumerate(self.shards)])
+
+    def chunk(self, i: int, text: bool = True) -> DocumentChunk:
+        shard, local = int(i) >> SHARD_SHIFT, int(i) & _LOCAL_MASK
+        return self.shards[shard].chunk(local, text=text)
+
+    def search(self, embedding: np.ndarray, k: int = 5, chunk_filter: ChunkFilter | None = None):
+        return self.search_batch(embedding, k, chunk_filter)[0]
+
+    def search_batch(
+        self, embeddings: np.ndarray, k: int = 5, chunk_filter: ChunkFilter | None = None
+    ) -> List[List[Tuple[DocumentChunk, float]]]:
+        """Every shard's top-k, searched in parallel, merged by score."""
+        per_shard = self._each(lambda i, s: s.search_batch(embeddings, k, chunk_filter))
+        return [
+            heapq.nlargest(k, itertools.chain.from_iterable(hits), key=lambda hit: hit[1])
+            for hits in zip(*per_shard)
+        ]
+
+
+def rebuild(source, shards: int, batch: int = 50000) -> Tuple[ShardedStore, IngestManifest]:
+    """
+    Copy a FaissStore or ShardedStore into a new, unsaved ShardedStore of
+    `shards` shards at the same root, keeping the vectors, metadata and
+    near-duplicate aliases of every live row. Returns it with the source's
+    ingest manifest rewritten to the new IDs; save them together.
+    """
+    if read_layout(source.root) == shards:
+        raise ValueError(f"The store already has {shards} shards.")
+    sources: Sequence[Tuple[FaissStore, Callable[[np.ndarray], np.ndarray]]]
+    if isinstance(source, ShardedStore):
+        sources = [(s, lambda local, i=i: global_ids(i, local)) for i, s in enumerate(source.shards)]
+    else:
+        sources = [(source, lambda local: np.asarray(local, dtype=np.int64))]
+    target = ShardedStore(
+        source.dim,
+        source.root,
+        shards=shards,
+        index_type=source.index_type,
+        quantization=source.quantization,
+    )
+    mapping: Dict[int, int] = {}
+    for store, to_global in sources:
+        store.train_pending()
+        if store.vectors is not None:
+            # Exact vectors from the (memory-mapped) file, a block at a time.
+            rows, vectors = store.vector_rows(), None
+        else:
+            rows, vectors = store._ids_and_vectors()
+        for start in range(0, len(rows), batch):
+            block = rows[start : start + batch]
+            block_vectors = (
+                store.vectors.take(block) if vectors is None else vectors[start : start + batch]
+            )
+            new = target.add(block_vectors, [store.chunk(int(r)) for r in block])
+            mapping.update(zip(to_global(block).tolist(), new.tolist()))
+        aliases, canonical = store.meta.aliases()
+        if len(aliases):
+            new = target.add_duplicates(
+                [store.chunk(int(r)) for r in aliases],
+                [mapping[g] for g in to_global(canonical).tolist()],
+            )
+            mapping.update(zip(to_global(aliases).tolist(), new.tolist()))
+    manifest = IngestManifest(source.manifest_path)
+    manifest.remap(mapping)
+    return target, manifest
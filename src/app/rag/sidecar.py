@@ -0,0 +1,184 @@
+"""
+Embedding sidecar: one process holds the embedding model and serves every
+uvicorn worker on the box over a Unix socket, so workers do not each load it.
+
+    python -m app.rag.sidecar --socket storage/embed.sock
+    CW_EMBEDDING_BACKEND=sidecar uvicorn app.main:app --workers 4
+
+Wire format, both directions: frames of a 4-byte big-endian length plus
+payload. A request is one JSON frame (`{"op": "info"}` or
+`{"op": "encode", "texts": [...]}`); a reply is a JSON header frame followed
+by a body frame holding the float32 rows (empty for `info` and errors).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import struct
+import threading
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+_LENGTH = struct.Struct(">I")
+
+
+def _recv_exact(conn: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = conn.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionResetError("embedding sidecar closed the connection")
+        buf += chunk
+    return bytes(buf)
+
+
+def _recv_frame(conn: socket.socket) -> bytes:
+    (length,) = _LENGTH.unpack(_recv_exact(conn, _LENGTH.size))
+    return _recv_exact(conn, length)
+
+
+def _frame(payload: bytes) -> bytes:
+    return _LENGTH.pack(len(payload)) + payload
+
+
+class SidecarEmbedder:
+    """
+    Client side (`embedding_backend=sidecar`). Each thread keeps its own
+    connection; a broken connection is re-opened once per call.
+    """
+
+    def __init__(self, socket_path: str, timeout_s: float = 30.0):
+        self.socket_path = socket_path
+        self.timeout_s = timeout_s
+        self._local = threading.local()
+        header, _ = self._call({"op": "info"})
+        self.dim = int(header["dim"])
+
+    def _connect(self) -> socket.socket:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.settimeout(self.timeout_s)
+        conn.connect(self.socket_path)
+        return conn
+
+    def _call(self, request: dict) -> Tuple[dict, bytes]:
+        payload = _frame(json.dumps(request).encode("utf-8"))
+        for attempt in range(2):
+            conn: Optional[socket.socket] = getattr(self._local, "conn", None)
+            reused = conn is not None
+            if conn is None:
+                conn = self._local.conn = self._connect()
+            try:
+                conn.sendall(payload)
+                header = json.loads(_recv_frame(conn))
+                body = _recv_frame(conn)
+                break
+            except OSError:
+                conn.close()
+                self._local.conn = None
+                # Only a stale kept-alive connection is worth one more try.
+                if not reused or attempt:
+                    raise
+        if "error" in header:
+            raise RuntimeError(f"embedding sidecar: {header['error']}")
+        return header, body
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        header, body = self._call({"op": "encode", "texts": list(texts)})
+        return np.frombuffer(body, dtype=np.float32).reshape(header["n"], header["dim"])
+
+
+class SidecarServer:
+    """Serves one EmbeddingModel; concurrent requests share batches via EmbeddingBatcher."""
+
+    def __init__(self, socket_path: str, backend: str, max_batch_size: int, max_wait_ms: float):
+        from app.rag.batcher import EmbeddingBatcher
+        from app.rag.embeddings import EmbeddingModel
+
+        self.socket_path = socket_path
+        self.embedder = EmbeddingModel(backend=backend)
+        self.batcher = EmbeddingBatcher(
+            self.embedder.encode, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms
+        )
+
+    async def _encode(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.embedder.dim), dtype=np.float32)
+        rows = await asyncio.gather(
+            *(asyncio.wrap_future(self.batcher.submit(t)) for t in texts)
+        )
+        return np.stack(rows).astype(np.float32)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    (length,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+                    request = json.loads(await reader.readexactly(length))
+                except asyncio.IncompleteReadError:
+                    return
+                body = b""
+                try:
+                    if request.get("op") == "info":
+                        header = {"dim": self.embedder.dim}
+                    elif request.get("op") == "encode":
+                        vectors = await self._encode(request["texts"])
+                        header = {"n": len(vectors), "dim": self.embedder.dim}
+                        body = vectors.tobytes()
+                    else:
+                        header = {"error": f"unknown op {request.get('op')!r}"}
+                except Exception as exc:
+                    logger.exception("Embedding request failed")
+                    header = {"error": f"{exc.__class__.__name__}: {exc}"}
+                writer.write(_frame(json.dumps(header).encode("utf-8")) + _frame(body))
+                await writer.drain()
+        except (asyncio.CancelledError, ConnectionError):
+            # Shutdown or the worker went away; nothing to answer.
+            return
+        finally:
+            writer.close()
+
+    async def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)  # stale socket from a previous run
+        os.makedirs(os.path.dirname(self.socket_path) or ".", exist_ok=True)
+        server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        logger.info("Embedding sidecar (dim %d) listening on %s", self.embedder.dim, self.socket_path)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            self.batcher.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+
+if __name__ == "__main__":
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Serve embeddings to local API workers over a Unix socket.")
+    parser.add_argument("--socket", default=settings.embedding_sidecar_socket)
+    parser.add_argument(
+        "--backend",
+        choices=("torch", "onnx"),
+        # The workers' .env usually says "sidecar"; the sidecar itself runs a real model.
+        default=settings.embedding_backend if settings.embedding_backend != "sidecar" else "torch",
+    )
+    parser.add_argument("--max-batch-size", type=int, default=settings.embed_batch_max_size)
+    parser.add_argument("--max-wait-ms", type=float, default=settings.embed_batch_max_wait_ms)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    server = SidecarServer(args.socket, args.backend, args.max_batch_size, args.max_wait_ms)
+    asyncio.run(server.serve_forever())
@@ -1,13 +1,25 @@
 from __future__ import annotations
 
+import itertools
+import logging
 import os
-from dataclasses import dataclass
-from typing import List, Sequence
+from dataclasses import dataclass, field, replace
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 
 import numpy as np
-from sentence_transformers import SentenceTransformer
 
 from app.config import get_settings
+from app.rag import generations
+from app.rag.embeddings import EmbeddingModel
+from app.rag.manifest import IngestManifest
+from app.rag.metadata import OWN_VECTOR, REMOVED_ALIAS, ChunkMetadata
+from app.rag.vectors import VectorFile
+
+if TYPE_CHECKING:
+    from app.rag.dedup import NearDuplicateIndex
+    from app.rag.sharded import ShardedStore
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -16,63 +28,798 @@ class DocumentChunk:
     document: str
     section: str | None = None
     page: int | None = None
+    # Other places this (near-identical) text was found; sources only, text empty.
+    duplicates: List["DocumentChunk"] = field(default_factory=list)
 
 
-class EmbeddingModel:
-    def __init__(self):
-        settings = get_settings()
-        self.model = SentenceTransformer(settings.embedding_model)
+@dataclass(frozen=True)
+class ChunkFilter:
+    """Restrict a search to some documents and/or an inclusive page range; hashable for cache keys."""
+
+    documents: Tuple[str, ...] | None = None
+    page_from: int | None = None
+    page_to: int | None = None
+
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+QUANTIZATIONS = ("none", "sq8", "binary")
 
-    def encode(self, texts: Sequence[str]) -> np.ndarray:
-        return np.array(self.model.encode(list(texts), normalize_embeddings=True))
+# k-means wants ~39 points per centroid; fewer and faiss warns about poor clusters.
+_MIN_POINTS_PER_CENTROID = 39
+
+# Process-wide, so a hot-reloaded store never reuses the generation of the one it replaces.
+_GENERATIONS = itertools.count(1)
 
 
 class FaissStore:
-    def __init__(self, dim: int, path: str):
-        import faiss
+    """
+    FAISS inner-product index plus chunk metadata. Every vector is stored
+    under an explicit ID equal to its metadata row, so vectors can be removed
+    (and files re-ingested) without renumbering anything; removed rows simply
+    become unreachable. Stores written before IDs existed used positions,
+    which are the same numbers, and are converted on first modification.
+
+    Metadata is a columnar, memory-mapped ChunkMetadata under `<path>.meta/`;
+    with `faiss_mmap` the index itself is memory-mapped too and only re-read
+    into RAM when it is about to be modified.
+
+    `index_type` selects exact search (`flat`) or an approximate index
+    (`ivf_flat`, `ivf_pq`, `hnsw`). IVF indexes must be trained: vectors added
+    before training are buffered and the index is trained on them at `save()`
+    (or explicitly via `train_pending()`), so ingestion trains on the whole
+    batch rather than on the first PDF.
+
+    `quantization` shrinks the in-RAM codes: `sq8` stores one byte per
+    dimension, `binary` one bit (sign) searched by Hamming distance. Both keep
+    the float32 vectors in a memory-mapped `<path>.vectors.f32` and rescore
+    the top `k * rescore_factor` candidates exactly. A loaded store keeps the
+    quantization it was written with; `migrate()` converts between them.
 
+    `path` is the store's root: files live in the generation `<path>.current`
+    names (see `app.rag.generations`), and `save()` publishes a new one.
+    `self.path` is the index file of the loaded generation. A `read_only`
+    store (the API's) is never modified in place, so searches need no lock;
+    new data arrives as a whole new store.
+
+    Near-duplicate chunks (see `app.rag.dedup`) are added with
+    `add_duplicates()`: metadata rows without a vector of their own that are
+    reported as extra sources of their canonical row's hits.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        path: str,
+        index_type: str | None = None,
+        quantization: str | None = None,
+        read_only: bool = False,
+    ):
+        settings = get_settings()
         self.dim = dim
-        self.path = path
-        self.index = faiss.IndexFlatIP(dim)
-        self.meta: List[DocumentChunk] = []
-        if os.path.exists(path):
+        self.root = path
+        self.path, self.disk_generation = generations.resolve(path)
+        self.read_only = read_only
+        self.index_type = (index_type or settings.faiss_index_type).lower()
+        self.quantization = (quantization or settings.faiss_quantization).lower()
+        self._check_layout()
+        self.rescore_factor = max(1, settings.faiss_rescore_factor)
+        self.max_sources = max(0, settings.dedup_max_sources)
+        self.index = self._new_index()
+        self.meta = ChunkMetadata()
+        self.vectors: VectorFile | None = None
+        if self.quantization != "none":
+            self.vectors = VectorFile(self.vectors_path, dim, rows=0)
+        self._mmapped = False
+        # (ids, vectors) waiting for the index to be trained (IVF only).
+        self._pending: List[Tuple[np.ndarray, np.ndarray]] = []
+        # Changes whenever searchable contents change; caches key on it.
+        self.generation = next(_GENERATIONS)
+        # (generation, mask of metadata rows present in the index)
+        self._live: Tuple[int, np.ndarray] | None = None
+        if os.path.exists(self.path):
             self._load()
+        self._apply_search_params()
+
+    def _check_layout(self):
+        if self.index_type not in INDEX_TYPES:
+            raise ValueError(
+                f"Unknown FAISS index type {self.index_type!r}; expected one of {INDEX_TYPES}."
+            )
+        if self.quantization not in QUANTIZATIONS:
+            raise ValueError(
+                f"Unknown quantization {self.quantization!r}; expected one of {QUANTIZATIONS}."
+            )
+        if self.quantization == "binary" and (self.index_type != "flat" or self.dim % 8):
+            raise ValueError("Binary quantization needs the flat index type and a dim divisible by 8.")
+        if self.quantization == "sq8" and self.index_type == "ivf_pq":
+            raise ValueError("ivf_pq is already quantized; use sq8 with flat, ivf_flat or hnsw.")
+
+    def _new_index(self, n_train: int | None = None):
+        """
+        Build an empty ID-addressable index of the configured type. With
+        `n_train`, IVF/PQ sizes are shrunk so a small corpus can still be trained.
+        """
+        import faiss
+
+        settings = get_settings()
+        if self.quantization == "binary":
+            return faiss.IndexBinaryIDMap2(faiss.IndexBinaryFlat(self.dim))
+        codec = "SQ8" if self.quantization == "sq8" else "Flat"
+        if self.index_type == "flat":
+            if codec == "Flat":
+                return faiss.IndexIDMap2(faiss.IndexFlatIP(self.dim))
+            return faiss.IndexIDMap2(
+                faiss.index_factory(self.dim, codec, faiss.METRIC_INNER_PRODUCT)
+            )
+        if self.index_type == "hnsw":
+            hnsw = faiss.index_factory(
+                self.dim, f"HNSW{settings.faiss_hnsw_m},{codec}", faiss.METRIC_INNER_PRODUCT
+            )
+            hnsw.hnsw.efConstruction = settings.faiss_ef_construction
+            return faiss.IndexIDMap2(hnsw)
+
+        # IVF indexes accept explicit IDs natively.
+        nlist = settings.faiss_nlist
+        nbits = settings.faiss_pq_nbits
+        if n_train is not None:
+            nlist = max(1, min(nlist, n_train // _MIN_POINTS_PER_CENTROID))
+            # PQ codebooks need at least 2**nbits training points.
+            nbits = max(1, min(nbits, int(np.log2(max(n_train, 2)))))
+        if self.index_type == "ivf_flat":
+            desc = f"IVF{nlist},{codec}"
+        else:
+            desc = f"IVF{nlist},PQ{settings.faiss_pq_m}x{nbits}"
+        return faiss.index_factory(self.dim, desc, faiss.METRIC_INNER_PRODUCT)
+
+    def _base_index(self):
+        """The index underneath an ID map, if any."""
+        import faiss
+
+        if isinstance(self.index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+            return faiss.downcast_index(self.index.index)
+        if isinstance(self.index, (faiss.IndexBinaryIDMap, faiss.IndexBinaryIDMap2)):
+            return faiss.downcast_IndexBinary(self.index.index)
+        return self.index
+
+    def _apply_search_params(self):
+        """Query-time knobs: nprobe for IVF, efSearch for HNSW."""
+        import faiss
+
+        settings = get_settings()
+        try:
+            faiss.extract_index_ivf(self.index).nprobe = settings.faiss_nprobe
+        except (RuntimeError, TypeError):
+            # TypeError: binary indexes are not IVF-extractable.
+            pass
+        base = self._base_index()
+        if hasattr(base, "hnsw"):
+            base.hnsw.efSearch = settings.faiss_ef_search
+
+    @property
+    def meta_dir(self) -> str:
+        return self.path + ".meta"
+
+    @property
+    def legacy_meta_path(self) -> str:
+        # Pre-columnar format: pickled object array of DocumentChunk.
+        return self.path + ".meta.npy"
+
+    @property
+    def manifest_path(self) -> str:
+        return self.path + ".manifest.json"
+
+    @property
+    def signatures_path(self) -> str:
+        """Near-duplicate signatures of the generation (see app.rag.dedup)."""
+        return self.path + ".minhash"
+
+    @property
+    def vectors_path(self) -> str:
+        return self.path + ".vectors.f32"
+
+    def _is_binary(self) -> bool:
+        import faiss
+
+        return isinstance(self.index, faiss.IndexBinary)
+
+    def _read_index(self, flags: int = 0):
+        import faiss
+
+        try:
+            return faiss.read_index(self.path, flags)
+        except RuntimeError:
+            return faiss.read_index_binary(self.path, flags)
 
     def _load(self):
         import faiss
 
-        self.index = faiss.read_index(self.path)
-        meta_path = self.path + ".meta.npy"
-        if os.path.exists(meta_path):
-            self.meta = list(np.load(meta_path, allow_pickle=True))
+        if get_settings().faiss_mmap:
+            flags = faiss.IO_FLAG_MMAP | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+            try:
+                self.index = self._read_index(flags)
+                self._mmapped = True
+            except RuntimeError:
+                self.index = self._read_index()
+            if not hasattr(faiss, "IO_FLAG_MMAP_IFC") and not self._is_ivf():
+                # Older faiss only maps IVF inverted lists; flat/HNSW codes are copied.
+                logger.warning(
+                    "faiss %s cannot memory-map %s codes; each process holds its own copy. "
+                    "Upgrade faiss, or shrink the per-process copy with CW_FAISS_QUANTIZATION.",
+                    faiss.__version__,
+                    self.index_type,
+                )
+        else:
+            self.index = self._read_index()
+        if ChunkMetadata.exists(self.meta_dir):
+            self.meta = ChunkMetadata(self.meta_dir)
+        elif os.path.exists(self.legacy_meta_path):
+            # Converted to the columnar format on the next save().
+            self.meta = ChunkMetadata()
+            self.meta.extend(np.load(self.legacy_meta_path, allow_pickle=True))
+        self._load_vectors()
+        self._bump()
+
+    def _load_vectors(self):
+        """Adopt the quantization the store on disk was written with."""
+        if self._is_binary():
+            self.quantization = "binary"
+        elif os.path.exists(self.vectors_path):
+            self.quantization = "sq8"
+        else:
+            self.quantization = "none"
+            self.vectors = None
+            return
+        self.vectors = VectorFile(self.vectors_path, self.dim, rows=len(self.meta))
+        if len(self.vectors) < len(self.meta):
+            raise RuntimeError(
+                f"{self.vectors_path} has {len(self.vectors)} rows for {len(self.meta)} chunks; "
+                "rebuild it with `python -m app.rag.migrate --quantization ...`."
+            )
+
+    def _ensure_writable(self):
+        """
+        Mapped indexes are read-only views; load a private copy before
+        mutating. Position-addressed legacy indexes are wrapped in an ID map
+        (IDs = old positions) so they accept explicit IDs and removals.
+        """
+        import faiss
+
+        self._check_read_only()
+        if self._mmapped:
+            self.index = self._read_index()
+            self._mmapped = False
+            self._apply_search_params()
+        if self._accepts_ids():
+            return
+        ids, vectors = self._ids_and_vectors()
+        self.index = self._new_index()
+        self.index.add_with_ids(vectors, ids)
+        self._apply_search_params()
+
+    def _check_read_only(self):
+        if self.read_only:
+            raise RuntimeError(
+                "This vector store is read-only; ingestion publishes a new generation instead."
+            )
+
+    def _accepts_ids(self) -> bool:
+        import faiss
+
+        if isinstance(
+            self.index,
+            (faiss.IndexIDMap, faiss.IndexIDMap2, faiss.IndexBinaryIDMap, faiss.IndexBinaryIDMap2),
+        ):
+            return True
+        return self._is_ivf()
 
-    def save(self):
+    def _is_ivf(self) -> bool:
         import faiss
 
-        os.makedirs(os.path.dirname(self.path), exist_ok=True)
-        faiss.write_index(self.index, self.path)
-        np.save(self.path + ".meta.npy", np.array(self.meta, dtype=object))
+        try:
+            faiss.extract_index_ivf(self.index)
+            return True
+        except (RuntimeError, TypeError):
+            return False
+
+    def save(
+        self,
+        manifest: IngestManifest | None = None,
+        signatures: NearDuplicateIndex | None = None,
+    ):
+        """
+        Write everything (plus the ingest `manifest` whose IDs it describes;
+        by default the current one, carried over unchanged, and ingest's
+        near-duplicate `signatures`, if given) into a new generation
+        directory, then publish it. Older generations are left
+        intact for processes still reading them, up to `faiss_keep_generations`.
+        """
+        self._check_read_only()
+        if manifest is None:
+            # A generation is self-contained: without its manifest the next ingest re-adds every PDF.
+            manifest = IngestManifest(self.manifest_path)
+        name, path = generations.create(self.root)
+        self.write(path, manifest, signatures)
+        generations.publish(self.root, name)
+        self.disk_generation = name
+        generations.prune(self.root, get_settings().faiss_keep_generations)
+
+    def write(
+        self,
+        path: str,
+        manifest: IngestManifest | None = None,
+        signatures: NearDuplicateIndex | None = None,
+    ):
+        """
+        Write the complete store with its index file at `path`, which becomes
+        `self.path`; nothing is published (a ShardedStore writes its shards
+        into its own generation this way).
+        """
+        import faiss
+
+        self._check_read_only()
+        self.train_pending()
+        self.path = path
+        if self.vectors is not None:
+            self.vectors.write(self.vectors_path)
+        if self._is_binary():
+            faiss.write_index_binary(self.index, self.path)
+        else:
+            faiss.write_index(self.index, self.path)
+        self.meta.write(self.meta_dir)
+        if manifest is not None:
+            manifest.save(self.manifest_path)
+        if signatures is not None:
+            signatures.save(self.signatures_path)
+        self._bump()
+
+    def _bump(self):
+        self.generation = next(_GENERATIONS)
+
+    @property
+    def ntotal(self) -> int:
+        """Vectors in the index (pending, untrained ones not included)."""
+        return self.index.ntotal
+
+    def chunk(self, i: int, text: bool = True) -> DocumentChunk:
+        return self.meta.chunk(i, text=text)
 
-    def add(self, embeddings: np.ndarray, chunks: List[DocumentChunk]):
-        self.index.add(embeddings.astype(np.float32))
+    def add(self, embeddings: np.ndarray, chunks: List[DocumentChunk]) -> np.ndarray:
+        """
+        Add vectors with their chunks; returns the IDs assigned to them, which
+        are the next metadata rows in order.
+        """
+        self._ensure_writable()
+        embeddings = embeddings.astype(np.float32)
+        ids = np.arange(len(self.meta), len(self.meta) + len(chunks), dtype=np.int64)
+        self._add_vectors(embeddings, ids)
+        if self.vectors is not None:
+            self.vectors.extend(embeddings)
         self.meta.extend(chunks)
+        self._bump()
+        return ids
+
+    def add_duplicates(self, chunks: List[DocumentChunk], canonical_ids) -> np.ndarray:
+        """
+        Add chunks that share the vector of existing rows `canonical_ids`
+        (no embedding, no index entry); returns their IDs.
+        """
+        self._check_read_only()
+        canonical_ids = np.asarray(canonical_ids, dtype=np.int64)
+        # An alias of an alias points at the row that really holds the vector.
+        dup = self.meta.duplicate_of(canonical_ids)
+        canonical_ids = np.where(dup >= 0, dup, canonical_ids)
+        ids = np.arange(len(self.meta), len(self.meta) + len(chunks), dtype=np.int64)
+        if self.vectors is not None:
+            # Keeps the file one row per ID; the row is needed if the alias is promoted.
+            self.vectors.extend(self.vectors.take(canonical_ids))
+        self.meta.extend(chunks, dup_of=canonical_ids)
+        self._bump()
+        return ids
+
+    def _add_vectors(self, embeddings: np.ndarray, ids: np.ndarray):
+        if self.index.is_trained and not self._pending:
+            self._index_add(embeddings, ids)
+        else:
+            self._pending.append((ids, embeddings))
+
+    def remove(self, ids) -> int:
+        """
+        Remove vectors by ID; returns how many were removed from the index.
+        Removed aliases are dropped from their canonical's sources; when a
+        canonical row goes, its first surviving alias takes over its vector.
+        The removed rows' metadata (and vectors-file rows) stay until `compact()`.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return 0
+        self._ensure_writable()
+        dup = self.meta.duplicate_of(ids)
+        if (dup >= 0).any():
+            self.meta.set_duplicate_of(ids[dup >= 0], REMOVED_ALIAS)
+        heirs: Dict[int, np.ndarray] = {}
+        if self.meta.has_aliases:
+            for row in ids[dup == OWN_VECTOR].tolist():
+                survivors = self.meta.duplicates(row)
+                if len(survivors):
+                    heirs[row] = survivors
+        inherited = self._stored_vectors(np.array(list(heirs), dtype=np.int64))
+        self._pending = [
+            (p_ids[keep], p_vecs[keep])
+            for p_ids, p_vecs in self._pending
+            for keep in [~np.isin(p_ids, ids)]
+        ]
+        try:
+            removed = self.index.remove_ids(ids)
+        except RuntimeError:
+            # HNSW graphs cannot delete nodes; rebuild from the survivors.
+            all_ids, vectors = self._ids_and_vectors()
+            keep = ~np.isin(all_ids, ids)
+            removed = int((~keep).sum())
+            self.index = self._new_index()
+            if not self.index.is_trained:
+                # HNSW over SQ8 codes: retrain the quantizer on what is left;
+                # if nothing is, later additions are buffered until save() trains.
+                if keep.any():
+                    self.index.train(vectors[keep])
+                    self._index_add(vectors[keep], all_ids[keep])
+            else:
+                self._index_add(vectors[keep], all_ids[keep])
+            self._apply_search_params()
+        if heirs:
+            promoted = []
+            for survivors in heirs.values():
+                self.meta.set_duplicate_of(survivors[:1], OWN_VECTOR)
+                self.meta.set_duplicate_of(survivors[1:], survivors[0])
+                promoted.append(survivors[0])
+            self._add_vectors(inherited, np.array(promoted, dtype=np.int64))
+        self._bump()
+        return int(removed)
+
+    def _stored_vectors(self, ids: np.ndarray) -> np.ndarray:
+        """Vectors of `ids`, all present in the index or the pending buffer."""
+        if not len(ids):
+            return np.zeros((0, self.dim), dtype=np.float32)
+        if self.vectors is not None:
+            return self.vectors.take(ids)
+        all_ids, vectors = self._ids_and_vectors()
+        if self._pending:
+            all_ids = np.concatenate([all_ids] + [p[0] for p in self._pending])
+            vectors = np.concatenate([vectors] + [p[1] for p in self._pending])
+        order = np.argsort(all_ids)
+        return vectors[order[np.searchsorted(all_ids, ids, sorter=order)]]
+
+    def vector_rows(self) -> np.ndarray:
+        """Sorted metadata rows that hold a vector (index and pending buffer)."""
+        parts = [self._index_ids()] + [p[0] for p in self._pending]
+        return np.unique(np.concatenate(parts))
+
+    @property
+    def bytes_per_vector(self) -> int:
+        """Approximate index RAM per vector: its code and ID, plus graph links for HNSW."""
+        import faiss
+
+        settings = get_settings()
+        base = self._base_index()
+        codes = faiss.downcast_index(base.storage) if hasattr(base, "storage") else base
+        size = int(getattr(codes, "code_size", self.dim * 4)) + 8
+        if hasattr(base, "hnsw"):
+            size += 2 * settings.faiss_hnsw_m * 4
+        return size
+
+    def train_pending(self):
+        """Train an untrained index on the buffered vectors, then add them."""
+        if not self._pending:
+            return
+        self._ensure_writable()
+        ids = np.concatenate([p[0] for p in self._pending])
+        vectors = np.concatenate([p[1] for p in self._pending])
+        self._pending = []
+        if not len(ids):
+            return
+        if not self.index.is_trained:
+            self.index = self._new_index(n_train=len(vectors))
+            self.index.train(vectors)
+            self._apply_search_params()
+        self._index_add(vectors, ids)
+        self._bump()
+
+    def _index_add(self, vectors: np.ndarray, ids: np.ndarray):
+        if self._is_binary():
+            vectors = np.packbits(vectors > 0, axis=1)
+        self.index.add_with_ids(vectors, ids)
 
-    def search(self, embedding: np.ndarray, k: int = 5):
-        scores, idx = self.index.search(embedding.astype(np.float32), k)
-        results = []
-        for i, score in zip(idx[0], scores[0]):
-            if i == -1 or i >= len(self.meta):
-                continue
-            results.append((self.meta[i], float(score)))
-        return results
+    def migrate(self, index_type: str | None = None, quantization: str | None = None):
+        """
+        Rebuild the index as `index_type` / `quantization` from the stored
+        vectors, keeping IDs. Stores with a vectors file rebuild from exact
+        vectors; lossy sources without one (IVF-PQ) carry their quantization
+        error into the new index.
+        """
+        self._ensure_writable()
+        ids, vectors = self._ids_and_vectors()
+        if self._pending:
+            ids = np.concatenate([ids] + [p[0] for p in self._pending])
+            vectors = np.concatenate([vectors] + [p[1] for p in self._pending])
+            self._pending = []
+        self.index_type = (index_type or self.index_type).lower()
+        self.quantization = (quantization or self.quantization).lower()
+        self._check_layout()
+        if self.quantization == "none":
+            self.vectors = None
+        elif self.vectors is None:
+            aliases, canonical = self.meta.aliases()
+            order = np.argsort(ids)
+            shared = vectors[order[np.searchsorted(ids, canonical, sorter=order)]]
+            self.vectors = VectorFile.from_rows(
+                self.vectors_path,
+                self.dim,
+                len(self.meta),
+                np.concatenate([ids, aliases]),
+                np.concatenate([vectors, shared]),
+            )
+        self.index = self._new_index()
+        self._pending = [(ids, vectors)]
+        if self.index.is_trained:
+            self.train_pending()
+        self._apply_search_params()
+        self._bump()
 
+    def compact(self) -> Dict[int, int]:
+        """
+        Drop the metadata and vectors-file rows of removed chunks, which
+        otherwise accumulate with every re-ingested PDF: live rows and their
+        aliases are renumbered from 0 in their old order and the index is
+        rebuilt (as in `migrate()`) under the new IDs. Returns {old ID: new
+        ID}, which the ingest manifest must be remapped with.
+        """
+        self._ensure_writable()
+        ids, vectors = self._ids_and_vectors()
+        if self._pending:
+            ids = np.concatenate([ids] + [p[0] for p in self._pending])
+            vectors = np.concatenate([vectors] + [p[1] for p in self._pending])
+            self._pending = []
+        live = np.union1d(ids, self.meta.aliases()[0])
+        new_ids = np.full(len(self.meta), -1, dtype=np.int64)
+        new_ids[live] = np.arange(len(live), dtype=np.int64)
+        dup = self.meta.duplicate_of(live)
+        dup[dup >= 0] = new_ids[dup[dup >= 0]]
+        meta = ChunkMetadata()
+        meta.extend((self.meta.chunk(r) for r in live.tolist()), dup_of=dup)
+        if self.vectors is not None:
+            self.vectors = VectorFile.from_rows(
+                self.vectors_path,
+                self.dim,
+                len(live),
+                np.arange(len(live), dtype=np.int64),
+                self.vectors.take(live),
+            )
+        self.meta = meta
+        self.index = self._new_index()
+        self._pending = [(new_ids[ids], vectors)]
+        if self.index.is_trained:
+            self.train_pending()
+        self._apply_search_params()
+        self._bump()
+        return dict(zip(live.tolist(), range(len(live))))
+
+    @property
+    def removed_rows(self) -> int:
+        """Metadata rows of removed chunks, reclaimable with `compact()`."""
+        return len(self.meta) - len(self.vector_rows()) - len(self.meta.aliases()[0])
+
+    def _index_ids(self) -> np.ndarray:
+        """IDs currently in the index (not the pending buffer)."""
+        import faiss
+
+        n = self.index.ntotal
+        if not n:
+            return np.zeros(0, dtype=np.int64)
+        if isinstance(
+            self.index,
+            (faiss.IndexIDMap, faiss.IndexIDMap2, faiss.IndexBinaryIDMap, faiss.IndexBinaryIDMap2),
+        ):
+            return faiss.vector_to_array(self.index.id_map).astype(np.int64)
+        try:
+            ivf = faiss.extract_index_ivf(self.index)
+        except RuntimeError:
+            # Legacy flat/HNSW index: labels were positions.
+            return np.arange(n, dtype=np.int64)
+        invlists = ivf.invlists
+        return np.concatenate(
+            [
+                faiss.rev_swig_ptr(invlists.get_ids(lst), invlists.list_size(lst)).copy()
+                for lst in range(ivf.nlist)
+                if invlists.list_size(lst)
+            ]
+        ).astype(np.int64)
+
+    def _ids_and_vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """All (ids, vectors) currently in the index (not the pending buffer)."""
+        import faiss
+
+        ids = self._index_ids()
+        if not len(ids):
+            return ids, np.zeros((0, self.dim), dtype=np.float32)
+        if self.vectors is not None:
+            return ids, self.vectors.take(ids)
+        if not self._is_ivf():
+            if self._accepts_ids():
+                return ids, self._base_index().reconstruct_n(0, len(ids))
+            return ids, self.index.reconstruct_n(0, len(ids))
+        ivf = faiss.extract_index_ivf(self.index)
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        vectors = self.index.reconstruct_batch(ids)
+        ivf.set_direct_map_type(faiss.DirectMap.NoMap)
+        return ids, vectors.astype(np.float32)
+
+    def search(self, embedding: np.ndarray, k: int = 5, chunk_filter: ChunkFilter | None = None):
+        return self.search_batch(embedding, k, chunk_filter)[0]
+
+    def search_batch(
+        self, embeddings: np.ndarray, k: int = 5, chunk_filter: ChunkFilter | None = None
+    ) -> List[List[Tuple[DocumentChunk, float]]]:
+        """
+        Top-k hits for each row of `embeddings`, in one index call. With a
+        `chunk_filter`, only the matching vectors are considered: up to
+        `faiss_filter_exact_max` of them are gathered and scored exactly,
+        larger selections are searched through the index with an IDSelector.
+        """
+        if not self.index.is_trained or self.index.ntotal == 0:
+            return [[] for _ in range(len(embeddings))]
+        embeddings = embeddings.astype(np.float32)
+        params = None
+        primary: Dict[int, int] = {}
+        selected = None
+        if chunk_filter is not None:
+            selected = self.meta.select(
+                chunk_filter.documents, chunk_filter.page_from, chunk_filter.page_to
+            )
+            ids, primary = self.meta.canonical(selected)
+            if not len(ids):
+                return [[] for _ in range(len(embeddings))]
+            if len(ids) <= get_settings().faiss_filter_exact_max and (
+                self.vectors is not None or not self._is_ivf()
+            ):
+                scores, idx = self._subset_search(embeddings, k, ids)
+                return self._hits(scores, idx, primary, selected)
+            params = self._search_params(ids)
+        if self.vectors is None:
+            scores, idx = self._index_search(embeddings, k, params)
+        else:
+            scores, idx = self._rescored_search(embeddings, k, params)
+        return self._hits(scores, idx, primary, selected)
+
+    def _hits(
+        self,
+        scores: np.ndarray,
+        idx: np.ndarray,
+        primary: Dict[int, int] | None = None,
+        selected: np.ndarray | None = None,
+    ) -> List[List[Tuple[DocumentChunk, float]]]:
+        with_sources = self.meta.has_aliases
+        batch = []
+        for row_idx, row_scores in zip(idx, scores):
+            results = []
+            for i, score in zip(row_idx, row_scores):
+                if i == -1 or i >= len(self.meta):
+                    continue
+                i = int(i)
+                if with_sources:
+                    results.append((self._with_sources(i, primary, selected), float(score)))
+                else:
+                    results.append((self.meta[i], float(score)))
+            batch.append(results)
+        return batch
+
+    def _with_sources(
+        self, i: int, primary: Dict[int, int] | None, selected: np.ndarray | None = None
+    ) -> DocumentChunk:
+        """
+        The chunk for vector `i` with its near-duplicates as extra sources;
+        a filtered search reports the alias that matched the filter first and
+        only cites sources in the `selected` (sorted) rows.
+        """
+        row = primary.get(i, i) if primary else i
+        sources = np.array([i, *self.meta.duplicates(i).tolist()], dtype=np.int64)
+        if selected is not None:
+            pos = np.minimum(np.searchsorted(selected, sources), max(len(selected) - 1, 0))
+            sources = sources[selected[pos] == sources] if len(selected) else sources[:0]
+        sources = [r for r in sources.tolist() if r != row]
+        chunk = self.meta[row]
+        if not sources or not self.max_sources:
+            return chunk
+        return replace(
+            chunk,
+            duplicates=[self.meta.chunk(r, text=False) for r in sources[: self.max_sources]],
+        )
+
+    def _rescored_search(
+        self, embeddings: np.ndarray, k: int, params=None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximate first pass over the codes, exact inner products on the top candidates."""
+        query = np.packbits(embeddings > 0, axis=1) if self._is_binary() else embeddings
+        _, candidates = self._index_search(query, k * self.rescore_factor, params)
+        scores = np.full((len(embeddings), k), -np.inf, dtype=np.float32)
+        idx = np.full((len(embeddings), k), -1, dtype=np.int64)
+        for row, (cands, q) in enumerate(zip(candidates, embeddings)):
+            cands = cands[(cands >= 0) & (cands < len(self.vectors))]
+            exact = self.vectors.take(cands) @ q
+            order = np.argsort(-exact, kind="stable")[:k]
+            scores[row, : len(order)] = exact[order]
+            idx[row, : len(order)] = cands[order]
+        return scores, idx
+
+    def _index_search(self, query: np.ndarray, k: int, params=None) -> Tuple[np.ndarray, np.ndarray]:
+        if params is None:
+            return self.index.search(query, k)
+        return self.index.search(query, k, params=params)
+
+    def _search_params(self, ids: np.ndarray):
+        """Per-call search parameters restricting the index to `ids`, keeping nprobe/efSearch."""
+        import faiss
+
+        settings = get_settings()
+        selector = faiss.IDSelectorBatch(ids)
+        if self._is_ivf():
+            return faiss.SearchParametersIVF(sel=selector, nprobe=settings.faiss_nprobe)
+        if hasattr(self._base_index(), "hnsw"):
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=settings.faiss_ef_search)
+        return faiss.SearchParameters(sel=selector)
+
+    def _live_mask(self) -> np.ndarray:
+        """Metadata rows whose vector is in the index (removed rows keep their metadata)."""
+        if self._live is None or self._live[0] != self.generation:
+            mask = np.zeros(len(self.meta), dtype=bool)
+            ids = self._index_ids()
+            mask[ids[ids < len(mask)]] = True
+            self._live = (self.generation, mask)
+        return self._live[1]
+
+    def _subset_search(
+        self, embeddings: np.ndarray, k: int, ids: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact inner products against just the vectors of `ids`."""
+        ids = ids[self._live_mask()[ids]]
+        if self.vectors is not None:
+            vectors = self.vectors.take(ids)
+        else:
+            vectors = self.index.reconstruct_batch(ids)
+        exact = embeddings @ vectors.T
+        scores = np.full((len(embeddings), k), -np.inf, dtype=np.float32)
+        idx = np.full((len(embeddings), k), -1, dtype=np.int64)
+        top = min(k, len(ids))
+        if top:
+            best = np.argpartition(-exact, top - 1, axis=1)[:, :top]
+            best_scores = np.take_along_axis(exact, best, axis=1)
+            order = np.argsort(-best_scores, axis=1, kind="stable")
+            scores[:, :top] = np.take_along_axis(best_scores, order, axis=1)
+            idx[:, :top] = ids[np.take_along_axis(best, order, axis=1)]
+        return scores, idx
+
+
+def get_store(embedder: EmbeddingModel, read_only: bool = False) -> FaissStore | ShardedStore:
+    """
+    The configured store. A sharded store on disk is always opened as one;
+    `vector_store_shards` > 1 only shapes a store that does not exist yet.
+    """
+    from app.rag import sharded
 
-def get_store(embedder: EmbeddingModel) -> FaissStore:
     settings = get_settings()
     store_type = settings.vector_store.lower()
     if store_type != "faiss":
         # Keep code path explicit; Chroma can be added later.
         raise NotImplementedError("Only FAISS is wired in this prototype.")
-    dim = embedder.model.get_sentence_embedding_dimension()
-    return FaissStore(dim=dim, path=settings.vector_store_path)
-
+    path = settings.vector_store_path
+    if sharded.read_layout(path) is not None:
+        return sharded.ShardedStore(dim=embedder.dim, path=path, read_only=read_only)
+    if settings.vector_store_shards > 1:
+        if not os.path.exists(generations.resolve(path)[0]):
+            return sharded.ShardedStore(dim=embedder.dim, path=path, read_only=read_only)
+        logger.warning(
+            "%s holds a single index; CW_VECTOR_STORE_SHARDS=%d takes effect after "
+            "`python -m app.rag.migrate --shards %d`.",
+            path,
+            settings.vector_store_shards,
+            settings.vector_store_shards,
+        )
+    return FaissStore(dim=embedder.dim, path=path, read_only=read_only)
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import os
+from typing import List
+
+import numpy as np
+
+
+class VectorFile:
+    """
+    Full-precision float32 vectors on disk, one row per vector ID (= metadata
+    row), memory-mapped for reads. Quantized indexes keep only compact codes
+    in RAM and rescore their candidates against these rows.
+
+    The file is append-only: `extend()` buffers new rows in memory and
+    `write()` appends them, so processes that have the old file mapped keep a
+    valid view; `write(path)` moves to a new file (a hard link where
+    possible). Removed IDs keep their rows; they are just never looked up.
+    """
+
+    def __init__(self, path: str, dim: int, rows: int | None = None):
+        self.path = path
+        self.dim = dim
+        self._open(rows)
+
+    def _open(self, rows: int | None):
+        self._base = np.zeros((0, self.dim), dtype=np.float32)
+        self._tail: List[np.ndarray] = []
+        self._tail_cat: np.ndarray | None = None
+        self._rewrite = False
+        if rows != 0 and os.path.exists(self.path) and os.path.getsize(self.path):
+            base = np.memmap(self.path, dtype=np.float32, mode="r")
+            n = base.size // self.dim
+            # Rows past `rows` were appended by a save that never finished
+            # writing its metadata; they are overwritten by the next write().
+            if rows is not None:
+                n = min(n, rows)
+            self._base = base[: n * self.dim].reshape(n, self.dim)
+
+    @classmethod
+    def from_rows(cls, path: str, dim: int, n_rows: int, ids: np.ndarray, vectors: np.ndarray) -> "VectorFile":
+        """
+        A file rebuilt from (ids, vectors); rows for IDs not given (removed
+        vectors) are zero. Replaces any existing file on `write()`.
+        """
+        dense = np.zeros((n_rows, dim), dtype=np.float32)
+        dense[ids] = vectors
+        out = cls(path, dim, rows=0)
+        out._tail = [dense]
+        out._rewrite = True
+        return out
+
+    def __len__(self) -> int:
+        return len(self._base) + sum(len(t) for t in self._tail)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self) * self.dim * 4
+
+    def extend(self, vectors: np.ndarray):
+        self._tail.append(np.ascontiguousarray(vectors, dtype=np.float32))
+        self._tail_cat = None
+
+    def take(self, ids: np.ndarray) -> np.ndarray:
+        """Rows for `ids` (all < len(self)), in the given order."""
+        ids = np.asarray(ids, dtype=np.int64)
+        n_base = len(self._base)
+        if not self._tail:
+            return np.asarray(self._base[ids])
+        if self._tail_cat is None:
+            self._tail_cat = np.concatenate(self._tail)
+        out = np.empty((len(ids), self.dim), dtype=np.float32)
+        in_base = ids < n_base
+        out[in_base] = self._base[ids[in_base]]
+        out[~in_base] = self._tail_cat[ids[~in_base] - n_base]
+        return out
+
+    def write(self, path: str | None = None):
+        """
+        Persist buffered rows and re-map the file. A new `path` becomes the
+        file from then on; the old file is never truncated below its rows.
+        """
+        if path is not None and path != self.path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            linked = False
+            if not self._rewrite and len(self._base):
+                # Append-only rows let the new file share the old one's blocks,
+                # unless rows past ours belong to another (newer) generation.
+                if os.path.getsize(self.path) == self._base.nbytes:
+                    try:
+                        os.link(self.path, path)
+                        linked = True
+                    except OSError:
+                        pass
+                if not linked:
+                    self._tail = [self._base, *self._tail]
+                    self._tail_cat = None
+                    self._base = np.zeros((0, self.dim), dtype=np.float32)
+                    self._rewrite = True
+            self.path = path
+        elif not self._tail and not self._rewrite:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if self._rewrite:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                for block in self._tail:
+                    f.write(memoryview(block))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        else:
+            offset = len(self._base) * self.dim * 4
+            with open(self.path, "r+b" if os.path.exists(self.path) else "wb") as f:
+                f.truncate(offset)
+                f.seek(offset)
+                for block in self._tail:
+                    f.write(block.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        self._open(len(self))
@@ -1,10 +1,15 @@
 from __future__ import annotations
 
+import logging
+import re
+import unicodedata
 from dataclasses import dataclass
-from typing import List
+from typing import Dict, Iterable, List, Optional
 
 from app.config import get_settings
 
+logger = logging.getLogger(__name__)
+
 
 @dataclass
 class CrisisSignal:
@@ -12,15 +17,135 @@ class CrisisSignal:
     matched_terms: List[str]
 
 
+# Spaces and hyphens inside a term are interchangeable and optional in text,
+# so "self-harm" also matches "self harm" and "selfharm".
+_SEPARATORS = re.compile(r"[\s\-]+")
+_SEP_PATTERN = r"[\s\-]*"
+_SEP = " "
+_END = ""
+
+
+def _fold(text: str) -> str:
+    # NFKC first, so full-width and other compatibility forms ("ＳＵＩＣＩＤＥ") match too.
+    return unicodedata.normalize("NFKC", text).casefold()
+
+
+def _term_key(text: str) -> str:
+    return _SEPARATORS.sub("", _fold(text))
+
+
+def _trie_pattern(node: Dict[str, dict]) -> str:
+    """Render a character trie as a regex with shared prefixes factored out."""
+    alts = []
+    for ch in sorted(k for k in node if k != _END):
+        head = _SEP_PATTERN if ch == _SEP else re.escape(ch)
+        alts.append(head + _trie_pattern(node[ch]))
+    optional = _END in node
+    if not alts:
+        return ""
+    if len(alts) == 1 and not optional:
+        return alts[0]
+    group = "(?:" + "|".join(alts) + ")"
+    return group + "?" if optional else group
+
+
+class CrisisMatcher:
+    """
+    Compiled multi-term matcher. The whole lexicon becomes one trie-shaped
+    regex, so text is scanned once and each position only explores terms that
+    share the characters seen so far; adding terms (phrases, variants, other
+    languages) does not add another pass over the text.
+
+    Terms match case-insensitively (after NFKC normalization) at the start of
+    a word and as prefixes, so inflections still trigger ("stab" matches
+    "stabbed") while words that merely contain a term do not ("shoot" does
+    not match "photoshoot", nor "overdose" "drugoverdose").
+    """
+
+    def __init__(self, terms: Iterable[str]):
+        self.terms: Dict[str, str] = {}
+        trie: Dict[str, dict] = {}
+        for term in terms:
+            normalized = _SEPARATORS.sub(_SEP, _fold(term.strip())).strip()
+            if not normalized:
+                continue
+            self.terms.setdefault(_term_key(normalized), term.strip())
+            node = trie
+            for ch in normalized:
+                node = node.setdefault(ch, {})
+            node[_END] = {}
+        self.pattern: Optional[re.Pattern] = None
+        if trie:
+            # The leading class lets the regex engine skip most positions cheaply.
+            first = "".join(sorted(re.escape(ch) for ch in trie))
+            self.pattern = re.compile(rf"\b(?=[{first}]){_trie_pattern(trie)}")
+
+    def find(self, text: str) -> List[str]:
+        if self.pattern is None:
+            return []
+        hits: List[str] = []
+        seen = set()
+        for m in self.pattern.finditer(_fold(text)):
+            term = self.terms.get(_term_key(m.group(0)))
+            if term is not None and term not in seen:
+                seen.add(term)
+                hits.append(term)
+        return hits
+
+
+def load_lexicon(keywords: str, lexicon_path: Optional[str] = None) -> List[str]:
+    """
+    Comma-separated `keywords` plus an optional file with one term per line
+    (blank lines and `#` comments ignored).
+    """
+    terms = [w.strip() for w in keywords.split(",") if w.strip()]
+    if lexicon_path:
+        with open(lexicon_path, encoding="utf-8") as fh:
+            for line in fh:
+                line = line.split("#", 1)[0].strip()
+                if line:
+                    terms.append(line)
+    return terms
+
+
+_matcher: Optional[CrisisMatcher] = None
+
+
+def load_crisis_matcher(strict: bool = False) -> CrisisMatcher:
+    """
+    (Re)build the matcher for the configured lexicon. The API calls this at
+    startup with `strict`, so a missing `crisis_lexicon_path` fails the boot;
+    otherwise an unreadable file is logged and `crisis_keywords` alone used,
+    so screening never errors.
+    """
+    global _matcher
+    settings = get_settings()
+    try:
+        terms = load_lexicon(settings.crisis_keywords, settings.crisis_lexicon_path)
+    except OSError:
+        if strict:
+            raise
+        logger.exception(
+            "Crisis lexicon %s unreadable; using crisis_keywords only", settings.crisis_lexicon_path
+        )
+        terms = load_lexicon(settings.crisis_keywords)
+    _matcher = CrisisMatcher(terms)
+    return _matcher
+
+
+def get_crisis_matcher() -> CrisisMatcher:
+    """The loaded matcher (built on first use); the lexicon is not re-read per request."""
+    matcher = _matcher
+    # Concurrent first calls may both build it; either result is the same.
+    return matcher if matcher is not None else load_crisis_matcher()
+
+
 def detect_crisis(text: str) -> CrisisSignal:
     """
     Lightweight lexicon match for crisis-related language.
     Conservative: any match triggers escalation path.
     """
-    settings = get_settings()
-    lexicon = [w.strip().lower() for w in settings.crisis_keywords.split(",") if w.strip()]
-    lower = text.lower()
-    hits = [term for term in lexicon if term in lower]
+    hits = get_crisis_matcher().find(text)
     return CrisisSignal(triggered=bool(hits), matched_terms=hits)
 
 
@@ -31,4 +156,3 @@ CRISIS_TEMPLATE = (
     "or talk to a trusted supervisor/safety officer right now. "
     "You’re not alone, and getting human help quickly is important."
 )
-
@@ -13,11 +13,28 @@ class SourceRef(BaseModel):
     page: Optional[int] = None
 
 
+class SearchFilter(BaseModel):
+    documents: Optional[List[str]] = Field(
+        default=None, description="Only cite these documents (file names as ingested)"
+    )
+    page_from: Optional[int] = Field(default=None, ge=1, description="First page, inclusive")
+    page_to: Optional[int] = Field(default=None, ge=1, description="Last page, inclusive")
+
+
 class ChatRequest(BaseModel):
     messages: List[Message]
     mode: str = Field(
         default="auto", description="auto | wellbeing | technical"
     )
+    filters: Optional[SearchFilter] = Field(
+        default=None, description="Restrict retrieval to some manuals and/or pages"
+    )
+    session_id: Optional[str] = Field(
+        default=None,
+        max_length=128,
+        description="Stable per conversation: later turns only screen and embed new messages "
+        "(ignored by /v1/chat/batch)",
+    )
 
 
 class ChatResponse(BaseModel):
@@ -25,3 +42,18 @@ class ChatResponse(BaseModel):
     citations: List[SourceRef] = Field(default_factory=list)
     safety_notes: Optional[str] = None
 
+
+class ChatBatchRequest(BaseModel):
+    requests: List[ChatRequest]
+    concurrency: Optional[int] = Field(
+        default=None, ge=1, description="Parallel model calls (capped by the server setting)"
+    )
+
+
+class ChatBatchResult(BaseModel):
+    """One NDJSON line of a batch response; `index` points into `requests`."""
+
+    index: int
+    response: Optional[ChatResponse] = None
+    error: Optional[str] = None
+
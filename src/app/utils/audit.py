@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_log (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    endpoint TEXT NOT NULL,
+    mode TEXT,
+    path TEXT NOT NULL,
+    latency_ms REAL,
+    stages TEXT,
+    citations TEXT,
+    user_chars INTEGER,
+    user_text TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS chat_log_ts ON chat_log (ts);
+CREATE INDEX IF NOT EXISTS chat_log_path_ts ON chat_log (path, ts);
+"""
+
+_INSERT = (
+    "INSERT INTO chat_log (ts, endpoint, mode, path, latency_ms, stages, citations, "
+    "user_chars, user_text, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+_STOP = object()
+
+
+@dataclass
+class AuditRecord:
+    """One chat as the safety reviewer sees it; serialized on the writer thread."""
+
+    endpoint: str
+    mode: str
+    path: str
+    latency_s: float
+    user_chars: int
+    user_text: Optional[str] = None
+    citations: List[dict] = field(default_factory=list)
+    stages: Dict[str, float] = field(default_factory=dict)
+    error: Optional[str] = None
+    ts: float = field(default_factory=time.time)
+
+    def row(self) -> tuple:
+        return (
+            self.ts,
+            self.endpoint,
+            self.mode,
+            self.path,
+            round(self.latency_s * 1000, 2),
+            json.dumps({k: round(v * 1000, 2) for k, v in self.stages.items()}) if self.stages else None,
+            json.dumps(self.citations) if self.citations else None,
+            self.user_chars,
+            self.user_text,
+            self.error,
+        )
+
+
+class AuditLog:
+    """
+    Chat audit trail in SQLite, written off the request path.
+
+    `log()` only appends to a bounded in-memory queue; one writer thread owns
+    the connection (WAL journal) and inserts batches with a single prepared
+    statement per transaction, flushing at `batch_size` records or
+    `flush_interval_s` after the oldest unflushed one. When the queue is full
+    records are dropped and counted rather than slowing chats down.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = 256,
+        flush_interval_s: float = 1.0,
+        queue_size: int = 10000,
+    ):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval_s = flush_interval_s
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_error: Optional[str] = None
+        self._thread = threading.Thread(target=self._run, name="cw-audit-writer", daemon=True)
+        self._thread.start()
+
+    def log(self, record: AuditRecord):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            metrics.AUDIT_RECORDS.inc(outcome="dropped")
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL: durable up to the last checkpoint-safe commit, no fsync per batch.
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def _flush(self, conn: sqlite3.Connection, batch: List[AuditRecord]):
+        try:
+            conn.execute("BEGIN")
+            conn.executemany(_INSERT, [r.row() for r in batch])
+            conn.execute("COMMIT")
+        except sqlite3.Error as exc:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            self.failed += len(batch)
+            self.last_error = f"{exc.__class__.__name__}: {exc}"
+            metrics.AUDIT_RECORDS.inc(len(batch), outcome="failed")
+            logger.exception("Writing %d audit records failed", len(batch))
+        else:
+            self.written += len(batch)
+            self.batches += 1
+            metrics.AUDIT_RECORDS.inc(len(batch), outcome="written")
+        batch.clear()
+
+    def _run(self):
+        try:
+            conn = self._connect()
+        except sqlite3.Error as exc:
+            self.last_error = f"{exc.__class__.__name__}: {exc}"
+            logger.exception("Cannot open audit log %s; chats will not be logged", self.path)
+            return
+        batch: List[AuditRecord] = []
+        deadline = 0.0
+        try:
+            while True:
+                timeout = max(0.0, deadline - time.monotonic()) if batch else None
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    self._flush(conn, batch)
+                    continue
+                if item is _STOP:
+                    break
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval_s
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    self._flush(conn, batch)
+            if batch:
+                self._flush(conn, batch)
+        finally:
+            conn.close()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "batches": self.batches,
+            "last_error": self.last_error,
+        }
+
+    def close(self, timeout_s: float = 5.0):
+        """Flush what is queued and stop the writer."""
+        while self._thread.is_alive():
+            try:
+                self._queue.put(_STOP, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        self._thread.join(timeout=timeout_s)
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from app.config import get_settings
+from app.utils.metrics import CPU_EXECUTOR_PENDING
+
+T = TypeVar("T")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_cpu_executor() -> ThreadPoolExecutor:
+    """
+    Bounded pool for CPU-bound stages (embedding, FAISS search).
+    Sized independently of the event loop so hundreds of chats can wait on
+    network I/O while only a few threads compete for the cores.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                settings = get_settings()
+                _executor = ThreadPoolExecutor(
+                    max_workers=max(1, settings.cpu_executor_workers),
+                    thread_name_prefix="cw-cpu",
+                )
+    return _executor
+
+
+def submit_cpu(func: Callable[..., T], *args: Any, **kwargs: Any) -> "asyncio.Future[T]":
+    """
+    Schedule `func` on the CPU executor immediately and return an awaitable.
+    Unlike a coroutine, the work starts before the caller awaits, so it can
+    overlap with whatever the caller does next. Context variables are copied
+    into the worker thread.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, func, *args, **kwargs)
+    fut = loop.run_in_executor(get_cpu_executor(), call)
+    CPU_EXECUTOR_PENDING.inc()
+    fut.add_done_callback(lambda _: CPU_EXECUTOR_PENDING.dec())
+    return fut
+
+
+async def run_cpu(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    return await submit_cpu(func, *args, **kwargs)
+
+
+def shutdown_cpu_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
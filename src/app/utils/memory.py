@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+from typing import Dict, Optional
+
+
+def process_memory() -> Optional[Dict[str, float]]:
+    """
+    This process's memory in MB from /proc/self/smaps_rollup (Linux only).
+    `shared_mb` is mostly mapped files (index, metadata, vectors) that other
+    workers map too; `pss_mb` summed over all workers is their real total.
+    """
+    try:
+        with open("/proc/self/smaps_rollup", encoding="ascii") as f:
+            lines = f.read().splitlines()[1:]
+    except OSError:
+        return None
+    kb: Dict[str, int] = {}
+    for line in lines:
+        name, _, rest = line.partition(":")
+        parts = rest.split()
+        if parts and parts[0].isdigit():
+            kb[name] = int(parts[0])
+
+    def mb(*names: str) -> float:
+        return round(sum(kb.get(n, 0) for n in names) / 1024, 1)
+
+    return {
+        "rss_mb": mb("Rss"),
+        "pss_mb": mb("Pss"),
+        "shared_mb": mb("Shared_Clean", "Shared_Dirty"),
+        "private_mb": mb("Private_Clean", "Private_Dirty"),
+        "file_backed_pss_mb": mb("Pss_File"),
+    }
@@ -0,0 +1,302 @@
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds; spans sub-millisecond lexicon scans up to slow model generations.
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+        REGISTRY.register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...], extra: str = "") -> str:
+        parts = [f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, key)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def _samples(self) -> Iterator[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{self._labels(key)} {_fmt(value)}"
+
+    def render(self) -> str:
+        head = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.kind}\n"
+        return head + "".join(line + "\n" for line in self._samples())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str):
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    @contextmanager
+    def track(self, **labels: str):
+        """Count the enclosed block as in flight."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        # Buckets are inclusive upper bounds (le); the last slot is +Inf.
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][slot] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self) -> Iterator[str]:
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = f'le="{_fmt(bound)}"'
+                yield f"{self.name}_bucket{self._labels(key, le)} {cumulative}"
+            yield f"{self.name}_sum{self._labels(key)} {_fmt(total)}"
+            yield f"{self.name}_count{self._labels(key)} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric):
+        with self._lock:
+            if any(m.name == metric.name for m in self._metrics):
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics.append(metric)
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics)
+        return "".join(m.render() for m in metrics)
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = Histogram(
+    "cw_stage_seconds",
+    "Time spent in each chat pipeline stage.",
+    ["stage"],
+)
+CHAT_RESPONSES = Counter(
+    "cw_chat_responses_total",
+    "Chat responses by endpoint and path (safety_notes value, technical or error).",
+    ["endpoint", "path"],
+)
+CHAT_INFLIGHT = Gauge(
+    "cw_chat_inflight",
+    "Chats currently being handled.",
+    ["endpoint"],
+)
+MODEL_INFLIGHT = Gauge(
+    "cw_model_requests_inflight",
+    "Requests currently waiting on the model server.",
+)
+MODEL_BACKEND_REQUESTS = Counter(
+    "cw_model_backend_requests_total",
+    "Model server attempts by replica and outcome (ok or error).",
+    ["backend", "outcome"],
+)
+MODEL_HEDGES = Counter(
+    "cw_model_hedges_total",
+    "Hedged model requests (launched) and how many the hedge answered first (won).",
+    ["outcome"],
+)
+CPU_EXECUTOR_PENDING = Gauge(
+    "cw_cpu_executor_pending",
+    "Tasks queued or running on the CPU executor.",
+)
+GPU_ACTIVE = Gauge(
+    "cw_gpu_active",
+    "1 while a GPU pod started by this process has an idle auto-stop timer pending.",
+)
+GPU_QUEUE_DEPTH = Gauge(
+    "cw_gpu_queue_depth",
+    "Chats waiting for the GPU pod to boot.",
+)
+GPU_AUTO_STOPS = Counter(
+    "cw_gpu_auto_stops_total",
+    "GPU pods stopped by the idle timer.",
+)
+VECTOR_STORE_RELOADS = Counter(
+    "cw_vector_store_reloads_total",
+    "Hot reloads of a newly published vector store generation by outcome (ok or error).",
+    ["outcome"],
+)
+AUDIT_RECORDS = Counter(
+    "cw_audit_records_total",
+    "Chat audit records by outcome (written, dropped on a full queue, failed).",
+    ["outcome"],
+)
+HTTP_SECONDS = Histogram(
+    "cw_http_request_seconds",
+    "HTTP request duration (streaming responses: until the last byte).",
+    ["method", "route", "status"],
+)
+HTTP_INFLIGHT = Gauge(
+    "cw_http_requests_inflight",
+    "HTTP requests currently being served.",
+)
+
+# Per-request (stage, seconds) list for the Server-Timing header. It is a
+# mutable list so stages timed in executor threads (which run in a copy of the
+# request context) append to the same request's list.
+_request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar(
+    "cw_request_timings", default=None
+)
+
+
+def observe_stage(name: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=name)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+@contextmanager
+def stage(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - started)
+
+
+def _merge(timings: List[Tuple[str, float]]) -> Dict[str, float]:
+    merged: Dict[str, float] = {}
+    for name, seconds in timings:
+        merged[name] = merged.get(name, 0.0) + seconds
+    return merged
+
+
+def request_stages() -> Dict[str, float]:
+    """Seconds per stage recorded so far in the current request."""
+    return _merge(_request_timings.get() or [])
+
+
+def server_timing(timings: List[Tuple[str, float]], total: float) -> str:
+    """Render stages as a Server-Timing header value (durations in ms)."""
+    merged = _merge(timings)
+    merged["total"] = total
+    return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in merged.items())
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: request duration/in-flight metrics, a per-request stage
+    list, and (optionally) a Server-Timing header built from it. The header is
+    sent with the response start, so for streamed responses it covers only the
+    stages finished before the first byte.
+    """
+
+    def __init__(self, app, server_timing: bool = False):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: List[Tuple[str, float]] = []
+        token = _request_timings.set(timings)
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if self.server_timing:
+                    value = server_timing(timings, time.perf_counter() - started)
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", value.encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        HTTP_INFLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            HTTP_INFLIGHT.dec()
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_SECONDS.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=route,
+                status=str(status["code"]),
+            )
+            _request_timings.reset(token)
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+STARTUP_MODES = ("eager", "background", "lazy")
+
+
+class ComponentUnavailableError(RuntimeError):
+    """A heavy component failed to load, so requests that need it cannot run."""
+
+    def __init__(self, detail: str, retry_after_s: int = 10):
+        super().__init__(detail)
+        self.retry_after_s = retry_after_s
+
+
+class Component(Generic[T]):
+    """
+    A heavy dependency (model, index, tokenizer) built on first `get()`.
+    Concurrent callers wait for the one build; a failed build is retried by
+    the next caller. `status()` feeds the readiness probe.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], T]):
+        self.name = name
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._value: Optional[T] = None
+        # pending | loading | ready | failed
+        self.state = "pending"
+        self.error: Optional[str] = None
+        self.load_s: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def get(self) -> T:
+        if self.state == "ready":
+            return self._value
+        with self._lock:
+            if self.state != "ready":
+                self.state = "loading"
+                started = time.perf_counter()
+                try:
+                    self._value = self._factory()
+                except Exception as exc:
+                    self.state = "failed"
+                    self.error = f"{exc.__class__.__name__}: {exc}"
+                    logger.exception("Loading %s failed", self.name)
+                    raise ComponentUnavailableError(f"{self.name} is unavailable ({self.error}).") from exc
+                self.load_s = time.perf_counter() - started
+                self.error = None
+                self.state = "ready"
+        return self._value
+
+    def swap(self, value: T):
+        """Replace the loaded value (hot reload); callers already holding the old one keep it."""
+        with self._lock:
+            self._value = value
+            self.error = None
+            self.state = "ready"
+
+    def status(self) -> dict:
+        return {
+            "state": self.state,
+            "load_s": round(self.load_s, 3) if self.load_s is not None else None,
+            "error": self.error,
+        }
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The app is run from `src` (no installed package).
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
@@ -0,0 +1,71 @@
+import json
+import sqlite3
+import threading
+import time
+
+from app.utils.audit import AuditLog, AuditRecord
+
+
+def _record(i: int = 0, **kwargs) -> AuditRecord:
+    return AuditRecord(endpoint="chat", mode="technical", path="rag", latency_s=0.5, user_chars=i, **kwargs)
+
+
+class _PausedAuditLog(AuditLog):
+    """Writer thread waits for `resume` before it starts consuming."""
+
+    def __init__(self, *args, **kwargs):
+        self.resume = threading.Event()
+        super().__init__(*args, **kwargs)
+
+    def _run(self):
+        self.resume.wait(5)
+        super()._run()
+
+
+def _rows(path: str):
+    with sqlite3.connect(path) as conn:
+        query = "SELECT user_chars, latency_ms, stages, citations, user_text FROM chat_log"
+        return conn.execute(query).fetchall()
+
+
+def test_records_are_written_in_batches(tmp_path):
+    path = str(tmp_path / "audit.sqlite3")
+    audit = _PausedAuditLog(path, batch_size=3, flush_interval_s=10)
+    for i in range(7):
+        audit.log(_record(i, stages={"search": 0.002}, citations=[{"document": "a.pdf", "page": 3}]))
+    audit.resume.set()
+    audit.close()
+
+    stats = audit.stats()
+    assert (stats["written"], stats["batches"], stats["dropped"]) == (7, 3, 0)
+    rows = _rows(path)
+    assert [r[0] for r in rows] == list(range(7))
+    assert rows[0][1] == 500.0
+    assert json.loads(rows[0][2]) == {"search": 2.0}
+    assert json.loads(rows[0][3]) == [{"document": "a.pdf", "page": 3}]
+    assert rows[0][4] is None
+
+
+def test_partial_batch_is_flushed_after_the_interval(tmp_path):
+    audit = AuditLog(str(tmp_path / "audit.sqlite3"), batch_size=100, flush_interval_s=0.05)
+    try:
+        audit.log(_record())
+        deadline = time.monotonic() + 5
+        while audit.written == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert audit.stats()["written"] == 1
+    finally:
+        audit.close()
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    path = str(tmp_path / "audit.sqlite3")
+    audit = _PausedAuditLog(path, batch_size=10, flush_interval_s=10, queue_size=2)
+    started = time.monotonic()
+    for i in range(5):
+        audit.log(_record(i))
+    assert time.monotonic() - started < 1
+    assert audit.stats()["dropped"] == 3
+    audit.resume.set()
+    audit.close()
+    assert [r[0] for r in _rows(path)] == [0, 1]
@@ -0,0 +1,105 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.chat.backends import BackendPool, DeadlineExceededError
+from app.chat.model_client import ModelClient
+from app.chat.service import ChatService
+
+SSE = (
+    b'data: {"choices": [{"delta": {"content": "Hel"}}]}\n\n'
+    b'data: {"choices": [{"delta": {"content": "lo"}}]}\n\n'
+    b"data: [DONE]\n\n"
+)
+
+
+def _pool(handler) -> BackendPool:
+    pool = BackendPool(["http://replica/v1/chat/completions"], max_retries=0, eject_after=3)
+    pool.backends[0].async_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return pool
+
+
+def test_stream_to_done_records_success():
+    pool = _pool(lambda request: httpx.Response(200, content=SSE))
+    backend = pool.backends[0]
+    backend.failures = 2
+    client = ModelClient()
+    client.pool = pool
+
+    async def consume():
+        return [delta async for delta in client.stream("hello")]
+
+    assert asyncio.run(consume()) == ["Hel", "lo"]
+    assert backend.failures == 0
+    assert backend.outstanding == 0
+    assert backend.ewma_s is not None
+
+
+def test_stream_error_before_first_line_counts_failure():
+    pool = _pool(lambda request: httpx.Response(503))
+    backend = pool.backends[0]
+
+    async def consume():
+        return [line async for line in pool.stream_lines({})]
+
+    try:
+        asyncio.run(consume())
+    except httpx.HTTPStatusError:
+        pass
+    assert backend.failures == 1
+    assert backend.outstanding == 0
+
+
+class _GPU:
+    def __init__(self):
+        self.unreachable = 0
+
+    def touch(self):
+        pass
+
+    def mark_unreachable(self):
+        self.unreachable += 1
+
+
+def _call_with_gpu(handler, deadline_s: float = 0.05):
+    service = ChatService.__new__(ChatService)
+    service.gpu = _GPU()
+    pool = _pool(handler)
+
+    async def call():
+        async with service._model_session():
+            await pool.request({}, deadline_s=deadline_s)
+
+    return service.gpu, call
+
+
+def test_deadline_is_not_a_transport_error():
+    async def slow(request):
+        await asyncio.sleep(1)
+        return httpx.Response(200, json={})
+
+    gpu, call = _call_with_gpu(slow)
+    with pytest.raises(DeadlineExceededError):
+        asyncio.run(call())
+    assert gpu.unreachable == 0
+
+
+def test_read_timeout_at_deadline_is_not_a_transport_error():
+    def read_timeout(request):
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    gpu, call = _call_with_gpu(read_timeout)
+    with pytest.raises(DeadlineExceededError):
+        asyncio.run(call())
+    assert gpu.unreachable == 0
+
+
+def test_connect_error_marks_gpu_unreachable():
+    def refused(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    gpu, call = _call_with_gpu(refused)
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(call())
+    assert gpu.unreachable == 1
@@ -0,0 +1,91 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.rag.batcher import EmbeddingBatcher
+
+
+class _Encoder:
+    """Records batch sizes; returns one row per text (its length, twice)."""
+
+    def __init__(self, gate: threading.Event = None):
+        self.batches = []
+        self.gate = gate
+
+    def __call__(self, texts):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.batches.append(len(texts))
+        return np.array([[len(t), len(t)] for t in texts], dtype=np.float32)
+
+
+def test_futures_resolve_to_their_own_rows():
+    encoder = _Encoder()
+    batcher = EmbeddingBatcher(encoder, max_batch_size=8, max_wait_ms=50)
+    try:
+        futures = [batcher.submit("x" * n) for n in (1, 2, 3)]
+        assert [f.result(timeout=5).tolist() for f in futures] == [[1, 1], [2, 2], [3, 3]]
+        # Queued within the wait window: one encode call.
+        assert encoder.batches == [3]
+        assert batcher.stats()["requests"] == 3
+    finally:
+        batcher.close()
+
+
+def test_batch_flushes_at_max_size():
+    gate = threading.Event()
+    encoder = _Encoder(gate)
+    batcher = EmbeddingBatcher(encoder, max_batch_size=2, max_wait_ms=1000)
+    try:
+        futures = [batcher.submit("a") for _ in range(5)]
+        gate.set()
+        for f in futures:
+            f.result(timeout=5)
+        assert max(encoder.batches) <= 2
+        assert sum(encoder.batches) == 5
+    finally:
+        batcher.close()
+
+
+def test_lone_query_waits_at_most_max_wait():
+    batcher = EmbeddingBatcher(_Encoder(), max_batch_size=32, max_wait_ms=20)
+    try:
+        started = time.perf_counter()
+        batcher.submit("a").result(timeout=5)
+        assert time.perf_counter() - started < 1.0
+    finally:
+        batcher.close()
+
+
+def test_encode_error_reaches_every_caller():
+    def fail(texts):
+        raise RuntimeError("model gone")
+
+    batcher = EmbeddingBatcher(fail, max_batch_size=8, max_wait_ms=20)
+    try:
+        futures = [batcher.submit("a"), batcher.submit("b")]
+        for f in futures:
+            with pytest.raises(RuntimeError, match="model gone"):
+                f.result(timeout=5)
+    finally:
+        batcher.close()
+
+
+def test_cancelled_callers_are_not_encoded():
+    gate = threading.Event()
+    encoder = _Encoder(gate)
+    batcher = EmbeddingBatcher(encoder, max_batch_size=1, max_wait_ms=0)
+    try:
+        first = batcher.submit("a")  # holds the thread at the gate
+        time.sleep(0.05)
+        cancelled = batcher.submit("bb")
+        assert cancelled.cancel()
+        last = batcher.submit("ccc")
+        gate.set()
+        assert last.result(timeout=5).tolist() == [3, 3]
+        assert first.result(timeout=5).tolist() == [1, 1]
+        assert encoder.batches == [1, 1]
+    finally:
+        batcher.close()
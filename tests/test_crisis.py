@@ -0,0 +1,101 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from app.config import get_settings
+from app.safety import crisis
+from app.safety.crisis import CrisisMatcher, load_lexicon
+
+ES_LEXICON = Path(crisis.__file__).parent / "lexicons" / "es.txt"
+
+
+@pytest.fixture
+def default_matcher() -> CrisisMatcher:
+    return CrisisMatcher(load_lexicon(get_settings().crisis_keywords))
+
+
+def _substring_scan(text: str) -> bool:
+    # The original detector: any lexicon term as a substring of the lowered text.
+    terms = [w.strip().lower() for w in get_settings().crisis_keywords.split(",") if w.strip()]
+    return any(term in text.lower() for term in terms)
+
+
+PARITY_TEXTS = [
+    "I keep thinking about suicide",
+    "Some days I want to kill myself.",
+    "I could kill him for that",
+    "he said he would kill her",
+    "They threatened to shoot the foreman",
+    "he tried to stab me",
+    "I might jump off the scaffold",
+    "I want to hang myself",
+    "she took an overdose last night",
+    "my partner gets violent",
+    "I was assaulted on site",
+    "there is abuse at home",
+    "it was domestic violence",
+    "thoughts of self-harm",
+    "How do I inspect scaffold planks?",
+    "What torque for the base plate bolts?",
+    "The crane jib was inspected yesterday",
+    "",
+]
+
+
+@pytest.mark.parametrize("text", PARITY_TEXTS)
+def test_default_lexicon_matches_substring_scan(default_matcher, text):
+    assert bool(default_matcher.find(text)) == _substring_scan(text)
+
+
+def test_mid_word_matches_are_intentionally_dropped(default_matcher):
+    # The substring scan flagged these; terms now only match at word starts.
+    for text in ["photoshoot schedule", "drugoverdose"]:
+        assert _substring_scan(text)
+        assert default_matcher.find(text) == []
+
+
+@pytest.mark.parametrize(
+    "text",
+    ["self harm", "selfharm", "self - harm", "SELF-HARM", "kill   myself", "kill-myself", "domestic\nviolence"],
+)
+def test_separators_inside_terms_are_optional(default_matcher, text):
+    assert default_matcher.find(text)
+
+
+def test_phrases_and_prefixes(default_matcher):
+    assert default_matcher.find("I'll kill myself") == ["kill myself"]
+    assert default_matcher.find("he was stabbed") == ["stab"]
+    assert default_matcher.find("kill the engine, then myself check") == []
+    assert set(default_matcher.find("suicide and an overdose")) == {"suicide", "overdose"}
+
+
+def test_nfkc_normalization(default_matcher):
+    assert default_matcher.find("ＳＵＩＣＩＤＥ") == ["suicide"]
+    assert default_matcher.find("ｋｉｌｌ ｍｙｓｅｌｆ") == ["kill myself"]
+
+
+@pytest.mark.parametrize(
+    "text, term",
+    [
+        ("pienso en el suicidio", "suicid"),
+        ("quiero matarme", "matarme"),
+        ("quiero QUITARME LA VIDA", "quitarme la vida"),
+        ("voy a hacerme daño", "hacerme daño"),
+        ("tomé una sobredosis", "sobredosis"),
+        ("hay violencia doméstica en casa", "violencia doméstica"),
+    ],
+)
+def test_spanish_lexicon(text, term):
+    matcher = CrisisMatcher(load_lexicon("", str(ES_LEXICON)))
+    assert matcher.find(text) == [term]
+
+
+def test_missing_lexicon_file(monkeypatch, tmp_path):
+    settings = SimpleNamespace(crisis_keywords="suicide", crisis_lexicon_path=str(tmp_path / "missing.txt"))
+    monkeypatch.setattr(crisis, "get_settings", lambda: settings)
+    monkeypatch.setattr(crisis, "_matcher", None)
+    with pytest.raises(OSError):
+        crisis.load_crisis_matcher(strict=True)
+    # At request time screening falls back to the keywords instead of failing.
+    assert crisis.detect_crisis("thinking about suicide").triggered
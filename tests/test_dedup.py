@@ -0,0 +1,159 @@
+import numpy as np
+import pytest
+
+from app.rag.dedup import NearDuplicateIndex
+from app.rag.metadata import ChunkMetadata
+from app.rag.vector_store import ChunkFilter, DocumentChunk, FaissStore
+
+DIM = 8
+
+
+def _words(seed: int, n: int = 200):
+    rng = np.random.default_rng(seed)
+    return [f"w{i}" for i in rng.integers(0, 5000, n)]
+
+
+def test_near_duplicate_query():
+    index = NearDuplicateIndex(threshold=0.8)
+    base = _words(0)
+    index.insert(1, index.signature(" ".join(base)))
+    index.insert(2, index.signature(" ".join(_words(1))))
+
+    near = base[:100] + ["changed"] + base[101:]
+    assert index.query(index.signature(" ".join(near))) == 1
+    assert index.query(index.signature(" ".join(_words(2)))) is None
+    assert index.signature("   ") is None
+    assert index.query(None) is None
+
+
+def test_near_duplicate_below_threshold():
+    index = NearDuplicateIndex(threshold=0.8)
+    base = _words(0)
+    index.insert(1, index.signature(" ".join(base)))
+    # Half the text replaced: Jaccard ~0.3.
+    assert index.query(index.signature(" ".join(base[:100] + _words(3, 100)))) is None
+
+
+def test_rekey():
+    index = NearDuplicateIndex()
+    text = " ".join(_words(0))
+    index.insert(-1, index.signature(text))
+    index.rekey(-1, 7)
+    assert index.query(index.signature(text)) == 7
+
+
+def test_signature_is_stable():
+    # Saved signatures are compared with ones computed in later processes.
+    text = " ".join(_words(0))
+    assert NearDuplicateIndex().signature(text).tolist() == NearDuplicateIndex().signature(text).tolist()
+    assert NearDuplicateIndex(seed=2).signature(text).tolist() != NearDuplicateIndex().signature(text).tolist()
+
+
+def test_save_load_discard(tmp_path):
+    directory = str(tmp_path / "faiss.index.minhash")
+    index = NearDuplicateIndex()
+    texts = {key: " ".join(_words(key)) for key in (1, 2, 3)}
+    for key, text in texts.items():
+        index.insert(key, index.signature(text))
+    index.save(directory)
+
+    loaded = NearDuplicateIndex.load(directory)
+    assert sorted(loaded.keys().tolist()) == [1, 2, 3]
+    assert [loaded.query(loaded.signature(texts[k])) for k in (1, 2, 3)] == [1, 2, 3]
+
+    # Removals and new rows go through the overlay and survive the next save.
+    loaded.discard([2])
+    loaded.insert(4, loaded.signature(" ".join(_words(4))))
+    assert loaded.query(loaded.signature(texts[2])) is None
+    loaded.save(directory)
+    reloaded = NearDuplicateIndex.load(directory)
+    assert sorted(reloaded.keys().tolist()) == [1, 3, 4]
+    assert reloaded.query(reloaded.signature(" ".join(_words(4)))) == 4
+
+    assert NearDuplicateIndex.load(directory, num_perm=64) is None
+    assert NearDuplicateIndex.load(str(tmp_path / "missing")) is None
+
+
+def test_save_rejects_provisional_keys(tmp_path):
+    index = NearDuplicateIndex()
+    index.insert(-1, index.signature(" ".join(_words(0))))
+    with pytest.raises(ValueError):
+        index.save(str(tmp_path / "sigs"))
+
+
+def test_store_saves_signatures_with_generation(tmp_path):
+    store = FaissStore(DIM, str(tmp_path / "faiss.index"))
+    store.add(np.eye(DIM, dtype=np.float32)[:1], [_chunk("a.pdf")])
+    index = NearDuplicateIndex()
+    index.insert(0, index.signature(" ".join(_words(0))))
+    store.save(signatures=index)
+    assert NearDuplicateIndex.load(store.signatures_path).keys().tolist() == [0]
+
+
+def _chunk(document: str, page: int = 1) -> DocumentChunk:
+    return DocumentChunk(text=f"{document} {page}", document=document, page=page)
+
+
+def test_canonical_maps_aliases_to_vector_rows():
+    meta = ChunkMetadata()
+    meta.extend([_chunk("a.pdf", 1), _chunk("b.pdf", 1)])
+    meta.extend([_chunk("c.pdf", 1), _chunk("c.pdf", 2)], dup_of=np.array([0, 1]))
+    assert meta.duplicates(0).tolist() == [2]
+
+    rows, primary = meta.canonical(meta.select(["c.pdf"]))
+    assert rows.tolist() == [0, 1]
+    assert primary == {0: 2, 1: 3}
+
+    # A selected canonical row is reported as itself.
+    rows, primary = meta.canonical(meta.select(["a.pdf", "c.pdf"]))
+    assert rows.tolist() == [0, 1]
+    assert primary == {1: 3}
+
+
+@pytest.fixture(params=["none", "sq8"])
+def store(request, tmp_path):
+    store = FaissStore(DIM, str(tmp_path / "faiss.index"), index_type="flat", quantization=request.param)
+    vectors = np.eye(DIM, dtype=np.float32)[:2]
+    store.add(vectors, [_chunk("a.pdf", 1), _chunk("b.pdf", 1)])
+    # Row 3 names the alias row 2 as its canonical: it must collapse onto row 0.
+    store.add_duplicates([_chunk("c.pdf", 1)], [0])
+    store.add_duplicates([_chunk("d.pdf", 4)], [2])
+    store.train_pending()  # sq8 buffers vectors until its quantizer is trained
+    return store
+
+
+def _query(i: int) -> np.ndarray:
+    return np.eye(DIM, dtype=np.float32)[i : i + 1]
+
+
+def test_alias_of_alias_collapses(store):
+    assert store.meta.duplicate_of(np.array([2, 3])).tolist() == [0, 0]
+    chunk, score = store.search(_query(0), k=1)[0]
+    assert (chunk.document, score) == ("a.pdf", pytest.approx(1.0))
+    assert [d.document for d in chunk.duplicates] == ["c.pdf", "d.pdf"]
+
+
+def test_filtered_hit_reports_matching_alias_and_only_matching_sources(store):
+    chunk, _ = store.search(_query(0), k=1, chunk_filter=ChunkFilter(documents=("c.pdf",)))[0]
+    assert chunk.document == "c.pdf"
+    assert chunk.duplicates == []
+
+    hits = store.search(_query(0), k=2, chunk_filter=ChunkFilter(documents=("c.pdf", "d.pdf")))
+    assert [(c.document, [d.document for d in c.duplicates]) for c, _ in hits] == [
+        ("c.pdf", ["d.pdf"])
+    ]
+
+
+def test_removing_canonical_promotes_alias(store):
+    assert store.remove([0]) == 1
+    chunk, score = store.search(_query(0), k=1)[0]
+    assert (chunk.document, score) == ("c.pdf", pytest.approx(1.0))
+    assert [d.document for d in chunk.duplicates] == ["d.pdf"]
+
+    store.remove([2])
+    chunk, _ = store.search(_query(0), k=1)[0]
+    assert chunk.document == "d.pdf"
+    assert chunk.duplicates == []
+
+    store.remove([3])
+    assert [c.document for c, _ in store.search(_query(0), k=2)] == ["b.pdf"]
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from app.config import get_settings
+from app.rag.vector_store import ChunkFilter, DocumentChunk, FaissStore
+
+DIM = 16
+PAGES = 20
+ROWS = [(doc, page) for doc in ("a.pdf", "b.pdf", "c.pdf") for page in range(1, PAGES + 1)]
+
+
+def _vectors(n: int, seed: int = 0) -> np.ndarray:
+    v = np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+@pytest.fixture(params=["exact", "selector"])
+def store(request, tmp_path, monkeypatch):
+    # 0 sends every filtered search through the index with an IDSelector.
+    exact_max = 10000 if request.param == "exact" else 0
+    monkeypatch.setattr(get_settings(), "faiss_filter_exact_max", exact_max)
+    store = FaissStore(DIM, str(tmp_path / "faiss.index"), index_type="flat")
+    chunks = [DocumentChunk(text=f"{doc} p{page}", document=doc, page=page) for doc, page in ROWS]
+    store.add(_vectors(len(chunks)), chunks)
+    store.save()
+    return store
+
+
+def _expected(chunk_filter: ChunkFilter, query: np.ndarray, k: int):
+    """Brute force over the rows the filter admits."""
+    rows = [
+        i
+        for i, (doc, page) in enumerate(ROWS)
+        if (chunk_filter.documents is None or doc in chunk_filter.documents)
+        and (chunk_filter.page_from is None or page >= chunk_filter.page_from)
+        and (chunk_filter.page_to is None or page <= chunk_filter.page_to)
+    ]
+    scores = _vectors(len(ROWS))[rows] @ query[0]
+    return [rows[i] for i in np.argsort(-scores)[:k]]
+
+
+@pytest.mark.parametrize(
+    "chunk_filter",
+    [
+        ChunkFilter(documents=("b.pdf",)),
+        ChunkFilter(page_from=3, page_to=5),
+        ChunkFilter(documents=("a.pdf", "c.pdf"), page_from=18),
+        ChunkFilter(page_to=1),
+    ],
+)
+def test_filtered_search_matches_brute_force(store, chunk_filter):
+    query = _vectors(1, seed=1)
+    hits = store.search(query, k=5, chunk_filter=chunk_filter)
+    expected = [store.meta[i] for i in _expected(chunk_filter, query, 5)]
+    assert [(c.document, c.page) for c, _ in hits] == [(c.document, c.page) for c in expected]
+
+
+def test_filter_matching_nothing(store):
+    query = _vectors(1, seed=1)
+    assert store.search(query, k=5, chunk_filter=ChunkFilter(documents=("missing.pdf",))) == []
+    assert store.search(query, k=5, chunk_filter=ChunkFilter(page_from=PAGES + 1)) == []
+
+
+def test_filter_skips_removed_rows(store):
+    # b.pdf is rows PAGES .. 2 * PAGES - 1.
+    store.remove(np.arange(PAGES, PAGES + 5))
+    hits = store.search(_vectors(1, seed=1), k=50, chunk_filter=ChunkFilter(documents=("b.pdf",)))
+    assert sorted(c.page for c, _ in hits) == list(range(6, PAGES + 1))
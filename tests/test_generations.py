@@ -0,0 +1,34 @@
+import os
+
+from app.rag import generations
+
+
+def _save(root: str) -> str:
+    name, path = generations.create(root)
+    with open(path, "w") as fh:
+        fh.write(name)
+    generations.publish(root, name)
+    generations.prune(root, keep=2)
+    return name
+
+
+def test_prune_keeps_rollback_target(tmp_path):
+    root = str(tmp_path / "faiss.index")
+    for _ in range(8):
+        _save(root)
+    assert generations.list_generations(root) == ["000007", "000008"]
+
+    generations.publish(root, "000007")  # roll back past the bad 000008
+    assert _save(root) == "000009"
+    assert generations.parent_generation(root, "000009") == "000007"
+    assert generations.list_generations(root) == ["000007", "000009"]
+
+
+def test_first_save_keeps_legacy_files(tmp_path):
+    root = str(tmp_path / "faiss.index")
+    with open(root, "w") as fh:
+        fh.write("legacy")
+    _save(root)
+    assert os.path.exists(root)
+    _save(root)
+    assert not os.path.exists(root)
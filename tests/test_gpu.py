@@ -0,0 +1,110 @@
+import asyncio
+import time
+
+import pytest
+
+from app.config import get_settings
+from app.gpu import service as gpu_module
+from app.gpu.service import GPUService, GPUUnavailableError
+
+
+class _Runpod:
+    def __init__(self):
+        self.running = False
+        self.starts = 0
+        self.stops = 0
+
+    def start_pod(self):
+        self.starts += 1
+        self.running = True
+        return {}
+
+    def stop_pod(self):
+        self.stops += 1
+        self.running = False
+        return {}
+
+    def get_status(self):
+        return {"desiredStatus": "RUNNING" if self.running else "EXITED", "runtime": {}}
+
+
+@pytest.fixture
+def gpu(monkeypatch):
+    settings = get_settings()
+    monkeypatch.setattr(settings, "runpod_poll_interval_s", 0.01)
+    monkeypatch.setattr(settings, "runpod_cold_start_max_wait_s", 5.0)
+    monkeypatch.setattr(gpu_module, "RunpodClient", _Runpod)
+    service = GPUService()
+    yield service
+    service._cancel_timer()
+
+
+def test_idle_timer_slides_on_traffic(gpu):
+    gpu.state = "ready"
+    gpu.touch()
+    assert gpu._stop_timer is not None
+
+    # The timer fires, but there was traffic within the timeout: re-armed, pod kept.
+    gpu._last_activity = time.monotonic() - gpu.idle_timeout_s / 2
+    gpu._auto_stop()
+    assert gpu.client.stops == 0
+    assert gpu._stop_timer is not None
+    assert gpu.state == "ready"
+
+    # A full timeout without traffic stops it.
+    gpu._cancel_timer()
+    gpu._last_activity = time.monotonic() - gpu.idle_timeout_s - 1
+    gpu._auto_stop()
+    assert gpu.client.stops == 1
+    assert gpu.state == "stopped"
+
+
+def test_touch_leaves_a_pod_it_did_not_start_alone(gpu):
+    gpu.touch()
+    assert gpu._stop_timer is None
+
+
+def test_cold_start_shares_one_boot_and_bounds_the_queue(gpu, monkeypatch):
+    monkeypatch.setattr(gpu.settings, "runpod_cold_start_max_queue", 2)
+
+    async def run():
+        serving = asyncio.Event()
+        warmups = 0
+
+        async def warmup():
+            nonlocal warmups
+            warmups += 1
+            await serving.wait()
+
+        waiters = [asyncio.ensure_future(gpu.ensure_ready(warmup)) for _ in range(2)]
+        while gpu.state != "warming":
+            await asyncio.sleep(0.01)
+        assert gpu.queue_depth == 2
+        with pytest.raises(GPUUnavailableError, match="queue is full"):
+            await gpu.ensure_ready(warmup)
+
+        serving.set()
+        await asyncio.gather(*waiters)
+        return warmups
+
+    assert asyncio.run(run()) == 1
+    assert gpu.client.starts == 1
+    assert gpu.state == "ready"
+    assert gpu.queue_depth == 0
+    # Served traffic arms the idle timer.
+    assert gpu._stop_timer is not None
+
+
+def test_cold_start_wait_is_bounded(gpu, monkeypatch):
+    monkeypatch.setattr(gpu.settings, "runpod_cold_start_max_wait_s", 0.05)
+
+    async def run():
+        async def never_ready():
+            await asyncio.sleep(10)
+
+        with pytest.raises(GPUUnavailableError, match="still starting"):
+            await gpu.ensure_ready(never_ready)
+        gpu._boot.cancel()
+
+    asyncio.run(run())
+    assert gpu.queue_depth == 0
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from app.config import get_settings
+from app.rag.vector_store import DocumentChunk, FaissStore
+
+DIM = 16
+N = 200
+
+
+def _vectors(n: int = N, seed: int = 0) -> np.ndarray:
+    v = np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def _chunks(n: int = N):
+    return [DocumentChunk(text="", document=f"doc-{i}") for i in range(n)]
+
+
+def _top(store, vectors, i: int, k: int = 1):
+    return [c.document for c, _ in store.search(vectors[i : i + 1], k=k)]
+
+
+@pytest.mark.parametrize("index_type", ["ivf_flat", "ivf_pq"])
+def test_ivf_trains_on_everything_buffered_before_save(tmp_path, monkeypatch, index_type):
+    # Fewer sub-quantizers keep PQ training quick.
+    monkeypatch.setattr(get_settings(), "faiss_pq_m", 4)
+    path = str(tmp_path / "faiss.index")
+    store = FaissStore(DIM, path, index_type=index_type)
+    vectors = _vectors()
+    # Two adds, as ingestion does per batch: nothing is searchable until trained.
+    store.add(vectors[:50], _chunks()[:50])
+    store.add(vectors[50:], _chunks()[50:])
+    assert store.search(vectors[:1], k=1) == []
+
+    store.save()
+    assert store.index.is_trained
+    assert store.index.ntotal == N
+    # nlist shrinks to the corpus (200 // 39 clusters), all probed: exact for IVF-Flat.
+    k = 1 if index_type == "ivf_flat" else 5
+    assert "doc-7" in _top(store, vectors, 7, k)
+
+    reloaded = FaissStore(DIM, path, index_type=index_type)
+    assert reloaded.index.ntotal == N
+    assert "doc-7" in _top(reloaded, vectors, 7, k)
+
+    # Once trained, later vectors go straight into the index.
+    extra = _vectors(1, seed=1)
+    reloaded.add(extra, [DocumentChunk(text="", document="extra")])
+    assert reloaded.index.ntotal == N + 1
+
+
+def test_hnsw_needs_no_training(tmp_path):
+    store = FaissStore(DIM, str(tmp_path / "faiss.index"), index_type="hnsw")
+    vectors = _vectors()
+    store.add(vectors, _chunks())
+    assert store.index.ntotal == N
+    assert _top(store, vectors, 7) == ["doc-7"]
+
+
+def test_migrate_between_index_types_keeps_positions(tmp_path):
+    store = FaissStore(DIM, str(tmp_path / "faiss.index"), index_type="flat")
+    vectors = _vectors()
+    store.add(vectors, _chunks())
+    store.save()
+
+    store.migrate("ivf_flat")
+    assert store.index_type == "ivf_flat"
+    # Like ingestion, the new IVF index is trained when saved.
+    store.save()
+    assert store.index.ntotal == N
+    assert _top(store, vectors, 42) == ["doc-42"]
+
+    store.migrate("hnsw")
+    assert _top(store, vectors, 42) == ["doc-42"]
+
+
+def test_unknown_index_type_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        FaissStore(DIM, str(tmp_path / "faiss.index"), index_type="lsh")
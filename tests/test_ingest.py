@@ -0,0 +1,25 @@
+import threading
+from pathlib import Path
+
+from app.rag import ingest
+
+
+def _feeders():
+    return [t for t in threading.enumerate() if t.name == "cw-ingest-feeder" and t.is_alive()]
+
+
+def test_extract_stream_closed_early_stops_feeder(tmp_path):
+    # Missing files fail fast in the workers; each comes back as an exception.
+    jobs = [(Path(tmp_path / f"{i}.pdf"), str(i)) for i in range(20)]
+    stream = ingest._extract_stream(jobs, workers=2, queue_size=1)
+    path, digest, result = next(stream)
+    assert isinstance(result, Exception)
+    stream.close()
+    assert _feeders() == []
+
+
+def test_extract_stream_yields_every_job(tmp_path):
+    jobs = [(Path(tmp_path / f"{i}.pdf"), str(i)) for i in range(5)]
+    digests = sorted(digest for _, digest, _ in ingest._extract_stream(jobs, workers=2, queue_size=1))
+    assert digests == [str(i) for i in range(5)]
+    assert _feeders() == []
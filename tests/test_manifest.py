@@ -0,0 +1,91 @@
+import zlib
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from app.config import get_settings
+from app.rag import ingest as ingest_module
+from app.rag import retriever as retriever_module
+from app.rag.manifest import IngestManifest
+from app.rag.vector_store import DocumentChunk, FaissStore
+
+DIM = 8
+
+
+def _vector(text: str) -> np.ndarray:
+    v = np.random.default_rng(zlib.crc32(text.encode())).standard_normal(DIM).astype(np.float32)
+    return v / np.linalg.norm(v)
+
+
+class _Embedder:
+    dim = DIM
+
+    def __init__(self):
+        self.encoded = []
+        self.model = self
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return DIM
+
+    def encode(self, texts):
+        self.encoded.extend(texts)
+        return np.stack([_vector(t) for t in texts])
+
+
+def _extract(path: Path):
+    # One chunk per line of a text file standing in for a PDF.
+    return [
+        DocumentChunk(text=line, document=path.name, page=i)
+        for i, line in enumerate(path.read_text().splitlines(), start=1)
+    ]
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    embedder = _Embedder()
+    monkeypatch.setattr(get_settings(), "vector_store_path", str(tmp_path / "store" / "faiss.index"))
+    monkeypatch.setattr(retriever_module, "EmbeddingModel", lambda: embedder)
+    monkeypatch.setattr(ingest_module, "extract_pdf_chunks", _extract)
+    data = tmp_path / "data"
+    data.mkdir()
+    return data, embedder
+
+
+def _documents():
+    store = FaissStore(DIM, get_settings().vector_store_path)
+    manifest = IngestManifest(store.manifest_path)
+    found = {}
+    for name in manifest.files:
+        for i in manifest.get(name).ids.tolist():
+            found.setdefault(name, []).append(store.meta[i].text)
+    return store.index.ntotal, found
+
+
+def test_skip_replace_remove(library):
+    data, embedder = library
+    (data / "a.pdf").write_text("alpha one two three four five\nalpha six seven eight nine ten\n")
+    (data / "b.pdf").write_text("bravo one two three four five\n")
+    ingest_module.ingest(data)
+    assert _documents() == (
+        3,
+        {
+            "a.pdf": ["alpha one two three four five", "alpha six seven eight nine ten"],
+            "b.pdf": ["bravo one two three four five"],
+        },
+    )
+
+    # Unchanged files are not extracted or embedded again.
+    embedder.encoded.clear()
+    ingest_module.ingest(data)
+    assert embedder.encoded == []
+
+    # An edited file replaces its vectors; a deleted one loses them.
+    (data / "b.pdf").write_text("bravo eleven twelve thirteen fourteen fifteen\n")
+    (data / "a.pdf").unlink()
+    ingest_module.ingest(data)
+    assert embedder.encoded == ["bravo eleven twelve thirteen fourteen fifteen"]
+    assert _documents() == (1, {"b.pdf": ["bravo eleven twelve thirteen fourteen fifteen"]})
+    store = FaissStore(DIM, get_settings().vector_store_path)
+    hit, _ = store.search(_vector("bravo eleven twelve thirteen fourteen fifteen")[None, :], k=1)[0]
+    assert hit.document == "b.pdf"
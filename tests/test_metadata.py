@@ -0,0 +1,78 @@
+import numpy as np
+
+from app.rag.metadata import ChunkMetadata
+from app.rag.vector_store import DocumentChunk, FaissStore
+
+DIM = 8
+
+CHUNKS = [
+    DocumentChunk(text="Inspect every rung.", document="ladder.pdf", section="2.1", page=4),
+    DocumentChunk(text="Garde-corps: 1 m minimum.", document="échafaudage.pdf", section=None, page=None),
+    DocumentChunk(text="", document="ladder.pdf", section="", page=0),
+]
+
+
+def _fields(chunk: DocumentChunk):
+    return chunk.text, chunk.document, chunk.section, chunk.page
+
+
+def test_round_trip_is_memory_mapped(tmp_path):
+    directory = str(tmp_path / "faiss.index.meta")
+    meta = ChunkMetadata()
+    meta.extend(CHUNKS)
+    meta.write(directory)
+
+    opened = ChunkMetadata(directory)
+    assert len(opened) == 3
+    assert [_fields(opened.chunk(i)) for i in range(3)] == [_fields(c) for c in CHUNKS]
+    assert opened.documents == ["ladder.pdf", "échafaudage.pdf"]
+    assert isinstance(opened._doc_ids, np.memmap)
+    assert isinstance(opened._text.blob, np.memmap)
+
+
+def test_appending_keeps_existing_rows(tmp_path):
+    directory = str(tmp_path / "faiss.index.meta")
+    meta = ChunkMetadata()
+    meta.extend(CHUNKS[:2])
+    meta.write(directory)
+
+    opened = ChunkMetadata(directory)
+    opened.extend(CHUNKS[2:])
+    # Tail rows are readable before they are written.
+    assert _fields(opened.chunk(-1)) == _fields(CHUNKS[2])
+    opened.write(directory)
+
+    reopened = ChunkMetadata(directory)
+    assert [_fields(reopened.chunk(i)) for i in range(3)] == [_fields(c) for c in CHUNKS]
+
+
+def test_store_search_reads_hits_from_saved_metadata(tmp_path):
+    path = str(tmp_path / "faiss.index")
+    store = FaissStore(DIM, path)
+    store.add(np.eye(DIM, dtype=np.float32)[:3], CHUNKS)
+    store.save()
+
+    reopened = FaissStore(DIM, path)
+    chunk, score = reopened.search(np.eye(DIM, dtype=np.float32)[1:2], k=1)[0]
+    assert _fields(chunk) == _fields(CHUNKS[1])
+
+
+def test_legacy_pickled_metadata_loads_and_converts_on_save(tmp_path):
+    import faiss
+
+    path = str(tmp_path / "faiss.index")
+    index = faiss.IndexFlatIP(DIM)
+    index.add(np.eye(DIM, dtype=np.float32)[:3])
+    faiss.write_index(index, path)
+    legacy = np.empty(len(CHUNKS), dtype=object)
+    legacy[:] = CHUNKS
+    np.save(path + ".meta.npy", legacy)
+
+    store = FaissStore(DIM, path)
+    chunk, _ = store.search(np.eye(DIM, dtype=np.float32)[0:1], k=1)[0]
+    assert _fields(chunk) == _fields(CHUNKS[0])
+
+    store.save()
+    assert ChunkMetadata.exists(store.meta_dir)
+    chunk, _ = FaissStore(DIM, path).search(np.eye(DIM, dtype=np.float32)[2:3], k=1)[0]
+    assert _fields(chunk) == _fields(CHUNKS[2])
@@ -0,0 +1,68 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.rag import retriever as retriever_module
+from app.rag.vector_store import DocumentChunk
+
+
+class _Embedder:
+    dim = 2
+
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, texts):
+        self.calls += 1
+        return np.ones((len(texts), self.dim), dtype=np.float32)
+
+
+class _Store:
+    def __init__(self):
+        self.generation = 1
+        self.searches = 0
+
+    def search(self, q_emb, k=4, **kwargs):
+        self.searches += 1
+        return [(DocumentChunk(text="t", document=f"gen-{self.generation}.pdf"), 1.0)]
+
+
+@pytest.fixture
+def retriever(monkeypatch):
+    embedder, store = _Embedder(), _Store()
+    monkeypatch.setattr(retriever_module, "EmbeddingModel", lambda: embedder)
+    monkeypatch.setattr(retriever_module, "get_store", lambda *args, **kwargs: store)
+    r = retriever_module.Retriever()
+    r.batcher = None
+    return r, embedder, store
+
+
+def test_results_are_cached_per_normalized_query(retriever):
+    r, embedder, store = retriever
+    first = r.retrieve("Ladder inspection?")
+    assert r.retrieve("  ladder   INSPECTION ") == first
+    assert (embedder.calls, store.searches) == (1, 1)
+    # k is part of the key.
+    r.retrieve("ladder inspection", k=8)
+    assert store.searches == 2
+
+
+def test_new_store_generation_invalidates_results_not_embeddings(retriever):
+    r, embedder, store = retriever
+    r.retrieve("ladder inspection")
+    store.generation = 2
+    hits = r.retrieve("ladder inspection")
+    assert hits[0][0].document == "gen-2.pdf"
+    assert (embedder.calls, store.searches) == (1, 2)
+
+
+def test_async_retrieval_uses_the_same_caches(retriever):
+    r, embedder, store = retriever
+
+    async def run():
+        return await r.start_retrieval("ladder inspection")
+
+    first = asyncio.run(run())
+    assert asyncio.run(run()) == first
+    assert (embedder.calls, store.searches) == (1, 1)
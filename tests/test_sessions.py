@@ -0,0 +1,50 @@
+import numpy as np
+
+from app.chat.sessions import SessionCache
+from app.rag.vector_store import ChunkFilter, DocumentChunk
+
+
+def _hit(document: str, score: float = 0.9):
+    return (DocumentChunk(text="t", document=document, page=1), score)
+
+
+def _turn(cache: SessionCache, messages):
+    turn = cache.begin("s", messages)
+    turn.screen()
+    return turn
+
+
+def test_carry_keeps_previous_hits_for_same_filter():
+    cache = SessionCache(maxsize=8, ttl_seconds=60, history_weight=0.5)
+    _turn(cache, ["a"]).carry([_hit("a.pdf")], generation=1)
+    results = _turn(cache, ["a", "b"]).carry([_hit("b.pdf")], generation=1)
+    assert [(c.document, s) for c, s in results] == [("b.pdf", 0.9), ("a.pdf", 0.45)]
+
+
+def test_carry_drops_previous_hits_when_filter_changes():
+    cache = SessionCache(maxsize=8, ttl_seconds=60, history_weight=0.5)
+    _turn(cache, ["a"]).carry([_hit("a.pdf")], generation=1)
+    only_b = ChunkFilter(documents=("b.pdf",))
+    results = _turn(cache, ["a", "b"]).carry([_hit("b.pdf")], generation=1, chunk_filter=only_b)
+    assert [c.document for c, _ in results] == ["b.pdf"]
+
+
+def test_crisis_phrase_split_across_turns_is_detected():
+    cache = SessionCache(maxsize=8, ttl_seconds=60, history_weight=0.0)
+    assert not _turn(cache, ["some days I just want to kill"]).screen()
+    turn = _turn(cache, ["some days I just want to kill", "myself"])
+    assert turn.start == 1
+    assert turn.screen()
+
+
+def test_history_is_kept_only_for_turns_that_reach_carry():
+    cache = SessionCache(maxsize=8, ttl_seconds=60, history_weight=0.5)
+    first = _turn(cache, ["ladder"])
+    first.blend(np.array([1.0, 0.0], dtype=np.float32))
+    first.carry([], generation=1)
+
+    # Short-circuited turn (e.g. crisis): blended, never carried.
+    _turn(cache, ["ladder", "other"]).blend(np.array([0.0, 1.0], dtype=np.float32))
+
+    q = _turn(cache, ["ladder", "other", "scaffold"]).blend(np.array([1.0, 0.0], dtype=np.float32))
+    assert np.allclose(q, [[1.0, 0.0]])
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from app.rag.manifest import IngestManifest
+from app.rag.sharded import SHARD_SHIFT, ShardedStore, global_ids, rebuild, split_ids
+from app.rag.vector_store import DocumentChunk, FaissStore
+
+DIM = 16
+N = 120
+
+
+def _vectors(n: int = N, seed: int = 0) -> np.ndarray:
+    v = np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def _chunks(n: int = N):
+    return [DocumentChunk(text=f"t{i}", document=f"doc-{i % 12}.pdf", page=i) for i in range(n)]
+
+
+def _pages(hits):
+    return [c.page for c, _ in hits]
+
+
+def test_global_ids_round_trip():
+    ids = global_ids(3, np.array([0, 5]))
+    assert ids.tolist() == [3 << SHARD_SHIFT, (3 << SHARD_SHIFT) + 5]
+    shards, local = split_ids(ids)
+    assert shards.tolist() == [3, 3]
+    assert local.tolist() == [0, 5]
+
+
+@pytest.fixture
+def stores(tmp_path):
+    vectors, chunks = _vectors(), _chunks()
+    single = FaissStore(DIM, str(tmp_path / "single" / "faiss.index"))
+    single.add(vectors, chunks)
+    sharded = ShardedStore(DIM, str(tmp_path / "sharded" / "faiss.index"), shards=4)
+    ids = sharded.add(vectors, chunks)
+    return single, sharded, ids
+
+
+def test_add_routes_each_document_to_one_shard(stores):
+    _, sharded, ids = stores
+    shards, _ = split_ids(ids)
+    for chunk, shard, i in zip(_chunks(), shards.tolist(), ids.tolist()):
+        assert shard == sharded.shard_of(chunk.document)
+        assert sharded.chunk(i).page == chunk.page
+    assert len(set(shards.tolist())) > 1
+    assert sharded.ntotal == N
+
+
+def test_scatter_gather_matches_one_index(stores):
+    single, sharded, _ = stores
+    queries = _vectors(5, seed=1)
+    for expected, hits in zip(single.search_batch(queries, k=7), sharded.search_batch(queries, k=7)):
+        assert _pages(hits) == _pages(expected)
+        assert [s for _, s in hits] == pytest.approx([s for _, s in expected], abs=1e-5)
+
+
+def test_remove_splits_global_ids_by_shard(stores):
+    single, sharded, ids = stores
+    gone = [0, 1, 2, 50]
+    assert sharded.remove(ids[gone]) == len(gone)
+    single.remove(gone)
+    assert sharded.ntotal == N - len(gone)
+    queries = _vectors(5, seed=2)
+    for expected, hits in zip(single.search_batch(queries, k=5), sharded.search_batch(queries, k=5)):
+        assert _pages(hits) == _pages(expected)
+
+
+def test_save_reopen_and_rebuild_from_one_index(stores, tmp_path):
+    single, sharded, ids = stores
+    sharded.save()
+    reopened = ShardedStore(DIM, sharded.root)
+    assert len(reopened.shards) == 4
+    assert reopened.ntotal == N
+
+    manifest = IngestManifest(single.manifest_path)
+    manifest.set("doc-0.pdf", "x", [0, 12])
+    single.save(manifest)
+    target, remapped = rebuild(single, shards=3)
+    target.save(remapped)
+    moved = remapped.get("doc-0.pdf").ids
+    assert [target.chunk(i).page for i in moved.tolist()] == [0, 12]
+    query = _vectors(1, seed=3)
+    assert _pages(target.search(query, k=5)) == _pages(single.search(query, k=5))
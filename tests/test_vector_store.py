@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from app.rag.vector_store import DocumentChunk, FaissStore
+
+DIM = 16
+
+
+def _vectors(n: int, seed: int = 0) -> np.ndarray:
+    v = np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("quantization", ["none", "sq8"])
+def test_hnsw_remove_rebuilds_graph(tmp_path, quantization):
+    store = FaissStore(DIM, str(tmp_path / "faiss.index"), index_type="hnsw", quantization=quantization)
+    vectors = _vectors(50)
+    store.add(vectors, [DocumentChunk(text="", document=f"doc-{i}") for i in range(50)])
+    store.save()
+
+    # HNSW cannot delete nodes: the index is rebuilt (and an SQ8 quantizer retrained).
+    assert store.remove(np.arange(10)) == 10
+    assert store.ntotal == 40
+    chunk, _ = store.search(vectors[20:21], k=1)[0]
+    assert chunk.document == "doc-20"
+    assert all(c.document != "doc-3" for c, _ in store.search(vectors[3:4], k=5))
+
+    assert store.remove(np.arange(10, 50)) == 40
+    assert store.ntotal == 0
+    assert store.search(vectors[20:21], k=1) == []
+
+    store.add(vectors[:5], [DocumentChunk(text="", document=f"new-{i}") for i in range(5)])
+    store.save()
+    chunk, _ = store.search(vectors[2:3], k=1)[0]
+    assert chunk.document == "new-2"
+
+
+@pytest.mark.parametrize("quantization", ["none", "sq8"])
+def test_compact_drops_removed_rows(tmp_path, quantization):
+    from app.rag.manifest import IngestManifest
+
+    store = FaissStore(DIM, str(tmp_path / "faiss.index"), index_type="flat", quantization=quantization)
+    vectors = _vectors(6)
+    store.add(vectors, [DocumentChunk(text=f"t{i}", document=f"doc-{i // 2}") for i in range(6)])
+    store.add_duplicates([DocumentChunk(text="t1", document="doc-3")], [1])
+    store.add_duplicates([DocumentChunk(text="t5", document="doc-4")], [5])
+    store.save()
+    manifest = IngestManifest(store.manifest_path)
+    manifest.set("doc-1.pdf", "x", [2, 3])
+    manifest.set("doc-2.pdf", "y", [4, 5])
+    manifest.set("doc-3.pdf", "z", [6])
+
+    store.remove([1, 2, 3])  # row 1's alias (6) is promoted
+    assert store.removed_rows == 3
+    mapping = store.compact()
+    manifest.remap(mapping)
+    store.save(manifest)
+
+    store = FaissStore(DIM, store.root)
+    assert len(store.meta) == 5
+    assert store.meta.duplicate_of([4]).tolist() == [2]
+    assert store.removed_rows == 0
+    assert IngestManifest(store.manifest_path).get("doc-2.pdf").ids.tolist() == [1, 2]
+    assert IngestManifest(store.manifest_path).get("doc-3.pdf").ids.tolist() == [3]
+    assert IngestManifest(store.manifest_path).get("doc-1.pdf").ids.tolist() == []
+    for i, document in [(0, "doc-0"), (4, "doc-2"), (1, "doc-3")]:
+        chunk, score = store.search(vectors[i : i + 1], k=1)[0]
+        assert (chunk.document, score) == (document, pytest.approx(1.0, abs=0.02))
+    chunk, _ = store.search(vectors[5:6], k=1)[0]
+    assert [d.document for d in chunk.duplicates] == ["doc-4"]